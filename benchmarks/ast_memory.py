@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""Compare memory usage of AST nodes and flatast.FlatTree.
+
+Run this from the project root:
+
+    $ python3 benchmarks/ast_memory.py
+"""
+
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from weirdc import ast, flatast, tokenizer     # noqa
+
+STATEMENTS = 100000
+
+# machine-generated code often looks like this
+CODE = 'function main() {\n%s}\n' % ''.join(
+    '    String x%d = "value %d"\n'
+    '    print(x%d)\n' % (i, i, i) for i in range(STATEMENTS // 2))
+
+
+def memory_usage(function, tokens):
+    tracemalloc.start()
+    try:
+        result = function(tokens)     # noqa
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    tokens = tokenizer.CompactTokens(CODE)
+    tree = flatast.parse(tokens)
+    print("%d statements, %d nodes" % (STATEMENTS, len(tree)))
+
+    for name, function in [
+            ("AST nodes", lambda tokens: list(ast.parse(tokens))),
+            ("FlatTree", flatast.parse)]:
+        memory = memory_usage(function, tokens)
+        print("%-10s %6.1f MiB, %5.1f bytes per node" % (
+            name + ':', memory / 1024 / 1024, memory / len(tree)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Compare peak memory of tokenizing a big file with and without mmap.
+
+Run this from the project root:
+
+    $ python3 benchmarks/bigfile.py
+"""
+
+import os
+import sys
+import tempfile
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from weirdc import tokenizer     # noqa
+
+FUNCTIONS = 50000
+
+FUNCTION = (
+    'function f%d() returns String {\n'
+    '    String x = "hello"   /* a comment\n'
+    '    that has many lines */\n'
+    '    print(x)\n'
+    '    return x\n'
+    '}\n')
+
+
+def peak_memory(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def count(tokens):
+    result = 0
+    for token in tokens:
+        result += 1
+    return result
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tempdir:
+        path = os.path.join(tempdir, 'big.weird')
+        with open(path, 'w') as file:
+            for i in range(FUNCTIONS):
+                file.write(FUNCTION % i)
+            file.write('function main() {\n}\n')
+
+        def read_all():
+            with open(path, 'r') as file:
+                return count(tokenizer.tokenize(file.read()))
+
+        def mmapped():
+            return count(tokenizer.tokenize_path(path))
+
+        print("%.1f MiB file, %d tokens" % (
+            os.path.getsize(path) / 1024 / 1024, mmapped()))
+        for name, function in [("read() and tokenize()", read_all),
+                               ("tokenize_path()", mmapped)]:
+            print("%-22s peak %6.1f MiB, %.3fs" % (
+                name + ':', peak_memory(function) / 1024 / 1024,
+                min(timeit.repeat(function, number=1, repeat=3))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Compare the generated and the debug methods of utils.miniclass.
+
+Run this from the project root:
+
+    $ python3 benchmarks/miniclass.py
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from weirdc import Location, utils     # noqa
+
+NODES = 100000
+RUNS = 5
+
+
+def best_time(function):
+    return min(timeit.repeat(function, number=1, repeat=RUNS))
+
+
+def main():
+    location = Location(0, 5, 1)
+    print("%d nodes" % NODES)
+    for debug in [True, False]:
+        # like ast.FunctionCall and checker.Variable
+        FunctionCall = utils.miniclass(
+            __name__, 'FunctionCall', ['location', 'function', 'args'],
+            debug=debug)
+        Variable = utils.miniclass(
+            __name__, 'Variable', ['value', 'defined_location'],
+            default_attrs={'initialized': False, 'used_by': []}, debug=debug)
+
+        def create_nodes():
+            return [FunctionCall(location, 'print', []) for i in range(NODES)]
+
+        def create_variables():
+            return [Variable(None, location, initialized=True)
+                    for i in range(NODES)]
+
+        nodes = create_nodes()
+        other_nodes = create_nodes()
+
+        def compare():
+            return nodes == other_nodes
+
+        print("%-11s nodes %.3fs, variables %.3fs, comparing %.3fs" % (
+            "debug:" if debug else "generated:", best_time(create_nodes),
+            best_time(create_variables), best_time(compare)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""Compare checking code and loading checked nodes from a NodeCache.
+
+Run this from the project root:
+
+    $ python3 benchmarks/nodecache.py
+"""
+
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from weirdc import compiler, nodecache     # noqa
+
+FUNCTIONS = 5000
+RUNS = 3
+
+CODE = ''.join(
+    'function f%d() returns String {\n'
+    '    String x = "hello"\n'
+    '    if TRUE {\n'
+    '        print(x)\n'
+    '    }\n'
+    '    return x\n'
+    '}\n' % i for i in range(FUNCTIONS)) + 'function main() {\n}\n'
+
+
+def best_time(function):
+    return min(timeit.repeat(function, number=1, repeat=RUNS))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tempdir:
+        cache = nodecache.NodeCache(tempdir)
+        compiler.check_code(CODE, None, cache)
+        size = sum(os.path.getsize(os.path.join(tempdir, name))
+                   for name in os.listdir(tempdir))
+
+        checking = best_time(lambda: compiler.check_code(CODE))
+        loading = best_time(lambda: cache.load(CODE, print))
+
+    print("%d functions, cache file is %.1f KiB" % (FUNCTIONS, size / 1024))
+    print("tokenizing, parsing and checking: %.3fs" % checking)
+    print("loading from the cache:           %.3fs" % loading)
+    print("speedup: %.1fx" % (checking / loading))
+
+
+if __name__ == '__main__':
+    main()
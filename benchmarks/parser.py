@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""Measure how many tokens per second the parser handles.
+
+Run this from the project root:
+
+    $ python3 benchmarks/parser.py
+
+The tokens are created before measuring, so this measures only the
+parser.
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from weirdc import ast, tokenizer     # noqa
+
+FUNCTIONS = 20000
+RUNS = 3
+
+CODE = ''.join(
+    'function f%d(Int a, String b) returns String {\n'
+    '    String x = "hello"\n'
+    '    if thing(a, (b)) {\n'
+    '        print(x)\n'
+    '    }\n'
+    '    return x\n'
+    '}\n' % i for i in range(FUNCTIONS)) + 'function main() {\n}\n'
+
+
+def tokens_per_second(tokens):
+    seconds = min(timeit.repeat(lambda: list(ast.parse(tokens)),
+                                number=1, repeat=RUNS))
+    return len(tokens) / seconds
+
+
+def main():
+    token_list = list(tokenizer.tokenize(CODE))
+    compact = tokenizer.CompactTokens(CODE)
+    print("%d tokens" % len(token_list))
+    print("list of Tokens: %.0f tokens/sec" % tokens_per_second(token_list))
+    print("CompactTokens:  %.0f tokens/sec" % tokens_per_second(compact))
+
+
+if __name__ == '__main__':
+    main()
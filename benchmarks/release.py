@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Compare programs compiled with and without --release.
+
+Run this from the project root:
+
+    $ python3 benchmarks/release.py
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import timeit
+
+CALLS = 20000
+RUNS = 10
+
+# every call creates and destroys string objects, so this spends most
+# of its time in the runtime's object functions
+PROGRAM = '''\
+function make_string() returns String {
+    String result = "hello"
+    return result
+}
+function main() {
+%s
+}
+''' % ('    print(make_string())\n' * CALLS)
+
+
+def compile_program(source, outfile, *flags):
+    subprocess.check_call(
+        [sys.executable, '-m', 'weirdc', source, '-o', outfile, '--no-cache']
+        + list(flags), stdout=subprocess.DEVNULL)
+
+
+def best_time(executable):
+    def run():
+        subprocess.check_call([executable], stdout=subprocess.DEVNULL)
+    return min(timeit.repeat(run, number=1, repeat=RUNS))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tempdir:
+        source = os.path.join(tempdir, 'bench.weird')
+        with open(source, 'w') as file:
+            file.write(PROGRAM)
+
+        debug = os.path.join(tempdir, 'debug')
+        release = os.path.join(tempdir, 'release')
+        compile_program(source, debug)
+        compile_program(source, release, '--release')
+
+        debug_time = best_time(debug)
+        release_time = best_time(release)
+
+    print("separate runtime library: %.2f ms" % (debug_time * 1000))
+    print("--release (-O2 -flto):    %.2f ms" % (release_time * 1000))
+    print("speedup: %.2fx" % (debug_time / release_time))
+
+
+if __name__ == '__main__':
+    main()
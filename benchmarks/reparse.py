@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Compare parsing a big file again with weirdc.ast.reparse().
+
+Run this from the project root:
+
+    $ python3 benchmarks/reparse.py
+
+One function in the middle of the file is changed, and both ways
+include tokenizing.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from weirdc import ast, tokenizer     # noqa
+
+FUNCTIONS = 10000
+
+CODE = ''.join(
+    'function f%d(Int a, String b) {\n'
+    '    String x = "hello"\n'
+    '    print(x)\n'
+    '}\n' % i for i in range(FUNCTIONS))
+
+
+def main():
+    print("%d lines" % CODE.count('\n'))
+    offset = CODE.index('print(x)', len(CODE) // 2)
+    removed_length = len('print(x)')
+    inserted_text = 'print(x)\n    print(b)'
+    new_code = (CODE[:offset] + inserted_text +
+                CODE[offset+removed_length:])
+
+    start = time.perf_counter()
+    nodes = list(ast.parse(tokenizer.tokenize(CODE)))
+    print("parsing everything:       %.3fs" % (time.perf_counter() - start))
+
+    start = time.perf_counter()
+    new_nodes = ast.reparse(CODE, nodes, offset, removed_length,
+                            inserted_text)
+    print("reparsing one function:   %.3fs" % (time.perf_counter() - start))
+    assert new_nodes == list(ast.parse(tokenizer.tokenize(new_code)))
+
+
+if __name__ == '__main__':
+    main()
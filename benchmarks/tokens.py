@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Compare tokenize() and CompactTokens on a big generated file.
+
+Run this from the project root:
+
+    $ python3 benchmarks/tokens.py
+"""
+
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from weirdc import ast, tokenizer     # noqa
+
+FUNCTIONS = 20000
+RUNS = 3
+
+CODE = ''.join(
+    'function f%d() returns String {\n'
+    '    String x = "hello"   // a comment\n'
+    '    print(x)\n'
+    '    return x\n'
+    '}\n' % i for i in range(FUNCTIONS)) + 'function main() {\n}\n'
+
+
+def memory_usage(function):
+    tracemalloc.start()
+    try:
+        result = function()     # noqa
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def best_time(function):
+    return min(timeit.repeat(function, number=1, repeat=RUNS))
+
+
+def main():
+    def token_list():
+        return list(tokenizer.tokenize(CODE))
+
+    def compact_tokens():
+        return tokenizer.CompactTokens(CODE)
+
+    print("%d tokens" % len(compact_tokens()))
+    print("list of Tokens: %.1f MiB, tokenizing %.3fs, parsing too %.3fs" % (
+        memory_usage(token_list) / 1024 / 1024, best_time(token_list),
+        best_time(lambda: list(ast.parse(tokenizer.tokenize(CODE))))))
+    print("CompactTokens:  %.1f MiB, tokenizing %.3fs, parsing too %.3fs" % (
+        memory_usage(compact_tokens) / 1024 / 1024, best_time(compact_tokens),
+        best_time(lambda: list(ast.parse(compact_tokens())))))
+
+
+if __name__ == '__main__':
+    main()
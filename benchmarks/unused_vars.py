@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""Check that removing unused variables takes linear time.
+
+Run this from the project root:
+
+    $ python3 benchmarks/unused_vars.py
+
+Each function has lots of variables that are never used, like
+machine-generated code often has. The time per declaration should stay
+about the same when the functions get bigger.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from weirdc import ast, checker, tokenizer     # noqa
+
+SIZES = [5000, 10000, 20000, 40000]
+
+
+def make_code(declarations):
+    lines = ['function main() {\n']
+    for i in range(declarations):
+        lines.append('    Int x%d = 1\n' % i)
+        lines.append('    String s%d = input()\n' % i)
+    lines.append('}\n')
+    return ''.join(lines)
+
+
+def main():
+    for size in SIZES:
+        nodes = list(ast.parse(tokenizer.tokenize(make_code(size))))
+        start = time.perf_counter()
+        checker.check(nodes, lambda warning: None)
+        seconds = time.perf_counter() - start
+        print("%6d declarations: %.3fs, %.2f microseconds per declaration"
+              % (2*size, seconds, seconds / (2*size) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
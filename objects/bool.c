@@ -8,6 +8,9 @@ struct Data {
 	int value;		// 1 or 0
 };
 
+struct WeirdObject *weirdbool_TRUE;
+struct WeirdObject *weirdbool_FALSE;
+
 void weirdbool_init(void)
 {
 	struct Data *truedata = malloc(sizeof (struct Data));
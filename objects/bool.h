@@ -8,8 +8,8 @@
  *
  * These objects are not reference counted.
  */
-struct WeirdObject *weirdbool_TRUE;
-struct WeirdObject *weirdbool_FALSE;
+extern struct WeirdObject *weirdbool_TRUE;
+extern struct WeirdObject *weirdbool_FALSE;
 
 /**
  * This defines ``weirdbool_TRUE`` and ``weirdbool_FALSE``.
@@ -0,0 +1,322 @@
+#include <assert.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+#include "object.h"
+#include "integer.h"
+#include "string.h"
+#include "bool.h"
+#include "vm.h"
+
+
+static void weirderr_nomem(void) { fprintf(stderr, "not enough memory\n"); exit(1); }
+
+// the last byte is FORMAT_VERSION in weirdc/bytecode.py
+#define MAGIC "WEIRDBC\x01"
+#define MAGIC_LEN 8
+#define KEY_LEN 32
+#define MAXLEN 1000
+
+struct Function {
+	uint16_t nargs;
+	uint16_t nlocals;
+	uint32_t codelen;
+	const unsigned char *code;
+};
+
+struct Program {
+	uint32_t nconsts;
+	struct WeirdObject **consts;
+	uint32_t nfuncs;
+	struct Function *funcs;
+};
+
+// reads little-endian integers and remembers if the bytecode ended
+struct Reader {
+	const unsigned char *pos;
+	const unsigned char *end;
+	int error;
+};
+
+static uint64_t read_int(struct Reader *reader, int nbytes)
+{
+	uint64_t result = 0;
+	if (reader->end - reader->pos < nbytes) {
+		reader->error = 1;
+		return 0;
+	}
+	for (int i = 0; i < nbytes; i++)
+		result |= ((uint64_t) reader->pos[i]) << (8*i);
+	reader->pos += nbytes;
+	return result;
+}
+
+static const unsigned char *read_bytes(struct Reader *reader, size_t len)
+{
+	const unsigned char *result = reader->pos;
+	if ((size_t) (reader->end - reader->pos) < len) {
+		reader->error = 1;
+		return NULL;
+	}
+	reader->pos += len;
+	return result;
+}
+
+static void *allocate(size_t size)
+{
+	void *result = malloc(size ? size : 1);
+	if (!result)
+		weirderr_nomem();
+	return result;
+}
+
+static void free_program(struct Program *program)
+{
+	for (uint32_t i = 0; i < program->nconsts; i++) {
+		if (program->consts[i])
+			weirdobject_decref(program->consts[i]);
+	}
+	free(program->consts);
+	free(program->funcs);
+}
+
+// returns 1 on success, 0 if the bytecode is invalid
+static int load_program(struct Reader *reader, struct Program *program)
+{
+	program->nconsts = read_int(reader, 4);
+	if (reader->error)
+		return 0;
+	program->consts = allocate(program->nconsts * sizeof (struct WeirdObject *));
+	program->nfuncs = 0;
+	program->funcs = NULL;
+	for (uint32_t i = 0; i < program->nconsts; i++)
+		program->consts[i] = NULL;
+
+	for (uint32_t i = 0; i < program->nconsts && !reader->error; i++) {
+		int kind = read_int(reader, 1);
+		if (kind == 0) {
+			uint32_t len = read_int(reader, 4);
+			const unsigned char *value = read_bytes(reader, len);
+			if (value)
+				program->consts[i] = weirdstring_new((char *) value, len);
+		} else if (kind == 1) {
+			int negative = read_int(reader, 1);
+			uint64_t value = read_int(reader, 8);
+			if (!reader->error)
+				program->consts[i] = weirdint_new(value, negative ? -1 : 1);
+		} else {
+			reader->error = 1;
+		}
+	}
+
+	program->nfuncs = read_int(reader, 4);
+	if (reader->error)
+		return 0;
+	program->funcs = allocate(program->nfuncs * sizeof (struct Function));
+	for (uint32_t i = 0; i < program->nfuncs && !reader->error; i++) {
+		program->funcs[i].nargs = read_int(reader, 2);
+		program->funcs[i].nlocals = read_int(reader, 2);
+		program->funcs[i].codelen = read_int(reader, 4);
+		program->funcs[i].code = read_bytes(reader, program->funcs[i].codelen);
+		if (program->funcs[i].nargs > program->funcs[i].nlocals)
+			reader->error = 1;
+	}
+	return !reader->error;
+}
+
+static struct WeirdObject *read_line(void)
+{
+	char result[MAXLEN];
+	int c, i;
+
+	for (i = 0; i < MAXLEN; i++) {
+		c = getchar();
+		if (c == EOF || c == '\n')
+			break;
+		result[i] = c;
+	}
+	return weirdstring_new(result, i);
+}
+
+static void print_string(struct WeirdObject *s)
+{
+	char *cstr = weirdstring_to_cstring(s);
+	printf("%s", cstr);
+	free(cstr);
+}
+
+static void decref_if_not_null(struct WeirdObject *obj)
+{
+	if (obj)
+		weirdobject_decref(obj);
+}
+
+/*
+ * Run a function and return a new reference, or NULL for RETURN_NONE.
+ * Sets *error to 1 if the bytecode is invalid.
+ */
+static struct WeirdObject *run_function(struct Program *program,
+	struct Function *func, struct WeirdObject **args, int *error)
+{
+	// every instruction pushes at most one thing, and it runs at most
+	// once because jumps only go forward
+	struct WeirdObject **stack = allocate((func->codelen + 1) * sizeof (struct WeirdObject *));
+	struct WeirdObject **locals = allocate(func->nlocals * sizeof (struct WeirdObject *));
+	size_t sp = 0;
+	struct WeirdObject *result = NULL;
+	struct Reader reader = { func->code, func->code + func->codelen, 0 };
+
+	for (uint16_t i = 0; i < func->nlocals; i++)
+		locals[i] = (i < func->nargs ? args[i] : NULL);
+
+	while (!reader.error) {
+		int opcode = read_int(&reader, 1);
+		if (reader.error)
+			break;
+
+		switch (opcode) {
+		case WEIRDVM_LOAD_CONST: {
+			uint16_t index = read_int(&reader, 2);
+			if (reader.error || index >= program->nconsts) {
+				reader.error = 1;
+				break;
+			}
+			weirdobject_incref(program->consts[index]);
+			stack[sp++] = program->consts[index];
+			break;
+		}
+		case WEIRDVM_LOAD_LOCAL: {
+			uint16_t index = read_int(&reader, 2);
+			if (reader.error || index >= func->nlocals || !locals[index]) {
+				reader.error = 1;
+				break;
+			}
+			weirdobject_incref(locals[index]);
+			stack[sp++] = locals[index];
+			break;
+		}
+		case WEIRDVM_STORE_LOCAL: {
+			uint16_t index = read_int(&reader, 2);
+			if (reader.error || index >= func->nlocals || sp == 0) {
+				reader.error = 1;
+				break;
+			}
+			decref_if_not_null(locals[index]);
+			locals[index] = stack[--sp];
+			break;
+		}
+		case WEIRDVM_LOAD_TRUE:
+			stack[sp++] = weirdbool_TRUE;
+			break;
+		case WEIRDVM_LOAD_FALSE:
+			stack[sp++] = weirdbool_FALSE;
+			break;
+		case WEIRDVM_CALL: {
+			uint16_t index = read_int(&reader, 2);
+			if (reader.error || index >= program->nfuncs
+					|| sp < program->funcs[index].nargs) {
+				reader.error = 1;
+				break;
+			}
+			// the callee takes the references to the arguments
+			sp -= program->funcs[index].nargs;
+			struct WeirdObject *value = run_function(
+				program, &program->funcs[index], stack + sp, error);
+			if (*error) {
+				reader.error = 1;
+				break;
+			}
+			if (value)
+				stack[sp++] = value;
+			break;
+		}
+		case WEIRDVM_PRINT:
+			if (sp == 0) {
+				reader.error = 1;
+				break;
+			}
+			print_string(stack[--sp]);
+			weirdobject_decref(stack[sp]);
+			break;
+		case WEIRDVM_INPUT:
+			stack[sp++] = read_line();
+			break;
+		case WEIRDVM_POP:
+			if (sp == 0) {
+				reader.error = 1;
+				break;
+			}
+			weirdobject_decref(stack[--sp]);
+			break;
+		case WEIRDVM_JUMP_IF_FALSE: {
+			uint32_t offset = read_int(&reader, 4);
+			// a backward jump could loop and overflow the stack
+			if (reader.error || sp == 0
+					|| offset < (size_t) (reader.pos - func->code)
+					|| offset >= func->codelen) {
+				reader.error = 1;
+				break;
+			}
+			if (!weirdbool_asint(stack[--sp]))
+				reader.pos = func->code + offset;
+			break;
+		}
+		case WEIRDVM_RETURN:
+			if (sp == 0) {
+				reader.error = 1;
+				break;
+			}
+			result = stack[--sp];
+			goto done;
+		case WEIRDVM_RETURN_NONE:
+			goto done;
+		default:
+			reader.error = 1;
+			break;
+		}
+	}
+
+done:
+	if (reader.error)
+		*error = 1;
+	while (sp > 0)
+		weirdobject_decref(stack[--sp]);
+	for (uint16_t i = 0; i < func->nlocals; i++)
+		decref_if_not_null(locals[i]);
+	free(stack);
+	free(locals);
+	return result;
+}
+
+int weirdvm_run(const unsigned char *bytecode, size_t len)
+{
+	struct Reader reader = { bytecode, bytecode + len, 0 };
+	struct Program program;
+	int error = 0;
+
+	const unsigned char *magic = read_bytes(&reader, MAGIC_LEN);
+	if (!magic || memcmp(magic, MAGIC, MAGIC_LEN) != 0)
+		return 1;
+	read_bytes(&reader, KEY_LEN);
+
+	weirdbool_init();
+	if (load_program(&reader, &program)) {
+		uint32_t main_index = read_int(&reader, 4);
+		if (reader.error || main_index >= program.nfuncs
+				|| program.funcs[main_index].nargs != 0) {
+			error = 1;
+		} else {
+			struct WeirdObject *result = run_function(
+				&program, &program.funcs[main_index], NULL, &error);
+			decref_if_not_null(result);
+		}
+	} else {
+		error = 1;
+	}
+
+	free_program(&program);
+	weirdbool_finalize();
+	return error;
+}
@@ -0,0 +1,39 @@
+#ifndef WEIRD_VM_H_
+#define WEIRD_VM_H_
+
+#include <stddef.h>
+
+/**
+ * Opcodes of the bytecode that weirdc/bytecode.py creates.
+ *
+ * The VM is a stack machine. Every function call has its own stack and
+ * local variables, and the arguments are the first local variables.
+ * The stack and the local variables own references to their objects.
+ */
+enum WeirdVM_Opcode {
+	WEIRDVM_LOAD_CONST = 0,		// u16 index, push a constant
+	WEIRDVM_LOAD_LOCAL = 1,		// u16 index, push a local variable
+	WEIRDVM_STORE_LOCAL = 2,	// u16 index, pop to a local variable
+	WEIRDVM_LOAD_TRUE = 3,
+	WEIRDVM_LOAD_FALSE = 4,
+	WEIRDVM_CALL = 5,		// u16 index, pop arguments and call a function
+	WEIRDVM_PRINT = 6,		// pop a String and print it
+	WEIRDVM_INPUT = 7,		// read a line and push it as a String
+	WEIRDVM_POP = 8,
+	WEIRDVM_JUMP_IF_FALSE = 9,	// u32 offset, pop a Bool and jump if it's FALSE
+	WEIRDVM_RETURN = 10,		// pop a value and return it
+	WEIRDVM_RETURN_NONE = 11,
+};
+
+/**
+ * Run bytecode from ``weirdc/bytecode.py``.
+ *
+ * The bytecode is not modified and it's not needed after this returns.
+ *
+ * @param bytecode the content of a bytecode file
+ * @param len number of bytes in the bytecode
+ * @return 0 on success, 1 if the bytecode is invalid
+ */
+int weirdvm_run(const unsigned char *bytecode, size_t len);
+
+#endif		// WEIRD_VM_H_
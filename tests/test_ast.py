@@ -224,3 +224,109 @@ def test_function_defs():
     # FIXME: uncomment this and fix ast.py
     #assert get_ast('function f(Int i) { f(i) }  // this is stupid') == [
     #]
+
+
+def test_import(error_at):
+    assert get_ast('import thing from "lib.weird"') == [
+        ast.Import(Location(0, 29), 'thing', 'lib.weird'),
+    ]
+
+    with error_at(11, 15, msg="this should be 'from'"):
+        get_ast('import lol frum "lib.weird"')
+
+
+def test_token_buffer_stays_small():
+    parser = ast._Parser(tokenizer.tokenize('f()\n' * 10000))
+    buffer_sizes = set()
+    for node in parser.parse_file():
+        buffer_sizes.add(len(parser.tokens._buffer))
+    assert max(buffer_sizes) <= ast._BUFFER_CLEANUP_SIZE + 2
+
+
+REPARSE_CODE = '''\
+function a() {
+    print("a")
+}
+
+function b(Int x) returns Int {
+    if x {
+        return x
+    }
+}
+Int y = 2
+
+function c() {
+\tprint("c")
+}
+'''
+
+
+def check_reparse(code, offset, removed_length, inserted_text):
+    new_code = code[:offset] + inserted_text + code[offset+removed_length:]
+    old_nodes = get_ast(code)
+    new_nodes = ast.reparse(code, old_nodes, offset, removed_length,
+                            inserted_text)
+    assert new_nodes == get_ast(new_code)
+    return old_nodes, new_nodes
+
+
+def test_reparse():
+    code = REPARSE_CODE
+
+    # change something in b, a and c are reused
+    offset = code.index('return x')
+    old, new = check_reparse(code, offset, len('return x'), 'return 123')
+    assert new[0] is old[0]
+    assert new[1] is not old[1]
+    assert all(new_node is old_node
+               for new_node, old_node in zip(new[2:], old[2:]))
+
+    # adding lines shifts the line numbers of the nodes after the edit
+    offset = code.index('    print("a")')
+    old, new = check_reparse(code, offset, 0, '    print("x")\n' * 3)
+    assert new[-1] is old[-1]
+    assert new[-1].location.lineno == 15
+    assert new[-1].body[0].location.lineno == 16
+
+    # removing lines
+    offset = code.index('\nfunction b')
+    old, new = check_reparse(code, offset, 1, '')
+    assert new[-1] is old[-1]
+    assert new[-1].location.lineno == 11
+
+    # adding statements
+    check_reparse(code, code.index('Int y'), 0, 'print("hi")\n')
+    check_reparse(code, len(code), 0, 'function d() {\n}\n')
+    check_reparse(code, 0, 0, 'print("first")\n')
+
+    # every single-character deletion and insertion that doesn't break
+    # anything
+    for offset in range(len(code)):
+        for removed, inserted in [(1, ''), (0, '\n'), (0, 'x'), (1, '}')]:
+            try:
+                get_ast(code[:offset] + inserted + code[offset+removed:])
+            except CompileError:
+                continue
+            check_reparse(code, offset, removed, inserted)
+
+
+def test_reparse_errors():
+    # the errors must be the same as without reparse()
+    code = REPARSE_CODE
+    edits = [
+        (code.index('}\n\nfunction b'), 1, ''),      # missing }
+        (code.index('if x'), 0, 'if if '),
+        (code.index('Int y'), 0, '$'),
+        (code.index('2\n'), 1, '(2'),
+        (len(code), 0, 'function'),
+    ]
+    for offset, removed_length, inserted_text in edits:
+        new_code = (code[:offset] + inserted_text +
+                    code[offset+removed_length:])
+        with pytest.raises(CompileError) as expected:
+            get_ast(new_code)
+        with pytest.raises(CompileError) as actual:
+            ast.reparse(code, get_ast(code), offset, removed_length,
+                        inserted_text)
+        assert actual.value.message == expected.value.message
+        assert actual.value.location == expected.value.location
@@ -0,0 +1,129 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from weirdc import batch, buildcache, runtime
+
+
+def test_jobserver():
+    read_fd, write_fd = os.pipe()
+    try:
+        os.write(write_fd, b'+')
+        jobserver = batch.JobServer.from_makeflags(
+            ' -j2 --jobserver-auth=%d,%d' % (read_fd, write_fd))
+
+        # the first slot is implicit, the second one is read from make
+        implicit = jobserver.acquire()
+        token = jobserver.acquire()
+        assert token == b'+'
+
+        jobserver.release(token)
+        jobserver.release(implicit)
+        assert os.read(read_fd, 1) == b'+'
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+
+def test_no_jobserver():
+    assert batch.JobServer.from_makeflags('') is None
+    assert batch.JobServer.from_makeflags('-j --jobserver-auth=1234,1235') \
+        is None
+
+
+def test_find_sources(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    for path in ['b.weird', 'a.weird', 'sub/c.weird', 'README']:
+        (tmp_path / path).write_text('')
+    assert batch.find_sources(str(tmp_path)) == [
+        str(tmp_path / 'a.weird'),
+        str(tmp_path / 'b.weird'),
+        str(tmp_path / 'sub' / 'c.weird'),
+    ]
+
+
+@pytest.mark.skipif(shutil.which('gcc') is None, reason="gcc not found")
+def test_build(tmp_path):
+    (tmp_path / 'good.weird').write_text('function main() { }\n')
+    (tmp_path / 'bad.weird').write_text('function lel() { }\n')
+
+    builder = batch.Builder(runtime.Runtime(str(tmp_path / 'cache')),
+                            'gcc {cfile} -std=c99 -o {outfile}', jobs=2)
+    results = []
+    builder.build([(str(tmp_path / 'good.weird'), str(tmp_path / 'good')),
+                   (str(tmp_path / 'bad.weird'), str(tmp_path / 'bad'))],
+                  results.append)
+
+    results.sort(key=lambda result: result.path)
+    assert [result.success for result in results] == [False, True]
+    assert "there's no main() function" in results[0].messages[0]
+    assert os.path.isfile(str(tmp_path / 'good'))
+
+
+@pytest.mark.skipif(shutil.which('gcc') is None, reason="gcc not found")
+def test_cache(tmp_path, monkeypatch):
+    (tmp_path / 'hello.weird').write_text('function main() { }\n')
+    paths_and_outfiles = [(str(tmp_path / 'hello.weird'),
+                           str(tmp_path / 'hello'))]
+    builder = batch.Builder(runtime.Runtime(str(tmp_path / 'cache')),
+                            'gcc {cfile} -std=c99 -o {outfile}', jobs=1,
+                            cache=buildcache.BuildCache(
+                                str(tmp_path / 'cache')))
+    results = []
+    builder.build(paths_and_outfiles, results.append)
+    assert [result.cached for result in results] == [False]
+
+    # cache hits must not use the process pool
+    def no_processes(*args, **kwargs):
+        raise AssertionError("a process pool was used")
+
+    monkeypatch.setattr(batch, '_generate_c', no_processes)
+    results.clear()
+    builder.build(paths_and_outfiles, results.append)
+    assert [(result.success, result.cached) for result in results] == [
+        (True, True)]
+
+
+@pytest.mark.skipif(shutil.which('gcc') is None, reason="gcc not found")
+def test_cache_size(tmp_path, capsys):
+    (tmp_path / 'src').mkdir()
+    (tmp_path / 'src' / 'hello.weird').write_text('function main() { }\n')
+    cache_dir = tmp_path / 'cache'
+
+    def cached_files():
+        return [path for path in cache_dir.iterdir() if path.is_file()]
+
+    batch.main([str(tmp_path / 'src'), '-j', '1',
+                '--cache-dir', str(cache_dir)])
+    assert len(cached_files()) == 1
+
+    # everything is cached, but the cache is too big after this
+    batch.main([str(tmp_path / 'src'), '-j', '1',
+                '--cache-dir', str(cache_dir), '--cache-size', '0'])
+    assert 'cached' in capsys.readouterr().out
+    assert cached_files() == []
+
+
+@pytest.mark.skipif(shutil.which('gcc') is None, reason="gcc not found")
+def test_imports(tmp_path):
+    (tmp_path / 'lib.weird').write_text(
+        'function greet() {\n    print("hello")\n}\n')
+    (tmp_path / 'main.weird').write_text(
+        'import greet from "lib.weird"\nfunction main() {\n    greet()\n}\n')
+    (tmp_path / 'other.weird').write_text('function main() { }\n')
+
+    builder = batch.Builder(runtime.Runtime(str(tmp_path / 'cache')),
+                            'gcc {cfile} -std=c99 -o {outfile}', jobs=2)
+    results = []
+    builder.build([(str(tmp_path / (name + '.weird')), str(tmp_path / name))
+                   for name in ['lib', 'main', 'other']], results.append)
+
+    results.sort(key=lambda result: result.path)
+    assert [(os.path.basename(result.path), result.success)
+            for result in results] == [('main.weird', True),
+                                       ('other.weird', True)]
+    assert not os.path.exists(str(tmp_path / 'lib'))
+    assert 'hello' in subprocess.check_output(
+        [str(tmp_path / 'main')]).decode('utf-8')
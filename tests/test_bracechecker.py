@@ -21,3 +21,29 @@ def test_the_brace_checker_like_everything_about_it(error_at):
 
     with error_at(2, 3, msg="should be '}'"):
         check('{ )')
+
+
+@pytest.mark.parametrize('code', ['{ {', '{ } }', '{ )', '(\n  (\n)', '{()}'])
+def test_check_while_tokenizing(code):
+    try:
+        check(code)
+    except CompileError as e:
+        expected = (e.message, e.location)
+    else:
+        expected = None
+
+    for tokens in [tokenizer.tokenize(code, check_braces=True),
+                   tokenizer.tokenize_chunks(code, check_braces=True)]:
+        try:
+            list(tokens)
+        except CompileError as e:
+            assert (e.message, e.location) == expected
+        else:
+            assert expected is None
+
+
+def test_errors_come_when_tokenizer_gets_there():
+    tokens = tokenizer.tokenize('a }\nb', check_braces=True)
+    assert next(tokens).value == 'a'
+    with pytest.raises(CompileError):
+        next(tokens)
@@ -0,0 +1,69 @@
+import os
+
+from weirdc import buildcache
+
+
+def test_lookup_and_store(tmp_path):
+    cache = buildcache.BuildCache(str(tmp_path / 'cache'))
+    executable = tmp_path / 'a.out'
+    executable.write_bytes(b'pretend this is an executable')
+    outfile = str(tmp_path / 'b.out')
+
+    key = buildcache.hash_parts('function main() { }', 'gcc {cfile}')
+    assert not cache.lookup(key, outfile)
+    assert not os.path.exists(outfile)
+
+    cache.store(key, str(executable))
+    assert cache.lookup(key, outfile)
+    with open(outfile, 'rb') as file:
+        assert file.read() == b'pretend this is an executable'
+
+    # the outfile is overwritten on the next hit
+    assert cache.lookup(key, outfile)
+
+
+def test_lru_eviction(tmp_path):
+    cache = buildcache.BuildCache(str(tmp_path / 'cache'), max_size=25)
+    executable = tmp_path / 'a.out'
+    executable.write_bytes(b'x' * 10)
+
+    cache.store('first', str(executable))
+    cache.store('second', str(executable))
+    os.utime(str(tmp_path / 'cache' / 'first'), (1, 1))
+    os.utime(str(tmp_path / 'cache' / 'second'), (2, 2))
+
+    # 'first' is used, so 'second' is now the least recently used one
+    assert cache.lookup('first', str(tmp_path / 'b.out'))
+    cache.store('third', str(executable))
+    assert sorted(os.listdir(str(tmp_path / 'cache'))) == ['first', 'third']
+
+
+def test_directory_eviction(tmp_path):
+    cache = buildcache.BuildCache(str(tmp_path / 'cache'), max_size=25,
+                                  directories=True)
+    for mtime, name in enumerate(['first', 'second', 'third'], start=1):
+        directory = tmp_path / 'cache' / name
+        (directory / 'subdir').mkdir(parents=True)
+        (directory / 'subdir' / 'data').write_bytes(b'x' * 10)
+        os.utime(str(directory), (mtime, mtime))
+    (tmp_path / 'cache' / 'some_file').write_bytes(b'x' * 100)
+
+    cache.evict()
+    assert sorted(os.listdir(str(tmp_path / 'cache'))) == [
+        'second', 'some_file', 'third']
+
+
+def test_default_directory(monkeypatch, tmp_path):
+    monkeypatch.setenv('HOME', str(tmp_path / 'home'))
+    default = str(tmp_path / 'home' / '.cache' / 'weirdc')
+
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'xdg'))
+    assert buildcache.default_directory() == str(tmp_path / 'xdg' / 'weirdc')
+
+    # the XDG spec says that these must be ignored
+    for value in ['', 'relative/path']:
+        monkeypatch.setenv('XDG_CACHE_HOME', value)
+        assert buildcache.default_directory() == default
+
+    monkeypatch.delenv('XDG_CACHE_HOME')
+    assert buildcache.default_directory() == default
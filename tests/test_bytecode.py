@@ -0,0 +1,179 @@
+import os
+import shutil
+import struct
+import subprocess
+import sys
+
+import pytest
+
+from weirdc import CompileError, ast, bytecode, checker, runtime, tokenizer
+
+
+def compile_code(code, key=bytes(32)):
+    nodes = list(ast.parse(tokenizer.tokenize(code)))
+    checker.check(nodes, lambda warning: None)
+    return bytecode.compile_nodes(nodes, key)
+
+
+def test_format():
+    result = compile_code(
+        'function main() {\n'
+        '    print("hi\\n")\n'
+        '    print("hi\\n")\n'
+        '}\n')
+    assert result.startswith(bytecode.MAGIC + bytes(32))
+    rest = result[len(bytecode.MAGIC) + 32:]
+
+    # the string is a constant only once, and the escape is decoded
+    assert rest[:4] == struct.pack('<I', 1)
+    assert rest[4:12] == struct.pack('<BI', 0, 3) + b'hi\n'
+
+    code = bytes([bytecode.LOAD_CONST, 0, 0, bytecode.PRINT] * 2
+                 + [bytecode.RETURN_NONE])
+    assert rest[12:] == (struct.pack('<IHHI', 1, 0, 0, len(code)) + code
+                         + struct.pack('<I', 0))
+
+
+def test_if_jump():
+    result = compile_code(
+        'function main() {\n'
+        '    if TRUE {\n'
+        '        print("x")\n'
+        '    }\n'
+        '}\n')
+    # skip the header, the "x" constant and the function's header
+    code = result[len(bytecode.MAGIC) + 32 + 10 + 4 + 8:-4]
+    assert code[0] == bytecode.LOAD_TRUE
+    assert code[1] == bytecode.JUMP_IF_FALSE
+    assert struct.unpack('<I', code[2:6]) == (len(code) - 1,)
+
+
+def test_imports_not_supported():
+    nodes = list(ast.parse(tokenizer.tokenize(
+        'import f from "f.weird"\nfunction main() { }\n')))
+    with pytest.raises(CompileError):
+        bytecode.compile_nodes(nodes)
+
+
+def test_limits(monkeypatch, error_at):
+    with error_at(6, 26, 4, msg=("the bytecode backend doesn't support "
+                                 "integers bigger than %d" % (2**64 - 1))):
+        compile_code('function f(Int i) {\n}\n'
+                     'function main() {\n'
+                     '    f(18446744073709551616)\n'
+                     '}\n')
+
+    monkeypatch.setattr(bytecode, '_MAX_COUNT', 2)
+    with error_at(4, 10, 4, msg=("the bytecode backend supports at most 2 "
+                                 "local variables in a function")):
+        compile_code('function main() {\n'
+                     '    Bool a = TRUE\n    Bool b = TRUE\n'
+                     '    Bool c = TRUE\n'
+                     '    if a {\n    }\n    if b {\n    }\n'
+                     '    if c {\n    }\n'
+                     '}\n')
+    with error_at(10, 13, 4, msg=("the bytecode backend supports at most 2 "
+                                  "different constants")):
+        compile_code('function main() {\n'
+                     '    print("a")\n    print("b")\n    print("c")\n}\n')
+    with error_at(0, None, 5, msg=("the bytecode backend supports at most 2 "
+                                   "functions")):
+        compile_code('function f() {\n}\nfunction g() {\n}\n'
+                     'function main() {\n}\n')
+
+
+def test_cache(tmp_path, monkeypatch):
+    source = str(tmp_path / 'hello.weird')
+    code = 'function main() { }\n'
+    assert bytecode.load_cached(source, code) is None
+
+    path = bytecode.save_cached(
+        source, compile_code(code, bytecode.cache_key(code)))
+    assert path == str(tmp_path / '__weirdcache__' / 'hello.wbc')
+    assert bytecode.load_cached(source, code) == path
+    assert bytecode.load_cached(source, code + '\n') is None
+
+    # a new VM or bytecode format can't use old bytecode
+    with monkeypatch.context() as patch:
+        patch.setattr(bytecode, '_vm_fingerprint', lambda: 'new vm')
+        assert bytecode.load_cached(source, code) is None
+    with monkeypatch.context() as patch:
+        patch.setattr(bytecode, 'FORMAT_VERSION', 2)
+        assert bytecode.load_cached(source, code) is None
+    assert bytecode.load_cached(source, code) == path
+
+
+@pytest.mark.skipif(shutil.which('gcc') is None, reason="gcc not found")
+def test_vm(tmp_path):
+    (tmp_path / 'hello.weird').write_text(
+        'function greeting() returns String {\n'
+        '    return "world"\n'
+        '}\n'
+        'function main() {\n'
+        '    String x = greeting()\n'
+        '    if TRUE {\n'
+        '        print("hello ")\n'
+        '    }\n'
+        '    if FALSE {\n'
+        '        print("nope")\n'
+        '    }\n'
+        '    print(x)\n'
+        '    print("\\n")\n'
+        '}\n')
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    def run():
+        return subprocess.check_output(
+            [sys.executable, '-m', 'weirdc', '--vm', '-v',
+             '--cache-dir', str(tmp_path / 'cache'),
+             str(tmp_path / 'hello.weird')],
+            cwd=project_root).decode('utf-8')
+
+    output = run()
+    assert 'Compiling to bytecode...' in output
+    assert 'hello world\n' in output
+    assert 'nope' not in output
+
+    output = run()
+    assert 'Using the cached bytecode' in output
+    assert 'hello world\n' in output
+
+
+def test_vm_imports(tmp_path):
+    (tmp_path / 'lib.weird').write_text('function f() {\n}\n')
+    (tmp_path / 'main.weird').write_text(
+        'import f from "lib.weird"\nfunction main() {\n    f()\n}\n')
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    process = subprocess.run(
+        [sys.executable, '-m', 'weirdc', '--vm',
+         '--cache-dir', str(tmp_path / 'cache'),
+         str(tmp_path / 'main.weird')],
+        cwd=str(tmp_path), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        env=dict(os.environ, PYTHONPATH=project_root,
+                 WEIRDC_SOCKET=str(tmp_path / 'no-server')))
+    assert process.returncode == 1
+    assert b"--vm doesn't work with files that import" in process.stderr
+    assert not os.path.exists(str(tmp_path / 'a.out'))
+
+
+@pytest.mark.skipif(shutil.which('gcc') is None, reason="gcc not found")
+def test_vm_rejects_bad_jumps(tmp_path):
+    the_runtime = runtime.Runtime(str(tmp_path / 'cache'))
+    the_runtime.build_vm()
+
+    def run(jump_target):
+        code = bytes([bytecode.LOAD_FALSE, bytecode.JUMP_IF_FALSE])
+        code += struct.pack('<I', jump_target) + bytes([bytecode.RETURN_NONE])
+        (tmp_path / 'test.wbc').write_bytes(
+            bytecode.MAGIC + bytes(32) + struct.pack('<I', 0)
+            + struct.pack('<IHHI', 1, 0, 0, len(code)) + code
+            + struct.pack('<I', 0))
+        return subprocess.run([the_runtime.vm, str(tmp_path / 'test.wbc')],
+                              stderr=subprocess.PIPE)
+
+    assert run(6).returncode == 0
+    for bad_target in [0, 5, 7, 1000]:
+        process = run(bad_target)
+        assert process.returncode == 1
+        assert b'invalid bytecode' in process.stderr
@@ -52,6 +52,27 @@ def test_unused_vars(error_at):
     }
     ''', [("this variable isn't used anywhere", 8, 16, 2)]) == [empty_main]
 
+    # the assignment is in a different scope than the declaration
+    [main] = check_code('''\
+    function main() {
+        Bool lol
+        if TRUE {
+            lol = TRUE
+        }
+    }
+    ''', [("this variable isn't used anywhere", 8, 16, 2)])
+    [if_statement] = main.body
+    assert if_statement.body == []
+
+    # the function is still called
+    [main] = check_code('''\
+    function main() {
+        String s = input()
+        s = input()
+    }
+    ''', [("this variable isn't used anywhere", 8, 16, 2)])
+    assert [type(node) for node in main.body] == [ast.FunctionCall] * 2
+
 
 def test_nothing_returned(error_at):
     check_code('''\
@@ -162,6 +183,28 @@ def test_wrong_type(error_at):
         ''')
 
 
+def test_if_condition(error_at):
+    # the variable is used in the condition, so it must not be removed
+    [main] = check_code('''\
+    function main() {
+        Bool flag = TRUE
+        if flag {
+            print("hi")
+        }
+    }
+    ''')
+    assert [type(node) for node in main.body] == [
+        ast.Declaration, ast.Assignment, ast.If]
+
+    with error_at(15, 18, 2, msg="this should be a Bool, not an Int"):
+        check_code('''\
+        function main() {
+            if 123 {
+            }
+        }
+        ''')
+
+
 def test_function_assign(error_at):
     # TODO: this error message kind of sucks
     with error_at(12, 15, 3, msg="functions can't be changed like this"):
@@ -236,3 +279,34 @@ def test_returns(error_at):
             thing()
         }
         ''')
+
+
+def test_imports(error_at):
+    interfaces = {'lib.weird': {
+        'greet': checker.FunctionType('greet', [checker.STRING_TYPE], None),
+    }}
+
+    nodes = list(ast.parse(tokenizer.tokenize('''\
+    import greet from "lib.weird"
+    function main() {
+        greet("world")
+    }
+    ''')))
+    checker.check(nodes, print, interfaces)
+    assert nodes[0].functype is interfaces['lib.weird']['greet']
+
+    with error_at(4, 33, 1, msg="'lib.weird' has no function named 'shout'"):
+        checker.check(list(ast.parse(tokenizer.tokenize('''\
+    import shout from "lib.weird"
+    function main() { }
+    '''))), print, interfaces)
+
+    with error_at(4, 33, 1, msg="cannot find 'lol.weird'"):
+        checker.check(list(ast.parse(tokenizer.tokenize('''\
+    import greet from "lol.weird"
+    function main() { }
+    '''))), print, interfaces)
+
+    # modules that are imported don't need main functions
+    checker.check(list(ast.parse(tokenizer.tokenize(
+        'function lel() { }'))), print, require_main=False)
@@ -0,0 +1,100 @@
+import io
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from weirdc import CompileError, LineIndex, Location, compiler
+
+
+FIRST = '''\
+function hello() {
+    print("hello")
+}
+function main() {
+    hello()
+}
+'''
+
+SECOND = '''\
+function world() {
+    print("world")
+}
+function main() {
+    world()
+}
+'''
+
+
+def test_generate_c_is_deterministic():
+    first = compiler.generate_c(FIRST)
+    second = compiler.generate_c(SECOND)
+
+    # compiling in a different order or many times gives the same code
+    assert compiler.generate_c(SECOND) == second
+    assert compiler.generate_c(FIRST) == first
+    assert 'void name1(void)' in first
+    assert 'void name1(void)' in second
+
+
+def test_compile_many(tmp_path):
+    paths = []
+    for name, code in [('first.weird', FIRST), ('second.weird', SECOND),
+                       ('unused.weird', 'function main() {\n  Int i\n}\n')]:
+        (tmp_path / name).write_text(code)
+        paths.append(str(tmp_path / name))
+
+    warnings = []
+    result = compiler.compile_many(
+        paths, lambda path, warning: warnings.append((path, warning.message)))
+
+    assert list(result) == paths
+    assert result[paths[0]] == compiler.generate_c(FIRST)
+    assert warnings == [(paths[2], "this variable isn't used anywhere")]
+
+
+def test_write_c():
+    file = io.StringIO()
+    compiler.write_c(FIRST, file)
+    assert file.getvalue() == compiler.generate_c(FIRST)
+
+
+def test_write_c_checks_lazily():
+    parts = []
+
+    class File:
+        def write(self, part):
+            parts.append(part)
+
+    # the first function is written before the error in the second one
+    with pytest.raises(CompileError):
+        compiler.write_c(FIRST + 'function bad() {\n    wat()\n}\n', File())
+    assert 'void name1(void) {' in ''.join(parts)
+
+
+@pytest.mark.skipif(shutil.which('gcc') is None, reason="gcc not found")
+def test_streaming_to_gcc(tmp_path):
+    (tmp_path / 'hello.weird').write_text(FIRST)
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, WEIRDC_SOCKET=str(tmp_path / 'no-server'))
+    output = subprocess.check_output(
+        [sys.executable, '-m', 'weirdc', '--no-cache',
+         '--cache-dir', str(tmp_path / 'cache'),
+         '-o', str(tmp_path / 'hello'), str(tmp_path / 'hello.weird')],
+        cwd=project_root, env=env).decode('utf-8')
+    assert ' -x c - ' in output
+    assert b'hello' in subprocess.check_output([str(tmp_path / 'hello')])
+
+
+def test_show_error_tabs():
+    code = 'function main() {\n\tlol\n}\n'
+    error = CompileError("bad", Location(4, 7, 2))
+    assert compiler.show_error(error, 'test', code).splitlines() == [
+        "error in file 'test', line 2: bad",
+        "  lol",
+        "  ^^^",
+    ]
+    assert (compiler.show_error(error, 'test', LineIndex(code)) ==
+            compiler.show_error(error, 'test', code))
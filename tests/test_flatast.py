@@ -0,0 +1,70 @@
+from weirdc import (
+    Location, ast, c_output, checker, flatast, stats, tokenizer)
+
+
+CODE = '''\
+import greet from "lib.weird"
+
+function f(Int a, String b) returns String {
+    String x = "hello"
+    String unused = "lol"
+    Int y
+    y = 1
+    if TRUE {
+        print(x)
+    }
+    return x
+}
+
+function main() {
+    print(f(1, "x"))
+    greet("world")
+}
+'''
+
+INTERFACES = {'lib.weird': {
+    'greet': checker.FunctionType('greet', [checker.STRING_TYPE], None),
+}}
+
+
+def test_views_look_like_nodes():
+    nodes = list(ast.parse(tokenizer.tokenize(CODE)))
+    tree = flatast.parse(tokenizer.tokenize(CODE))
+    views = tree.nodes()
+    assert views == nodes
+
+    function = views[1]
+    assert isinstance(function, ast.FunctionDef)
+    assert function.location == Location(0, None, 3)
+    assert function.name == 'f'
+    assert function.returntype == ast.Name(Location(36, 42, 3), 'String')
+    assert function.args == nodes[1].args
+    assert len(tree) == stats.count_nodes(nodes)
+    assert tree.strings.count('x') == 1
+
+
+def test_check_and_c_output():
+    nodes = list(ast.parse(tokenizer.tokenize(CODE)))
+    views = flatast.parse(tokenizer.tokenize(CODE)).nodes()
+
+    node_warnings = []
+    view_warnings = []
+    checker.check(nodes, node_warnings.append, INTERFACES)
+    checker.check(views, view_warnings.append, INTERFACES)
+    assert ([(warning.message, warning.location) for warning in view_warnings]
+            == [(warning.message, warning.location)
+                for warning in node_warnings])
+    assert views[0].functype is INTERFACES['lib.weird']['greet']
+    prefixes = {'lib.weird': 'lib_'}
+    assert (c_output.make_c_code(views, 'lol_', prefixes) ==
+            c_output.make_c_code(nodes, 'lol_', prefixes))
+
+
+def test_changing_views():
+    tree = flatast.parse(tokenizer.tokenize(CODE))
+    function = tree.nodes()[1]
+    function.body = function.body[:1]
+    assert len(function.body) == 1
+
+    # the tree doesn't change
+    assert len(tree.nodes()[1].body) == 8
@@ -0,0 +1,100 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from weirdc import modules, runtime
+
+
+pytestmark = pytest.mark.skipif(shutil.which('gcc') is None,
+                                reason="gcc not found")
+
+
+@pytest.fixture
+def builder(tmp_path):
+    the_runtime = runtime.Runtime(str(tmp_path / 'cache'))
+    the_runtime.build()
+    messages = []
+    the_builder = modules.ModuleBuilder(
+        str(tmp_path / 'cache' / 'modules'), the_runtime, messages.append)
+    the_builder.messages = messages
+    return the_builder
+
+
+def write(path, code):
+    with open(str(path), 'w') as file:
+        file.write(code)
+
+
+def compiled_modules(messages):
+    return sorted(os.path.basename(message.split("'")[1])
+                  for message in messages if message.startswith('Compiling'))
+
+
+def test_separate_compilation(builder, tmp_path):
+    write(tmp_path / 'lib.weird', 'function hello() {\n print("hi")\n}\n')
+    write(tmp_path / 'main.weird', 'import hello from "lib.weird"\n'
+                                   'function main() {\n hello()\n}\n')
+    outfile = str(tmp_path / 'a.out')
+
+    builder.build(str(tmp_path / 'main.weird'), outfile)
+    assert compiled_modules(builder.messages) == ['lib.weird', 'main.weird']
+    output = subprocess.check_output([outfile]).decode('utf-8')
+    assert 'hi' in output
+
+    # nothing changed
+    builder.messages.clear()
+    builder.build(str(tmp_path / 'main.weird'), outfile)
+    assert compiled_modules(builder.messages) == []
+
+    # the interface of lib.weird doesn't change
+    write(tmp_path / 'lib.weird', 'function hello() {\n print("ho")\n}\n')
+    builder.messages.clear()
+    builder.build(str(tmp_path / 'main.weird'), outfile)
+    assert compiled_modules(builder.messages) == ['lib.weird']
+    assert 'ho' in subprocess.check_output([outfile]).decode('utf-8')
+
+    # the interface changes, so main.weird must be checked again
+    write(tmp_path / 'lib.weird', 'function hello(String s) { }\n')
+    builder.messages.clear()
+    with pytest.raises(modules.ModuleCompileError) as error:
+        builder.build(str(tmp_path / 'main.weird'), outfile)
+    assert error.value.path == str(tmp_path / 'main.weird')
+    assert error.value.error.message == "should be hello(String), not hello()"
+
+
+def test_cc_template(builder, tmp_path):
+    write(tmp_path / 'main.weird', 'function main() {\n print("hi")\n}\n')
+    outfile = str(tmp_path / 'a.out')
+    builder.build(str(tmp_path / 'main.weird'), outfile)
+
+    # changing the flags compiles again
+    builder.cc_template = 'gcc {cfile} -std=c99 -O2 -lm -o {outfile}'
+    builder.messages.clear()
+    builder.build(str(tmp_path / 'main.weird'), outfile)
+    assert compiled_modules(builder.messages) == ['main.weird']
+    assert 'hi' in subprocess.check_output([outfile]).decode('utf-8')
+
+    builder.cc_template = 'gcc {cfile} -std=c99 -lthisdoesntexist -o {outfile}'
+    with pytest.raises(modules.ModuleBuildError):
+        builder.build(str(tmp_path / 'main.weird'), outfile)
+
+
+def test_import_cycle(builder, tmp_path):
+    write(tmp_path / 'a.weird', 'import b from "b.weird"\n'
+                                'function a() { }\n')
+    write(tmp_path / 'b.weird', 'import a from "a.weird"\n'
+                                'function b() { }\n')
+    with pytest.raises(modules.ModuleCompileError) as error:
+        builder.build(str(tmp_path / 'a.weird'), str(tmp_path / 'a.out'))
+    assert error.value.error.message == (
+        "importing 'a.weird' creates an import cycle")
+
+
+def test_has_imports():
+    assert modules.has_imports('import x from "y.weird"')
+    assert not modules.has_imports('function main() { }')
+    assert not modules.has_imports(';')
+    assert not modules.has_imports('function main() {\n    important()\n}')
+    assert not modules.has_imports('print("import x from y")')
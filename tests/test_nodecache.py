@@ -0,0 +1,84 @@
+import io
+import os
+
+import pytest
+
+from weirdc import CompileError, buildcache, compiler, nodecache
+
+
+CODE = '''\
+function main() {
+    String unused = "lol"
+    if TRUE {
+        print(input())
+    }
+}
+'''
+
+
+def messages(warnings):
+    return [(warning.message, warning.location) for warning in warnings]
+
+
+def test_load_and_store(tmp_path):
+    cache = nodecache.NodeCache(str(tmp_path))
+    warnings = []
+    assert cache.load(CODE, warnings.append) is None
+
+    nodes = compiler.check_code(CODE, warnings.append, cache)
+    assert len(warnings) == 1
+    assert len(os.listdir(str(tmp_path))) == 1
+
+    cached_warnings = []
+    assert cache.load(CODE, cached_warnings.append) == nodes
+    assert messages(cached_warnings) == messages(warnings)
+    assert (compiler.generate_c(CODE, node_cache=cache) ==
+            compiler.generate_c(CODE))
+
+
+def test_write_c(tmp_path):
+    cache = nodecache.NodeCache(str(tmp_path))
+    for i in range(2):
+        file = io.StringIO()
+        compiler.write_c(CODE, file, None, cache)
+        assert file.getvalue() == compiler.generate_c(CODE)
+    assert len(os.listdir(str(tmp_path))) == 1
+
+
+def test_errors(tmp_path):
+    cache = nodecache.NodeCache(str(tmp_path))
+    code = 'function main() {\n    String x = 1\n}\n'
+    with pytest.raises(CompileError) as error:
+        compiler.check_code(code, None, cache)
+
+    warnings = []
+    with pytest.raises(CompileError) as cached_error:
+        cache.load(code, warnings.append)
+    assert messages([cached_error.value]) == messages([error.value])
+    assert warnings == []
+
+
+def test_invalidation(tmp_path, monkeypatch):
+    cache = nodecache.NodeCache(str(tmp_path))
+    compiler.check_code(CODE, None, cache)
+    warnings = []
+    assert cache.load(CODE, warnings.append) is not None
+    assert len(warnings) == 1
+
+    warnings.clear()
+    assert cache.load(CODE + '\n', warnings.append) is None
+
+    # changing weirdc changes the fingerprint
+    monkeypatch.setattr(buildcache, 'compiler_fingerprint', lambda: 'lol')
+    assert cache.load(CODE, warnings.append) is None
+    assert warnings == []
+
+
+def test_broken_file(tmp_path):
+    cache = nodecache.NodeCache(str(tmp_path))
+    compiler.check_code(CODE, None, cache)
+    with open(str(tmp_path / nodecache.cache_key(CODE)), 'wb') as file:
+        file.write(b'lol')
+    warnings = []
+    assert cache.load(CODE, warnings.append) is None
+    assert warnings == []
@@ -0,0 +1,49 @@
+import os
+import shutil
+
+import pytest
+
+from weirdc import runtime
+
+
+@pytest.mark.skipif(shutil.which('gcc') is None, reason="gcc not found")
+def test_build(tmp_path):
+    the_runtime = runtime.Runtime(str(tmp_path), 'gcc')
+    assert not the_runtime.is_built()
+    the_runtime.build()
+    assert the_runtime.is_built()
+    assert os.path.isfile(os.path.join(the_runtime.directory, 'weird.h.gch'))
+
+    # the directory name comes from a hash of the runtime's source code,
+    # so building again with another Runtime object doesn't do anything
+    assert runtime.Runtime(str(tmp_path), 'gcc').is_built()
+    assert os.listdir(str(tmp_path)) == [os.path.basename(
+        the_runtime.directory)]
+
+
+def test_compile_args(tmp_path):
+    the_runtime = runtime.Runtime(str(tmp_path), 'gcc')
+    args = the_runtime.compile_args('lol.c')
+    assert args.index('lol.c') < args.index(the_runtime.library)
+
+    # the library must not be read as C code
+    args = the_runtime.compile_args('-')
+    assert args[-3:] == ['-x', 'none', the_runtime.library]
+
+
+def test_module_commands(tmp_path):
+    the_runtime = runtime.Runtime(str(tmp_path), 'gcc')
+    template = 'gcc {cfile} -std=c99 -O2 -lm -o {outfile}'
+    assert the_runtime.object_command(template, 'a.c', 'a.o') == [
+        'gcc', '-I' + the_runtime.directory, 'a.c', '-std=c99', '-O2', '-lm',
+        '-o', 'a.o', '-c']
+    assert the_runtime.link_command(template, ['a.o', 'b.o'], 'a.out') == [
+        'gcc', 'a.o', 'b.o', the_runtime.library, '-std=c99', '-O2', '-lm',
+        '-o', 'a.out']
+
+
+def test_reads_stdin():
+    assert runtime.reads_stdin('gcc')
+    assert runtime.reads_stdin('/usr/bin/gcc-12')
+    assert runtime.reads_stdin('clang')
+    assert not runtime.reads_stdin('tcc')
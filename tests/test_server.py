@@ -0,0 +1,106 @@
+import os
+import socket
+import stat
+import threading
+
+import pytest
+
+from weirdc import server, utils
+
+
+@pytest.fixture
+def running_server(tmp_path):
+    socket_path = str(tmp_path / 'weirdc.sock')
+    the_server = server.Server(socket_path)
+    thread = threading.Thread(target=the_server.serve_forever)
+    thread.start()
+    yield socket_path
+    the_server.shutdown()
+    thread.join()
+    the_server.server_close()
+
+
+def test_no_server(tmp_path):
+    assert server.send_request(['lol.weird'],
+                               str(tmp_path / 'nope.sock')) is None
+
+
+def test_compile(running_server, tmp_path, capsys):
+    (tmp_path / 'hello.weird').write_text(
+        'function main() {\n    print("hello")\n}\n')
+
+    old_cwd = os.getcwd()
+    os.chdir(str(tmp_path))
+    try:
+        status = server.send_request(
+            ['hello.weird', '--no-compile', '-o', 'hello.c'], running_server)
+    finally:
+        os.chdir(old_cwd)
+
+    assert status == 0
+    assert capsys.readouterr().out == "Generating the C code succeeded.\n"
+    assert 'do_the_print' in (tmp_path / 'hello.c').read_text()
+
+
+def test_errors(running_server, tmp_path, capsys):
+    (tmp_path / 'bad.weird').write_text('function lel() { }\n')
+    status = server.send_request(
+        [str(tmp_path / 'bad.weird'), '--no-compile'], running_server)
+    assert status == 1
+    assert "there's no main() function" in capsys.readouterr().err
+
+    # the server keeps running after errors
+    assert server.send_request(['--help'], running_server) == 0
+    assert 'usage: weirdc' in capsys.readouterr().out
+
+
+def test_no_abbreviations(running_server, tmp_path, capsys):
+    # main() would send --wat to the server, and it would watch forever
+    (tmp_path / 'hello.weird').write_text('function main() { }\n')
+    status = server.send_request(
+        ['--wat', str(tmp_path / 'hello.weird')], running_server)
+    assert status == 2
+    assert 'unrecognized arguments: --wat' in capsys.readouterr().err
+
+
+def test_environment(running_server, tmp_path, monkeypatch, capsys):
+    (tmp_path / 'hello.weird').write_text('function main() { }\n')
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'client-cache'))
+    status = server.send_request(
+        [str(tmp_path / 'hello.weird'), '-o', str(tmp_path / 'hello')],
+        running_server)
+    assert status == 0
+    assert (tmp_path / 'client-cache' / 'weirdc').is_dir()
+
+    # WEIRDC_DEBUG can't be changed without importing weirdc again
+    monkeypatch.setenv('WEIRDC_DEBUG', '0' if utils.DEBUG else '1')
+    assert server.send_request(['--help'], running_server) is None
+    assert capsys.readouterr().out.endswith("Compiling succeeded.\n")
+
+
+def test_crash(running_server, monkeypatch, capsys):
+    def crash(argv):
+        raise RuntimeError("oh no")
+
+    monkeypatch.setattr('weirdc.__main__.compile_main', crash)
+    status = server.send_request(['lol.weird'], running_server)
+    assert status == 1
+    assert 'RuntimeError: oh no' in capsys.readouterr().err
+
+
+def test_other_users(running_server, monkeypatch):
+    mode = stat.S_IMODE(os.stat(running_server).st_mode)
+    assert mode & 0o077 == 0
+
+    # pretend that the server runs as some other user
+    monkeypatch.setattr(os, 'getuid', lambda: os.geteuid() + 1)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(running_server)
+        try:
+            sock.sendall(b'{"argv": ["--help"], "cwd": "/"}')
+            sock.shutdown(socket.SHUT_WR)
+            response = sock.recv(65536)
+        except ConnectionError:
+            # the server closed the connection without reading
+            response = b''
+    assert response == b''
@@ -0,0 +1,55 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+
+@pytest.mark.skipif(shutil.which('gcc') is None, reason="gcc not found")
+def test_run(tmp_path):
+    (tmp_path / 'hello.weird').write_text(
+        'function main() {\n    print("hello world\\n")\n}\n')
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    def run(cc='gcc {cfile} -std=c99 -o {outfile}'):
+        return subprocess.check_output(
+            [sys.executable, '-m', 'weirdc', '--run', '-v', '--cc', cc,
+             '--cache-dir', str(tmp_path / 'cache'),
+             str(tmp_path / 'hello.weird')],
+            cwd=project_root).decode('utf-8')
+
+    output = run()
+    assert 'Compiling a shared object...' in output
+    assert 'hello world\n' in output
+
+    # the shared object is cached
+    output = run()
+    assert 'Cache hit' in output
+    assert 'hello world\n' in output
+
+    # the --cc template is used, and changing it compiles again
+    output = run('gcc {cfile} -std=c99 -DLOL=1 -Werror -o {outfile}')
+    assert 'Compiling a shared object...' in output
+    assert 'hello world\n' in output
+    with pytest.raises(subprocess.CalledProcessError):
+        run('gcc {cfile} -std=c99 --lol -o {outfile}')
+    assert not os.path.exists(str(tmp_path / 'a.out'))
+
+
+def test_run_imports(tmp_path):
+    (tmp_path / 'lib.weird').write_text('function f() {\n}\n')
+    (tmp_path / 'main.weird').write_text(
+        'import f from "lib.weird"\nfunction main() {\n    f()\n}\n')
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    process = subprocess.run(
+        [sys.executable, '-m', 'weirdc', '--run',
+         '--cache-dir', str(tmp_path / 'cache'),
+         str(tmp_path / 'main.weird')],
+        cwd=str(tmp_path), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        env=dict(os.environ, PYTHONPATH=project_root,
+                 WEIRDC_SOCKET=str(tmp_path / 'no-server')))
+    assert process.returncode == 1
+    assert b"--run doesn't work with files that import" in process.stderr
+    assert not os.path.exists(str(tmp_path / 'a.out'))
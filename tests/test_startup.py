@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# importing everything took about 100 milliseconds, mostly because of
+# these, and starting weirdc should be fast because it's often run many
+# times in a row
+SLOW_MODULES = ['argparse', 'hashlib', 'json', 're', 'socket', 'subprocess',
+                'tempfile']
+
+
+def import_times(args, env=None):
+    # returns {module name: cumulative import time in seconds}
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime'] + args,
+        cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        env=env).stderr.decode('utf-8')
+
+    result = {}
+    for line in output.splitlines():
+        # import time:  self [us] | cumulative | imported package
+        if line.startswith('import time:') and 'cumulative' not in line:
+            self_time, cumulative, name = line[len('import time:'):].split('|')
+            result[name.strip()] = int(cumulative) / 1e6
+    return result
+
+
+def test_import_main():
+    times = import_times(['-c', 'import weirdc.__main__'])
+    assert {name for name in times if name.startswith('weirdc')} == {
+        'weirdc', 'weirdc.__main__'}
+
+
+def test_no_slow_imports():
+    # python may import some of these at startup, e.g. because of .pth
+    # files, and then it's not weirdc's fault
+    imported = (set(import_times(['-c', 'import weirdc.__main__']))
+                - set(import_times(['-c', 'pass'])))
+    assert imported.isdisjoint(SLOW_MODULES)
+
+
+def test_compile_imports(tmp_path):
+    (tmp_path / 'hello.weird').write_text('function main() {\n}\n')
+    env = dict(os.environ, WEIRDC_SOCKET=str(tmp_path / 'no-server'))
+    times = import_times(
+        ['-m', 'weirdc', '--no-compile',
+         '--cache-dir', str(tmp_path / 'cache'),
+         '-o', str(tmp_path / 'hello.c'), str(tmp_path / 'hello.weird')], env)
+
+    assert 'weirdc.compiler' in times
+    for name in ['weirdc.batch', 'weirdc.bytecode', 'weirdc.shared',
+                 'weirdc.stats', 'weirdc.watch', 'concurrent.futures',
+                 'ctypes', 'tracemalloc']:
+        assert name not in times
@@ -0,0 +1,56 @@
+import json
+import os
+import subprocess
+import sys
+
+from weirdc import ast, compiler, stats, tokenizer
+
+
+CODE = '''\
+function main() {
+    print("hello")
+}
+'''
+
+
+def test_count_nodes():
+    nodes = list(ast.parse(tokenizer.tokenize(CODE)))
+    # FunctionDef, FunctionCall, Name and String
+    assert stats.count_nodes(nodes) == 4
+
+
+def test_generate_c():
+    the_stats = stats.Stats()
+    assert compiler.generate_c(CODE, the_stats=the_stats) == (
+        compiler.generate_c(CODE))
+    assert [name for name, seconds, peak in the_stats.phases] == [
+        'tokenizing', 'parsing', 'checking', 'code generation']
+    assert the_stats.counts == {
+        'tokens': 13, 'ast_nodes': 4, 'functions': 1,
+        'c_bytes': len(compiler.generate_c(CODE))}
+
+    for line in ['tokenizing', 'total']:
+        assert line in the_stats.format_phases()
+    assert 'ast nodes' in the_stats.format_counts()
+
+
+def test_stats_json(tmp_path):
+    (tmp_path / 'hello.weird').write_text(CODE)
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    # the compile server and the real cache must not be used
+    env = dict(os.environ, WEIRDC_SOCKET=str(tmp_path / 'no-server'))
+    output = subprocess.run(
+        [sys.executable, '-m', 'weirdc', '--no-compile', '--time-passes',
+         '--stats-json', str(tmp_path / 'stats.json'),
+         '--cache-dir', str(tmp_path / 'cache'),
+         '-o', str(tmp_path / 'hello.c'), str(tmp_path / 'hello.weird')],
+        cwd=project_root, stderr=subprocess.PIPE, check=True, env=env,
+    ).stderr.decode('utf-8')
+    assert 'parsing' in output
+    assert 'ast nodes' not in output
+
+    with open(str(tmp_path / 'stats.json'), 'r') as file:
+        result = json.load(file)
+    assert [phase['name'] for phase in result['phases']] == [
+        'reading', 'tokenizing', 'parsing', 'checking', 'code generation']
+    assert result['counts']['functions'] == 1
@@ -1,7 +1,9 @@
 import pytest
 
 from weirdc import CompileError, Location
-from weirdc.tokenizer import Token, tokenize as _iter_tokenize
+from weirdc.tokenizer import (
+    CompactTokens, Token, tokenize as _iter_tokenize, tokenize_chunks,
+    tokenize_path)
 
 
 def tokenize(code, trailing_newline=False):
@@ -59,6 +61,9 @@ def test_comments():
         Token('INTEGER', '123', Location(0, 3, 2)),
     ]
     assert tokenize('/* hello\nhello\nhello */') == []
+    assert tokenize('/* a */ b /* c */') == [
+        Token('NAME', 'b', Location(8, 9)),
+    ]
 
 
 def test_errors():
@@ -106,3 +111,165 @@ def test_hello_world():
     ]
 
 test_hello_world()
+
+
+COMPACT_CODES = [
+    'function main() {\n    print("hello")\n}\n',
+    'function main() {\n\tprint("tabs")\n}',
+    '// hello\n123  \n  456 /* multi\nline\n */ 789',
+    'a  \n\n b\n  ',
+    'x // no newline at end',
+    'a = b\n"lol"\n',
+]
+
+
+@pytest.mark.parametrize('code', COMPACT_CODES)
+def test_compact_tokens(code):
+    for trailing_newline in [True, False]:
+        compact = CompactTokens(code, trailing_newline)
+        assert len(compact) == len(
+            tokenize(code, trailing_newline=trailing_newline))
+        assert [view.to_token() for view in compact] == tokenize(
+            code, trailing_newline=trailing_newline)
+
+
+def test_compact_tokens_view():
+    compact = CompactTokens('print("hi")\nprint("hi")\n')
+    assert compact.strings == ['print', '(', '"hi"', ')', '\n']
+    assert list(compact.values) == [0, 1, 2, 3, 4] * 2
+
+    view = compact[6]
+    assert (view.kind, view.value) == ('OP', '(')
+    assert view.location == Location(5, 6, 2)
+    assert view.startswith(['OP', '('])
+    assert not view.startswith(['OP', ')'])
+    assert view.startswith(['OP', '(', Location(5, 6, 2)])
+
+
+def test_tabs():
+    code = 'a\t= "\tb"\n\t\tc'
+    assert tokenize(code) == [
+        Token('NAME', 'a', Location(0, 1, 1)),
+        Token('OP', '=', Location(4, 5, 1)),
+        # tabs in strings are not expanded
+        Token('STRING', '"\tb"', Location(6, 10, 1)),
+        Token('NEWLINE', '\n', Location(10, 13, 1)),
+        Token('NAME', 'c', Location(8, 9, 2)),
+    ]
+    assert CompactTokens(code)[1].location == Location(4, 5, 1)
+
+
+def test_compact_tokens_error(error_at):
+    compact = CompactTokens('a\nb ;')
+    views = iter(compact)
+
+    # the tokens before the error can be used like with tokenize()
+    assert next(views).value == 'a'
+    assert next(views).kind == 'NEWLINE'
+    assert next(views).value == 'b'
+    with error_at(2, 3, 2, msg="I don't know what this is"):
+        next(views)
+
+
+CHUNK_CODES = COMPACT_CODES + [
+    _HELLO_WORLD,
+    'a /* b */ c /* d\n */ e',
+    'x = "a\tb" // lol\n\t\ty',
+]
+
+
+@pytest.mark.parametrize('code', CHUNK_CODES)
+def test_tokenize_chunks(code):
+    expected = list(_iter_tokenize(code))
+    for split in range(len(code) + 1):
+        chunks = [code[:split], code[split:]]
+        assert list(tokenize_chunks(chunks)) == expected
+    assert list(tokenize_chunks(code)) == expected   # 1 character chunks
+
+
+def test_tokenize_chunks_errors(error_at):
+    for code in ['a /* lol', 'a "lol', 'a\n  ;']:
+        with pytest.raises(CompileError) as expected:
+            list(_iter_tokenize(code))
+        for chunks in [[code], code]:
+            with error_at(*expected.value.location):
+                list(tokenize_chunks(chunks))
+
+
+def test_tokenize_path(tmp_path):
+    path = tmp_path / 'big.weird'
+    path.write_text(_HELLO_WORLD * 100 + 'ä')
+    assert (list(tokenize_path(str(path), chunk_size=7)) ==
+            list(_iter_tokenize(path.read_text())))
+
+    (tmp_path / 'empty.weird').write_text('')
+    assert (list(tokenize_path(str(tmp_path / 'empty.weird'))) ==
+            list(_iter_tokenize('')))
+
+
+def check_edit(code, offset, removed_length, inserted_text):
+    new_code = code[:offset] + inserted_text + code[offset+removed_length:]
+    for trailing_newline in [True, False]:
+        edited = CompactTokens(code, trailing_newline).edit(
+            offset, removed_length, inserted_text)
+        expected = CompactTokens(new_code, trailing_newline)
+        assert edited.lines.code == new_code
+        assert _views(edited) == _views(expected)
+    return edited
+
+
+def _views(tokens):
+    result = []
+    try:
+        for view in tokens:
+            result.append(view.to_token())
+    except CompileError as e:
+        result.append((e.message, e.location))
+    return result
+
+
+@pytest.mark.parametrize('code', CHUNK_CODES)
+def test_edit(code):
+    for offset in range(len(code) + 1):
+        for removed_length in range(min(3, len(code) - offset + 1)):
+            for inserted_text in ['', 'x', ' ', '\n', '/*', '*/', '"',
+                                  '\t', ';', '12 ab']:
+                check_edit(code, offset, removed_length, inserted_text)
+
+
+def test_edit_relexes_little():
+    code = 'function f() {\n    print("hi")\n}\n' * 100
+    offset = code.index('"hi"', len(code) // 2)
+    edited = check_edit(code, offset, 4, '"hello"')
+    assert edited.relexed <= 2
+    assert len(edited) == len(CompactTokens(code))
+
+    # a comment can hide all tokens after it, and they come back when
+    # it's removed
+    edited = check_edit(code, offset, 0, '/* ')
+    assert edited.error is not None
+    edited = check_edit(edited.lines.code, offset, 3, '')
+    assert edited.error is None
+    assert len(edited) == len(CompactTokens(code))
+
+
+def test_edit_strings():
+    code = 'function f() {\n    x\n}\n'
+    tokens = CompactTokens(code)
+    old_strings = tokens.strings.copy()
+    old_views = _views(tokens)
+
+    # typing a long name one character at a time, the old object must
+    # not change
+    offset = code.index('x') + 1
+    edited = tokens
+    for i in range(1000):
+        edited = edited.edit(offset + i, 0, 'y')
+    assert tokens.strings == old_strings
+    assert _views(tokens) == old_views
+
+    # the strings of the names that were typed on the way are removed
+    assert len(edited.strings) < 200
+    assert _views(edited) == _views(CompactTokens(edited.lines.code))
+    assert _views(edited.edit(0, 0, ' ')) == _views(
+        CompactTokens(' ' + edited.lines.code))
@@ -0,0 +1,29 @@
+import pytest
+
+from weirdc import utils
+
+
+@pytest.mark.parametrize('debug', [True, False])
+def test_miniclass(debug):
+    Thing = utils.miniclass(__name__, 'Thing', ['a', 'b'], debug=debug,
+                            default_attrs={'c': None, 'd': []})
+    Base = utils.miniclass(__name__, 'Base', ['a', 'b'], debug=debug)
+    Subthing = utils.miniclass(__name__, 'Subthing', ['e'], inherit=Base,
+                               debug=debug)
+
+    thing = Thing(1, 2, c=3)
+    assert (thing.a, thing.b, thing.c, thing.d) == (1, 2, 3, [])
+    assert thing.d is not Thing(1, 2).d
+    assert repr(thing) == 'test_utils.Thing(1, 2)'
+
+    assert thing == Thing(1, 2)
+    assert thing != Thing(1, 3)
+    assert Subthing(1, 2, 4) == Subthing(1, 2, 4)
+    assert Subthing(1, 2, 4) != Subthing(1, 2, 5)
+
+    with pytest.raises((TypeError, AssertionError)):
+        Thing(1)
+    with pytest.raises((TypeError, AssertionError)):
+        Thing(1, 2, e=3)
+    with pytest.raises(TypeError):
+        hash(thing)
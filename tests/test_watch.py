@@ -0,0 +1,97 @@
+import pytest
+
+from weirdc import CompileError, compiler, watch
+
+
+CODE = '''\
+function hello() returns String {
+    return "hello"
+}
+
+function world() {
+    print("world")
+}
+
+function main() {
+    print(hello())
+    world()
+}
+'''
+
+
+def test_only_changed_functions():
+    incremental = watch.IncrementalCompiler()
+    assert incremental.generate_c(CODE) == compiler.generate_c(CODE)
+    assert incremental.reparsed == 3
+
+    # changing a function body doesn't affect the other functions
+    code = CODE.replace('"world"', '"there"')
+    assert incremental.generate_c(code) == compiler.generate_c(code)
+    assert (incremental.reparsed, incremental.rechecked,
+            incremental.regenerated) == (1, 1, 1)
+
+    # adding lines before functions doesn't change them
+    code = code.replace('}\n', '}\n\n\n', 1)
+    assert incremental.generate_c(code) == compiler.generate_c(code)
+    assert incremental.reparsed == 1
+    assert incremental.rechecked == 1
+
+    # the types of hello() change, so everything is checked again
+    code = code.replace('returns String {\n    return "hello"',
+                        '{\n    print("hello")')
+    code = code.replace('print(hello())', 'hello()')
+    assert incremental.generate_c(code) == compiler.generate_c(code)
+    assert (incremental.reparsed, incremental.rechecked) == (2, 3)
+
+
+def test_warnings_and_errors():
+    incremental = watch.IncrementalCompiler()
+    code = CODE.replace('print("world")', 'Int unused')
+    warnings = []
+    incremental.generate_c(code, warnings.append)
+    [warning] = warnings
+    assert warning.location.lineno == 6
+
+    # the warning comes from the remembered world() function, only
+    # hello() is checked again
+    warnings.clear()
+    incremental.generate_c(code.replace('}\n', '}\n\n', 1),
+                           warnings.append)
+    assert incremental.rechecked == 1
+    [warning] = warnings
+    assert warning.location.lineno == 7
+
+    code = CODE.replace('    world()', '    wat()')
+    with pytest.raises(CompileError) as error:
+        incremental.generate_c(code)
+    with pytest.raises(CompileError) as full_error:
+        compiler.generate_c(code)
+    assert error.value.location == full_error.value.location
+    assert error.value.message == full_error.value.message
+
+    # everything works after an error
+    assert incremental.generate_c(CODE) == compiler.generate_c(CODE)
+
+
+def test_comments():
+    code = CODE.replace('function world', '/*\nfunction lol() {}\n*/\n'
+                        'function world')
+    incremental = watch.IncrementalCompiler()
+    assert incremental.generate_c(code) == compiler.generate_c(code)
+
+
+def test_watch(tmp_path):
+    path = tmp_path / 'hello.weird'
+    path.write_text(CODE)
+    calls = []
+
+    def callback(code):
+        calls.append(code)
+        if len(calls) == 1:
+            path.write_text(code + '\n')
+        else:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        watch.watch(str(path), callback, interval=0.01)
+    assert calls == [CODE, CODE + '\n']
@@ -1,3 +1,5 @@
+import array
+import bisect
 import collections
 
 
@@ -47,6 +49,79 @@ class Location(collections.namedtuple('Location', 'start end lineno')):
         return cls(start.start, end.end, start.lineno)
 
 
+class LineIndex:
+    r"""The offsets of the beginnings of lines in a string of code.
+
+    This is created once per file, and it lets the tokenizer store only
+    offsets of tokens. Line numbers and columns with tabs expanded to 4
+    spaces are calculated from the offsets when something needs them.
+
+        >>> index = LineIndex('a = b\n\tc = d\n')
+        >>> index.location(7, 8)
+        Location(start=4, end=5, lineno=2)
+        >>> index.line(2)
+        '    c = d'
+    """
+
+    def __init__(self, code):
+        self.code = code
+        self.line_starts = array.array('I', [0])
+
+        newline = code.find('\n')
+        while newline != -1:
+            self.line_starts.append(newline + 1)
+            newline = code.find('\n', newline + 1)
+
+        # most lines don't contain tabs, and their columns are offsets
+        self._tab_lines = set()
+        tab = code.find('\t')
+        while tab != -1:
+            line_index = bisect.bisect_right(self.line_starts, tab) - 1
+            self._tab_lines.add(line_index)
+            # the rest of the line doesn't matter anymore
+            tab = code.find('\t', self._line_end(line_index))
+
+    def __len__(self):
+        return len(self.line_starts)
+
+    def _line_end(self, line_index):
+        # offset of the \n at the end of the line, or end of the code
+        if line_index + 1 < len(self.line_starts):
+            return self.line_starts[line_index + 1] - 1
+        return len(self.code)
+
+    def lineno(self, offset):
+        """Return the line number of an offset, starting at 1."""
+        return bisect.bisect_right(self.line_starts, offset)
+
+    def location(self, start, end):
+        """Create a :class:`Location` from two offsets.
+
+        The *end* can be past the end of *start*'s line, and then the
+        location extends past the end of the line by that many
+        characters.
+        """
+        line_index = bisect.bisect_right(self.line_starts, start) - 1
+        line_start = self.line_starts[line_index]
+        if line_index not in self._tab_lines:
+            return Location(start - line_start, end - line_start,
+                            line_index + 1)
+
+        line_end = self._line_end(line_index)
+        start_column = len(self.code[line_start:start].expandtabs(4))
+        end_column = (len(self.code[line_start:min(end, line_end)]
+                          .expandtabs(4)) + max(0, end - line_end))
+        return Location(start_column, end_column, line_index + 1)
+
+    def line(self, lineno):
+        """Return a line as a string with tabs expanded to 4 spaces.
+
+        The line doesn't end with a newline character.
+        """
+        line_start = self.line_starts[lineno - 1]
+        return self.code[line_start:self._line_end(lineno - 1)].expandtabs(4)
+
+
 class CompileError(Exception):
     """This is raised and displayed to the user during compilation.
 
@@ -77,7 +152,8 @@ class CompileError(Exception):
         doesn't come from a file.
 
         *line* should be the line of code where this error occurred as a
-        string with tabs expanded to 4 spaces. Trailing whitespace is
+        string with tabs expanded to 4 spaces, e.g. from
+        :meth:`LineIndex.line`. Trailing whitespace is
         ignored. It must be given if the *location* attribute is set,
         and it must be omitted if *location* is None.
 
@@ -1,17 +1,492 @@
 #!/usr/bin/env python3
-import argparse
-import shlex
-import subprocess
-import sys
-import tempfile
+import contextlib
 import os
-import glob
+import sys
+
+# everything else is imported in the functions that need it, so that
+# only the things that the chosen mode needs are imported, see
+# tests/test_startup.py
+
+
+# gcc names the .gcda profile files after the output file, so the
+# instrumented and the final executable must be compiled to the same place
+_PGO_CFILE = 'program.c'
+_PGO_EXECUTABLE = 'program'
+
+
+def _call(command, **kwargs):
+    """Like subprocess.call(), but output goes through sys.stdout and
+    sys.stderr.
+
+    This way the output can be sent to a client when this is running in
+    a compile server.
+    """
+    import subprocess
+
+    result = subprocess.run(command, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, **kwargs)
+    sys.stdout.write(result.stdout.decode('utf-8', errors='replace'))
+    sys.stderr.write(result.stderr.decode('utf-8', errors='replace'))
+    return result.returncode
+
+
+def _compile(args, the_runtime, cfile, outfile, extra_flags=()):
+    """Run the --cc command and return its exit status."""
+    import shlex
+
+    compile_command = the_runtime.compile_command(
+        args.cc, cfile, outfile, extra_flags)
+    print(' '.join(map(shlex.quote, compile_command)))
+    return _call(compile_command)
+
+
+def _compile_streaming(args, the_runtime, code, warn_callback,
+                       node_cache=None):
+    """Generate C code and pipe it to the --cc command.
+
+    The C compiler is started first, and the C code is written to its
+    stdin one function at a time, so generating C code and compiling it
+    happen at the same time. A CompileError is raised if the code is
+    invalid, and otherwise the C compiler's exit status is returned.
+    """
+    import io
+    import shlex
+    import subprocess
+    import tempfile
+
+    from weirdc import compiler
+
+    compile_command = the_runtime.compile_command(args.cc, '-', args.outfile)
+    print(' '.join(map(shlex.quote, compile_command)))
+
+    # the output goes to files because reading it from pipes while
+    # writing to stdin would need threads
+    with tempfile.TemporaryFile() as stdout, \
+            tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(compile_command, stdin=subprocess.PIPE,
+                                   stdout=stdout, stderr=stderr, bufsize=0)
+        stdin = io.TextIOWrapper(process.stdin, encoding='utf-8',
+                                 write_through=True)
+        try:
+            compiler.write_c(code, stdin, warn_callback, node_cache)
+        except BrokenPipeError:
+            # the C compiler exited early, and its output says why
+            pass
+        except BaseException:
+            process.kill()
+            raise
+        finally:
+            with contextlib.suppress(BrokenPipeError):
+                stdin.close()
+            returncode = process.wait()
+
+        stdout.seek(0)
+        stderr.seek(0)
+        sys.stdout.write(stdout.read().decode('utf-8', errors='replace'))
+        sys.stderr.write(stderr.read().decode('utf-8', errors='replace'))
+    return returncode
+
+
+def _compile_with_pgo(args, the_runtime, c_code, debug):
+    """Compile with profile-guided optimization.
+
+    The profile is created by running the --pgo command only if there's
+    no cached profile for this C code and these compiler options yet.
+    """
+    import shlex
+    import shutil
+
+    from weirdc import buildcache
+
+    # each profile is a directory, and only the .gcda files are kept
+    # there after compiling
+    profiles = buildcache.BuildCache(os.path.join(args.cache_dir, 'profiles'),
+                                     args.cache_size * 1024 * 1024,
+                                     directories=True)
+    profile_dir = os.path.join(profiles.directory, buildcache.hash_parts(
+        c_code, args.cc, args.pgo, the_runtime.key)[:16])
+    os.makedirs(profile_dir, exist_ok=True)
+    cfile = os.path.join(profile_dir, _PGO_CFILE)
+    executable = os.path.join(profile_dir, _PGO_EXECUTABLE)
+    with open(cfile, 'w') as file:
+        file.write(c_code)
+
+    def has_profile():
+        return any(name.endswith('.gcda') for name in os.listdir(profile_dir))
+
+    try:
+        if has_profile():
+            debug("Using the cached profile in '%s'." % profile_dir)
+        else:
+            debug("Compiling an instrumented executable...")
+            statuscode = _compile(
+                args, the_runtime, cfile, executable,
+                ['-fprofile-generate', '-fprofile-update=single'])
+            if statuscode != 0:
+                return statuscode
+
+            training_command = args.pgo.format(
+                program=shlex.quote(executable))
+            debug("Running '%s'..." % training_command)
+            statuscode = _call(training_command, shell=True)
+            if statuscode != 0:
+                print("the --pgo command exited with status", statuscode,
+                      file=sys.stderr)
+                # a profile from a failed run would be cached
+                for name in os.listdir(profile_dir):
+                    if name.endswith('.gcda'):
+                        os.remove(os.path.join(profile_dir, name))
+                sys.exit(1)
+
+        debug("Compiling with the profile...")
+        statuscode = _compile(args, the_runtime, cfile, executable,
+                              ['-fprofile-use', '-fprofile-partial-training'])
+        if statuscode == 0:
+            shutil.copy2(executable, args.outfile)
+        return statuscode
+
+    finally:
+        if has_profile():
+            for path in [cfile, executable]:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+            os.utime(profile_dir)
+        else:
+            shutil.rmtree(profile_dir, ignore_errors=True)
+        profiles.evict()
+
+
+def _build_runtime(the_runtime, debug):
+    from weirdc import runtime
+
+    if not the_runtime.is_built():
+        debug("Building the runtime to '%s'..." % the_runtime.directory)
+        try:
+            the_runtime.build()
+        except runtime.RuntimeBuildError as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
 
-from weirdc import tokenizer, ast, c_output, scoping
 
+def _build_modules(args, the_runtime, debug):
+    from weirdc import modules
 
-def main():
-    parser = argparse.ArgumentParser()
+    # files that import things are compiled one module at a time, and
+    # only changed modules are compiled
+    if args.no_compile or args.pgo is not None:
+        print("--no-compile and --pgo don't work with files that import "
+              "things yet", file=sys.stderr)
+        sys.exit(1)
+
+    _build_runtime(the_runtime, debug)
+    builder = modules.ModuleBuilder(
+        os.path.join(args.cache_dir, 'modules'), the_runtime, debug, args.cc)
+    try:
+        builder.build(args.infile.name, args.outfile)
+    except (modules.ModuleCompileError, modules.ModuleBuildError) as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    print("Compiling succeeded.")
+
+
+def _run_in_process(args, code, debug):
+    import shlex
+
+    from weirdc import CompileError, buildcache, compiler, runtime, shared
+
+    if args.no_compile or args.pgo is not None:
+        print("--run doesn't work with --no-compile or --pgo",
+              file=sys.stderr)
+        sys.exit(1)
+
+    the_runtime = runtime.Runtime(args.cache_dir, shlex.split(args.cc)[0],
+                                  release=args.release, shared=True)
+    cache = shared.shared_cache(args.cache_dir)
+    key = buildcache.program_key(code, args.cc, the_runtime, 'shared')
+    sofile = cache.find(key)
+
+    if sofile is None:
+        debug("Generating C code...")
+        try:
+            c_code = compiler.generate_c(code, lambda warning: print(
+                compiler.show_error(warning, args.infile.name, code,
+                                    'warning'), file=sys.stderr))
+        except CompileError as e:
+            print(compiler.show_error(e, args.infile.name, code),
+                  file=sys.stderr)
+            sys.exit(1)
+
+        _build_runtime(the_runtime, debug)
+        debug("Compiling a shared object...")
+        try:
+            sofile = shared.build(c_code, the_runtime, args.cc, cache, key)
+        except shared.SharedBuildError as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+    else:
+        debug("Cache hit, using '%s'." % sofile)
+
+    debug("Running...")
+    sys.exit(shared.run(sofile))
+
+
+def _run_with_vm(args, code, debug):
+    import shlex
+    import subprocess
+
+    from weirdc import (CompileError, ast, bytecode, checker, compiler,
+                        runtime, tokenizer)
+
+    if args.no_compile or args.pgo is not None:
+        print("--vm doesn't work with --no-compile or --pgo", file=sys.stderr)
+        sys.exit(1)
+
+    bytecode_file = bytecode.load_cached(args.infile.name, code)
+    if bytecode_file is None:
+        debug("Compiling to bytecode...")
+        try:
+            nodes = list(ast.parse(tokenizer.tokenize(code)))
+            checker.check(nodes, lambda warning: print(
+                compiler.show_error(warning, args.infile.name, code,
+                                    'warning'), file=sys.stderr))
+            the_bytecode = bytecode.compile_nodes(
+                nodes, bytecode.cache_key(code))
+        except CompileError as e:
+            print(compiler.show_error(e, args.infile.name, code),
+                  file=sys.stderr)
+            sys.exit(1)
+        bytecode_file = bytecode.save_cached(args.infile.name, the_bytecode)
+    else:
+        debug("Using the cached bytecode in '%s'." % bytecode_file)
+
+    the_runtime = runtime.Runtime(args.cache_dir, shlex.split(args.cc)[0])
+    if not os.path.isfile(the_runtime.vm):
+        debug("Building the VM to '%s'..." % the_runtime.vm)
+        try:
+            the_runtime.build_vm()
+        except runtime.RuntimeBuildError as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+
+    debug("Running...")
+    sys.exit(subprocess.call([the_runtime.vm, bytecode_file]))
+
+
+def _watch(args, the_runtime, debug):
+    import tempfile
+
+    from weirdc import CompileError, compiler, watch
+
+    if args.pgo is not None:
+        print("--watch doesn't work with --pgo", file=sys.stderr)
+        sys.exit(1)
+
+    incremental = watch.IncrementalCompiler()
+
+    def rebuild(code):
+        debug("Generating C code...")
+        try:
+            c_code = incremental.generate_c(code, lambda warning: print(
+                compiler.show_error(warning, args.infile.name, code,
+                                    'warning'), file=sys.stderr))
+        except CompileError as e:
+            print(compiler.show_error(e, args.infile.name, code),
+                  file=sys.stderr)
+            return
+        debug("Parsed %d, checked %d and generated C code for %d "
+              "functions again." % (incremental.reparsed,
+                                    incremental.rechecked,
+                                    incremental.regenerated))
+
+        if args.no_compile:
+            with open(args.outfile, 'w') as file:
+                file.write(c_code)
+            print("Generating the C code succeeded.")
+            return
+
+        _build_runtime(the_runtime, debug)
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.c') as cfile:
+            cfile.write(c_code)
+            cfile.flush()
+            statuscode = _compile(args, the_runtime, cfile.name, args.outfile)
+        if statuscode == 0:
+            print("Compiling succeeded.")
+        else:
+            print("C compiler exited with status", statuscode, file=sys.stderr)
+
+    print("Watching '%s' for changes, press Ctrl+C to stop."
+          % args.infile.name)
+    try:
+        watch.watch(args.infile.name, rebuild)
+    except KeyboardInterrupt:
+        pass
+
+
+def _phase(the_stats, name, *, subprocess=False):
+    # the stats module isn't imported at all without --stats and friends
+    if the_stats is None:
+        return contextlib.nullcontext()
+    if subprocess:
+        return the_stats.subprocess_phase(name)
+    return the_stats.phase(name)
+
+
+def _report_stats(args, the_stats):
+    if args.time_passes or args.stats:
+        print(the_stats.format_phases(), file=sys.stderr)
+    if args.stats and the_stats.counts:
+        print(the_stats.format_counts(), file=sys.stderr)
+    if args.stats_json is not None:
+        with open(args.stats_json, 'w') as file:
+            file.write(the_stats.to_json() + '\n')
+
+
+def _compile_file(args, the_stats):
+    import shlex
+    import tempfile
+
+    from weirdc import (CompileError, LineIndex, buildcache, compiler,
+                        modules, runtime)
+
+    def debug(msg):
+        if args.verbose:
+            print(msg)
+
+    debug("Reading '%s'..." % args.infile.name)
+    with _phase(the_stats, 'reading'), args.infile as file:
+        code = file.read()
+
+    cc_program = shlex.split(args.cc)[0]
+    the_runtime = runtime.Runtime(args.cache_dir, cc_program,
+                                  release=args.release)
+
+    if modules.has_imports(code):
+        # the module builder creates an executable, so these would
+        # silently do nothing
+        if args.run:
+            print("--run doesn't work with files that import things yet",
+                  file=sys.stderr)
+            sys.exit(1)
+        if args.vm:
+            print("--vm doesn't work with files that import things yet",
+                  file=sys.stderr)
+            sys.exit(1)
+        if args.watch:
+            print("--watch doesn't work with files that import things yet",
+                  file=sys.stderr)
+            sys.exit(1)
+        _build_modules(args, the_runtime, debug)
+        return
+    if args.watch:
+        _watch(args, the_runtime, debug)
+        return
+    if args.vm:
+        _run_with_vm(args, code, debug)
+    if args.run:
+        _run_in_process(args, code, debug)
+
+    if args.no_compile or args.no_cache:
+        cache = None
+    else:
+        cache = buildcache.BuildCache(args.cache_dir,
+                                      args.cache_size * 1024 * 1024)
+        cache_key = buildcache.program_key(code, args.cc, the_runtime,
+                                           args.pgo)
+        if cache.lookup(cache_key, args.outfile):
+            debug("Cache hit, copied '%s' from the cache." % args.outfile)
+            print("Compiling succeeded.")
+            return
+        debug("Cache miss.")
+
+    # checking the code again isn't needed when only the --cc options
+    # change or with --no-compile
+    if args.no_cache:
+        node_cache = None
+    else:
+        from weirdc import nodecache
+        node_cache = nodecache.NodeCache(
+            os.path.join(args.cache_dir, 'nodes'),
+            args.cache_size * 1024 * 1024)
+
+    # the line index is created when the first message is shown, and
+    # not at all if there are no warnings or errors
+    line_index = None
+
+    def show_error(error, kind='error'):
+        nonlocal line_index
+        if line_index is None:
+            line_index = LineIndex(code)
+        print(compiler.show_error(error, args.infile.name, line_index, kind),
+              file=sys.stderr)
+
+    # with --stats, generating the C code and compiling it are measured
+    # separately, so they can't run at the same time
+    if (not args.no_compile and args.pgo is None and the_stats is None
+            and runtime.reads_stdin(cc_program)):
+        _build_runtime(the_runtime, debug)
+        debug("Generating C code and compiling...")
+        try:
+            statuscode = _compile_streaming(
+                args, the_runtime, code,
+                lambda warning: show_error(warning, 'warning'), node_cache)
+        except CompileError as e:
+            show_error(e)
+            sys.exit(1)
+    else:
+        debug("Generating C code...")
+        try:
+            c_code = compiler.generate_c(
+                code, lambda warning: show_error(warning, 'warning'),
+                the_stats, node_cache)
+        except CompileError as e:
+            show_error(e)
+            sys.exit(1)
+
+        if args.no_compile:
+            debug("Saving C code to '%s'..." % args.outfile)
+            with open(args.outfile, 'w') as file:
+                file.write(c_code)
+            print("Generating the C code succeeded.")
+            return
+
+        _build_runtime(the_runtime, debug)
+        if args.pgo is None:
+            debug("Compiling...")
+            with tempfile.NamedTemporaryFile(mode='w', suffix='.c') as cfile:
+                cfile.write(c_code)
+                cfile.flush()
+                with _phase(the_stats, 'C compiler', subprocess=True):
+                    statuscode = _compile(args, the_runtime, cfile.name,
+                                          args.outfile)
+        else:
+            with _phase(the_stats, 'C compiler with PGO',
+                        subprocess=True):
+                statuscode = _compile_with_pgo(args, the_runtime, c_code,
+                                               debug)
+
+    if statuscode == 0:
+        if cache is not None:
+            debug("Storing '%s' to the cache..." % args.outfile)
+            cache.store(cache_key, args.outfile)
+        print("Compiling succeeded.")
+    else:
+        print("C compiler exited with status", statuscode, file=sys.stderr)
+        sys.exit(1)
+
+
+def compile_main(argv=None):
+    """Compile a program in this process.
+
+    *argv* is a list of command-line arguments without the program name
+    at the start. By default, ``sys.argv[1:]`` is used.
+    """
+    import argparse
+
+    from weirdc import buildcache
+
+    # main() looks for some options before parsing, so they can't be
+    # abbreviated
+    parser = argparse.ArgumentParser(prog='weirdc', allow_abbrev=False)
     parser.add_argument(
         'infile', type=argparse.FileType('r'),
         help="the source code")
@@ -22,54 +497,96 @@ def main():
         "--no-compile", action="store_true",
         help="If specified, saves the C code to a file instead of compiling.")
     parser.add_argument(
-        '--cc', metavar='COMMAND', default='gcc {cfile} -std=c99 -Iobjects -o {outfile}',
+        '--cc', metavar='COMMAND', default='gcc {cfile} -std=c99 -o {outfile}',
         help=("c compiler command and options with {cfile} and {outfile} "
               "substituted, defaults to '%(default)s'"))
+    parser.add_argument(
+        '--release', action='store_true',
+        help=("optimize with link-time optimization so that runtime "
+              "functions can be inlined, compiling takes longer"))
+    parser.add_argument(
+        '--run', action='store_true',
+        help=("compile to a cached shared object and run it in this "
+              "process instead of creating an executable"))
+    parser.add_argument(
+        '--vm', action='store_true',
+        help=("compile to bytecode and run it with a virtual machine, "
+              "this doesn't need a C compiler except for compiling the "
+              "virtual machine once"))
+    parser.add_argument(
+        '--watch', action='store_true',
+        help=("compile again whenever the file changes, only the changed "
+              "functions are processed again"))
+    parser.add_argument(
+        '--pgo', metavar='TRAINING_COMMAND',
+        help=("use profile-guided optimization, the shell command is "
+              "used for running an instrumented executable with {program} "
+              "substituted, e.g. '{program} < input.txt'"))
+    parser.add_argument(
+        '--cache-dir', metavar='DIRECTORY',
+        default=buildcache.default_directory(),
+        help="where to cache compiled programs, defaults to '%(default)s'")
+    parser.add_argument(
+        '--cache-size', metavar='MEGABYTES', type=int,
+        default=buildcache.DEFAULT_MAX_SIZE // (1024*1024),
+        help="maximum size of the cache, defaults to %(default)s")
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help="always compile, don't look up or store anything in the cache")
+    parser.add_argument(
+        '--time-passes', action='store_true',
+        help=("show how long each part of compiling took and how much "
+              "memory it used"))
+    parser.add_argument(
+        '--stats', action='store_true',
+        help=("like --time-passes, but also show the numbers of tokens, "
+              "AST nodes, functions and bytes of C code"))
+    parser.add_argument(
+        '--stats-json', metavar='FILE',
+        help="write everything that --stats shows to a JSON file")
     parser.add_argument(
         '-v', '--verbose', action='store_true',
         help="produce more output")
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
-    def debug(msg):
-        if args.verbose:
-            print(msg)
+    if args.time_passes or args.stats or args.stats_json is not None:
+        from weirdc import stats
+        the_stats = stats.Stats()
+    else:
+        the_stats = None
 
-    debug("Reading '%s'..." % args.infile.name)
-    with args.infile as file:
-        code = file.read()
+    try:
+        _compile_file(args, the_stats)
+    finally:
+        if the_stats is not None:
+            _report_stats(args, the_stats)
 
-    debug("Generating C code...")
-    tokens = tokenizer.tokenize(code)
-    node_list = scoping.scope_ast(ast.parse(tokens))
-    c_code = c_output.make_c_code(node_list)
 
-    if args.no_compile:
-        debug("Saving C code to '%s'..." % args.outfile)
-        with open(args.outfile, 'w') as file:
-            file.write(c_code)
-        print("Generating the C code succeeded.")
-    else:
-        debug("Compiling...")
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.c') as cfile:
-            cfile.write(c_code)
-            cfile.flush()
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
 
-            compile_command = []
+    if argv[:1] == ['serve']:
+        from weirdc import server
+        server.main(argv[1:])
+        return
+    if argv[:1] == ['build']:
+        from weirdc import batch
+        batch.main(argv[1:])
+        return
 
-            for part in shlex.split(args.cc):
-                if "{cfile}" in part:
-                    # TODO: is there a nicer way to do this?
-                    compile_command.extend(glob.glob("objects/*.o"))
-                part = part.format(cfile=cfile.name, outfile=args.outfile)
-                compile_command.append(part)
-            print(' '.join(map(shlex.quote, compile_command)))
-            statuscode = subprocess.call(compile_command)
-
-        if statuscode == 0:
-            print("Compiling succeeded.")
-        else:
-            print("C compiler exited with status", statuscode, file=sys.stderr)
-            sys.exit(1)
+    # the compile server must not run programs in its process
+    # and watching never ends, so it can't be done in the server either
+    if '--run' in argv or '--vm' in argv or '--watch' in argv:
+        status = None
+    else:
+        from weirdc import server
+        status = server.send_request(argv)
+    if status is None:
+        # no server running
+        compile_main(argv)
+    else:
+        sys.exit(status)
 
 
 if __name__ == '__main__':
@@ -1,10 +1,11 @@
 """The abstract syntax tree elements and parser."""
 
-import collections
+import bisect
 import contextlib
 import functools
 
-from weirdc import CompileError, Location, utils
+import weirdc
+from weirdc import CompileError, Location, tokenizer, utils
 
 
 def _node(name, fields):
@@ -25,56 +26,100 @@ If = _node('If', ['condition', 'body'])
 Return = _node('Return', ['value'])
 FunctionDef = _node('FunctionDef', ['name', 'args', 'returntype', 'body'])
 
+# import name from "path"
+# the checker sets functype to the imported function's checker.FunctionType
+Import = utils.miniclass(__name__, 'Import', ['location', 'name', 'path'],
+                         default_attrs={'functype': None})
+
 # these doesn't have locations, so we can't use _node()
 # TODO: add these everywhere in decreffer.py
 IncRef = utils.miniclass(__name__, 'IncRef', ['varname'])
 DecRef = utils.miniclass(__name__, 'DecRef', ['varname'])
 
+# the fields of the nodes that the parser creates, for storing nodes in
+# other ways than as objects, see flatast.py and nodecache.py
+#   'string'    a string
+#   'node'      a node, or None
+#   'nodes'     a list of nodes
+#   'pairs'     a list of (node, node) tuples
+NODE_FIELDS = {
+    Name: [('name', 'string')],
+    Integer: [('value', 'string')],
+    String: [('value', 'string')],
+    FunctionCall: [('function', 'node'), ('args', 'nodes')],
+    Declaration: [('type', 'node'), ('name', 'string')],
+    Assignment: [('target', 'node'), ('value', 'node')],
+    If: [('condition', 'node'), ('body', 'nodes')],
+    Return: [('value', 'node')],
+    FunctionDef: [('name', 'string'), ('args', 'pairs'),
+                  ('returntype', 'node'), ('body', 'nodes')],
+    Import: [('name', 'string'), ('path', 'string')],
+}
+
+
+# the parser looks at most 2 tokens ahead, so most of the buffer is
+# tokens that were popped already, and they are removed in big pieces
+_BUFFER_CLEANUP_SIZE = 1024
+
 
 # this kind of abuses EOFError... feels good, i'm evil >:D MUHAHAHAA!!!
 class _HandyDandyTokenIterator:
 
     def __init__(self, iterable):
         self._iterator = iter(iterable)
-        self._coming_up_stack = collections.deque()
+        # tokens before _index have been popped already
+        self._buffer = []
+        self._index = 0
 
         # this is only used in _Parser.parse_file()
         self.last_popped = None
 
-    def pop(self):
-        try:
-            result = self._coming_up_stack.pop()
-        except IndexError:
+    def _fill(self, n):
+        # tokens are read only when they are needed, so errors from the
+        # tokenizer come in the right order with errors from the parser
+        if self._index >= _BUFFER_CLEANUP_SIZE:
+            del self._buffer[:self._index]
+            self._index = 0
+
+        while len(self._buffer) - self._index < n:
             try:
-                result = next(self._iterator)
-            except StopIteration:
-                raise EOFError
+                self._buffer.append(next(self._iterator))
+            except StopIteration as e:
+                raise EOFError from e
+
+    def pop(self):
+        if self._index == len(self._buffer):
+            self._fill(1)
+        result = self._buffer[self._index]
+        self._index += 1
 
         self.last_popped = result
         return result
 
     def coming_up(self, n=1):
-        while len(self._coming_up_stack) < n:
-            try:
-                # pop() doesn't work if there's something on _coming_up_stack
-                self._coming_up_stack.appendleft(next(self._iterator))
-            except StopIteration as e:
-                raise EOFError from e
-        return self._coming_up_stack[-n]
+        if self._index + n > len(self._buffer):
+            self._fill(n)
+        return self._buffer[self._index + n - 1]
+
+    def coming_up_is(self, kind, value):
+        token = self.coming_up()
+        return token.kind == kind and token.value == value
 
     # this must be "check and pop", not "pop and check"
     # that way this can be used in try/except
     def check_and_pop(self, kind, value=None):
-        if value is not None and self.coming_up().value != value:
-            raise CompileError("this should be '%s'" % value,
-                               self.coming_up().location)
+        token = self.coming_up()
+        if value is not None and token.value != value:
+            raise CompileError("this should be '%s'" % value, token.location)
 
-        if self.coming_up().kind != kind:
+        if token.kind != kind:
             raise CompileError(
                 "this should be %s" % utils.add_article(kind.lower()),
-                self.coming_up().location)
+                token.location)
 
-        return self.pop()
+        self._index += 1
+        self.last_popped = token
+        return token
 
     # this skips everything except the first NEWLINE when there are
     # multiple NEWLINE tokens with nothing in between
@@ -88,7 +133,7 @@ class _HandyDandyTokenIterator:
             pass
 
 
-_KEYWORDS = {'return', 'if'}
+_KEYWORDS = {'return', 'if', 'import'}
 
 
 class _Parser:
@@ -138,27 +183,27 @@ class _Parser:
             parsemethod = self.parse_expression
 
         start_token = self.tokens.check_and_pop('OP', start)
-        if self.tokens.coming_up().startswith(['OP', stop]):
+        if self.tokens.coming_up_is('OP', stop):
             # empty list
             return ([], self.tokens.pop())
 
         elements = []
         while True:
-            if self.tokens.coming_up().startswith(['OP', ',']):
+            if self.tokens.coming_up_is('OP', ','):
                 raise CompileError("don't put a ',' here",
                                    self.tokens.coming_up().location)
             elements.append(parsemethod())
 
-            if self.tokens.coming_up().startswith(['OP', stop]):
+            if self.tokens.coming_up_is('OP', stop):
                 return (elements, self.tokens.pop())
 
             comma = self.tokens.check_and_pop('OP', ',')
-            if self.tokens.coming_up().startswith(['OP', ',']):
+            if self.tokens.coming_up_is('OP', ','):
                 raise CompileError(
                     "two ',' characters",
                     Location.between(comma, self.tokens.coming_up()))
 
-            if self.tokens.coming_up().startswith(['OP', stop]):
+            if self.tokens.coming_up_is('OP', stop):
                 return (elements, self.tokens.pop())
 
     def parse_expression(self):
@@ -172,7 +217,7 @@ class _Parser:
         elif coming_up.kind == 'INTEGER':
             # 123
             result = self.parse_integer()
-        elif coming_up.startswith(['OP', '(']):
+        elif coming_up.kind == 'OP' and coming_up.value == '(':
             result = self.parse_parentheses()
         else:
             raise CompileError(
@@ -181,7 +226,7 @@ class _Parser:
 
         # check for function calls, this is a while loop to allow
         # function calls like thing()()()
-        while self.tokens.coming_up().startswith(['OP', '(']):
+        while self.tokens.coming_up_is('OP', '('):
             args, stop_token = self._parse_comma_list('(', ')')
             result = FunctionCall(Location.between(result, stop_token),
                                   result, args)
@@ -214,9 +259,9 @@ class _Parser:
         body = []
 
         # allow "if thing { }" without a newline
-        if not self.tokens.coming_up().startswith(['OP', '}']):
+        if not self.tokens.coming_up_is('OP', '}'):
             self.tokens.pop_newline()
-            while not self.tokens.coming_up().startswith(['OP', '}']):
+            while not self.tokens.coming_up_is('OP', '}'):
                 body.extend(self.parse_statement())
         closing_brace = self.tokens.check_and_pop('OP', '}')
 
@@ -262,20 +307,23 @@ class _Parser:
     def parse_statement(self) -> list:
         # coming_up(1) and coming_up(2) work because there's always a
         # newline and at least something before it
-        if self.tokens.coming_up(1).kind == 'NAME':
-            if self.tokens.coming_up(1).value == 'return':
+        first = self.tokens.coming_up(1)
+        if first.kind == 'NAME':
+            if first.value == 'return':
                 return [self.parse_return()]
-            if self.tokens.coming_up(1).value == 'if':
+            if first.value == 'if':
                 return [self.parse_if()]
-            if self.tokens.coming_up(1).value == 'function':
+            if first.value == 'function':
                 return [self.parse_function_def()]
+            if first.value == 'import':
+                return [self.parse_import()]
 
             try:
                 after_name = self.tokens.coming_up(2)
             except EOFError:
                 return [self.parse_expression_statement()]
 
-            if after_name.startswith(['OP', '=']):
+            if after_name.kind == 'OP' and after_name.value == '=':
                 return [self.assignment()]
             if after_name.kind == 'NAME':
                 return self.parse_declaration()
@@ -290,7 +338,7 @@ class _Parser:
         args, junk = self._parse_comma_list(
             '(', ')', parsemethod=self._type_and_name)
 
-        if self.tokens.coming_up().startswith(['NAME', 'returns']):
+        if self.tokens.coming_up_is('NAME', 'returns'):
             self.tokens.pop()
             returntype = self.parse_name()
         else:
@@ -300,7 +348,7 @@ class _Parser:
         if self.tokens.coming_up().kind == 'NEWLINE':
             self.tokens.pop_newline()
         body = []
-        while not self.tokens.coming_up().startswith(['OP', '}']):
+        while not self.tokens.coming_up_is('OP', '}'):
             body.extend(self.parse_statement())
         closing_brace = self.tokens.check_and_pop('OP', '}')
         self.tokens.pop_newline()
@@ -308,6 +356,16 @@ class _Parser:
         return FunctionDef(Location.between(function_keyword, closing_brace),
                            name.name, args, returntype, body)
 
+    def parse_import(self):
+        # import thing from "file.weird"
+        the_import = self.tokens.check_and_pop('NAME', 'import')
+        name = self.parse_name()
+        self.tokens.check_and_pop('NAME', 'from')
+        path = self.parse_string()
+        self.tokens.pop_newline()
+        return Import(Location.between(the_import, path), name.name,
+                      path.value)
+
     def parse_file(self):
         while True:
             try:
@@ -335,3 +393,89 @@ def parse(tokens):
     """
     parser = _Parser(tokens)
     return parser.parse_file()
+
+
+def _shift_lines(nodes, lines):
+    # changes the line numbers of nodes and their children in-place,
+    # this is a hot loop when editing the beginning of a big file
+    new_location = tuple.__new__
+    to_visit = list(nodes)
+    while to_visit:
+        value = to_visit.pop()
+        value_type = type(value)
+        if value_type is list or value_type is tuple:
+            to_visit.extend(value)
+        elif value_type.__module__ == __name__:
+            for name in value_type.__slots__:
+                attribute = getattr(value, name)
+                if type(attribute) is Location:
+                    start, end, lineno = attribute
+                    setattr(value, name, new_location(
+                        Location, (start, end, lineno + lines)))
+                elif attribute is not None and type(attribute) is not str:
+                    to_visit.append(attribute)
+
+
+def reparse(code, nodes, offset, removed_length, inserted_text):
+    """Parse the code again after replacing a part of it.
+
+    *nodes* must be the list of top-level nodes that :func:`parse` gave
+    for *code*, and the other arguments are like in
+    :meth:`weirdc.tokenizer.CompactTokens.edit`. This returns the nodes
+    of the new code in a new list.
+
+    Only the top-level statements that the edit touches are parsed
+    again. The other nodes are reused, and the line numbers of the
+    nodes after the edit are changed in-place, so *nodes* must not be
+    used after calling this. If the edited part doesn't parse on its
+    own, the whole new code is parsed and errors are raised like
+    :func:`parse` would raise them.
+    """
+    new_code = code[:offset] + inserted_text + code[offset+removed_length:]
+
+    # a /* */ comment can hide statements or start in the middle of
+    # another statement
+    if not nodes or '/*' in code or '/*' in new_code:
+        return list(parse(tokenizer.tokenize(new_code)))
+
+    # the text of a statement goes from the beginning of its first line
+    # to the next statement, so the whitespace and comments after it go
+    # with it, and statements from the same line are parsed together
+    lines = weirdc.LineIndex(code)
+    unit_starts = []        # offsets
+    first_nodes = []        # indexes of nodes
+    for index, node in enumerate(nodes):
+        if index == 0:
+            start = 0
+        else:
+            start = lines.line_starts[node.location.lineno - 1]
+            if start == unit_starts[-1]:
+                continue
+        unit_starts.append(start)
+        first_nodes.append(index)
+
+    # removing the \n before a statement joins it with the previous
+    # line, so the statement after the edit is parsed again if the edit
+    # ends where it starts
+    first = bisect.bisect_right(unit_starts, offset) - 1
+    end = bisect.bisect_right(unit_starts, offset + removed_length)
+    text_end = unit_starts[end] if end < len(unit_starts) else len(code)
+    text_start = unit_starts[first]
+
+    delta = len(inserted_text) - removed_length
+    text = new_code[text_start:text_end+delta]
+    try:
+        new_nodes = list(parse(tokenizer.tokenize(text)))
+    except CompileError:
+        return list(parse(tokenizer.tokenize(new_code)))
+
+    if first != 0:
+        _shift_lines(new_nodes, nodes[first_nodes[first]].location.lineno - 1)
+
+    after = nodes[first_nodes[end]:] if end < len(unit_starts) else []
+    line_delta = (inserted_text.count('\n') -
+                  code.count('\n', offset, offset + removed_length))
+    if line_delta != 0:
+        _shift_lines(after, line_delta)
+
+    return nodes[:first_nodes[first]] + new_nodes + after
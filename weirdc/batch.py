@@ -0,0 +1,357 @@
+"""Compile all programs in a directory at once.
+
+Run ``python3 -m weirdc build DIRECTORY -j N``. The tokenizing, parsing,
+checking and C code generating is done in a pool of processes, and the
+C compiler runs in parallel as soon as each file's C code is ready.
+
+If this runs under GNU make with a jobserver, a job slot is taken from
+make for every C compiler process except the first, so ``make -j8``
+doesn't end up running more than 8 jobs in total.
+"""
+
+import argparse
+import concurrent.futures
+import os
+import re
+import select
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from weirdc import CompileError, buildcache, compiler, modules, runtime
+
+
+class JobServer:
+    """A client for the GNU make jobserver.
+
+    Make gives one job slot to every process implicitly, and more slots
+    are tokens that are read from a pipe (or a fifo in make 4.4 and
+    newer) and written back when the job is done.
+    """
+
+    def __init__(self, read_fd, write_fd):
+        self._read_fd = read_fd
+        self._write_fd = write_fd
+        self._lock = threading.Lock()
+        self._implicit_slot_free = True
+
+    @classmethod
+    def from_makeflags(cls, makeflags=None):
+        """Find the jobserver from ``$MAKEFLAGS``.
+
+        Returns None if there's no jobserver or its file descriptors
+        weren't passed to this process. Make only passes them to
+        commands that use ``$(MAKE)`` or start with ``+``.
+        """
+        if makeflags is None:
+            makeflags = os.environ.get('MAKEFLAGS', '')
+
+        match = re.search(r'--jobserver-(?:auth|fds)=(\S+)', makeflags)
+        if match is None:
+            return None
+        auth = match.group(1)
+
+        if auth.startswith('fifo:'):
+            try:
+                fd = os.open(auth[len('fifo:'):], os.O_RDWR)
+            except OSError:
+                return None
+            return cls(fd, fd)
+
+        read_fd, write_fd = map(int, auth.split(','))
+        try:
+            os.fstat(read_fd)
+            os.fstat(write_fd)
+        except OSError:
+            return None
+        return cls(read_fd, write_fd)
+
+    def acquire(self):
+        """Wait for a job slot and return a token for :meth:`release`."""
+        with self._lock:
+            if self._implicit_slot_free:
+                self._implicit_slot_free = False
+                return None
+        while True:
+            try:
+                return os.read(self._read_fd, 1)
+            except BlockingIOError:
+                # make may have made the pipe non-blocking
+                select.select([self._read_fd], [], [])
+
+    def release(self, token):
+        if token is None:
+            with self._lock:
+                self._implicit_slot_free = True
+        else:
+            os.write(self._write_fd, token)
+
+
+def find_sources(directory):
+    """Return a sorted list of paths of .weird files in a directory tree."""
+    result = []
+    for dirpath, dirnames, filenames in os.walk(directory):
+        result.extend(os.path.join(dirpath, filename)
+                      for filename in filenames if filename.endswith('.weird'))
+    return sorted(result)
+
+
+def _generate_c(path, code):
+    # this runs in a process pool, so it can't print anything and errors
+    # must be returned as strings
+    start = time.perf_counter()
+    messages = []
+    try:
+        c_code = compiler.generate_c(code, lambda warning: messages.append(
+            compiler.show_error(warning, path, code, 'warning')))
+    except CompileError as e:
+        messages.append(compiler.show_error(e, path, code))
+        c_code = None
+    return (c_code, messages, time.perf_counter() - start)
+
+
+class _Result:
+
+    def __init__(self, path, outfile):
+        self.path = path
+        self.outfile = outfile
+        self.messages = []
+        self.success = False
+        self.cached = False
+        self.frontend_time = 0.0
+        self.cc_time = 0.0
+
+
+class Builder:
+    """Compile many programs with at most *jobs* C compilers at a time.
+
+    The *cache* can be a :class:`weirdc.buildcache.BuildCache` or None.
+
+    Files that import things are compiled with a
+    :class:`weirdc.modules.ModuleBuilder` that puts object files to
+    *module_dir*, and files that other files import aren't compiled to
+    executables at all. By default, *module_dir* is the ``modules``
+    directory next to the runtime's directory.
+    """
+
+    def __init__(self, the_runtime, cc_template, jobs, cache=None,
+                 jobserver=None, module_dir=None):
+        self.runtime = the_runtime
+        self.cc_template = cc_template
+        self.jobs = jobs
+        self.cache = cache
+        self.jobserver = jobserver
+        if module_dir is None:
+            module_dir = os.path.join(
+                os.path.dirname(the_runtime.directory), 'modules')
+        self.module_dir = module_dir
+
+        # the module builder of each thread would write the same object
+        # files if two programs import the same file
+        self._module_lock = threading.Lock()
+
+    def _cache_key(self, code):
+        return buildcache.program_key(code, self.cc_template, self.runtime)
+
+    def _run_cc(self, result, code, c_code):
+        token = None if self.jobserver is None else self.jobserver.acquire()
+        start = time.perf_counter()
+        try:
+            with tempfile.NamedTemporaryFile(mode='w', suffix='.c') as cfile:
+                cfile.write(c_code)
+                cfile.flush()
+                command = self.runtime.compile_command(
+                    self.cc_template, cfile.name, result.outfile)
+                process = subprocess.run(
+                    command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        finally:
+            result.cc_time = time.perf_counter() - start
+            if self.jobserver is not None:
+                self.jobserver.release(token)
+
+        output = process.stdout.decode('utf-8', errors='replace').rstrip()
+        if output:
+            result.messages.append(output)
+        if process.returncode == 0:
+            result.success = True
+            if self.cache is not None:
+                self.cache.store(self._cache_key(code), result.outfile)
+        else:
+            result.messages.append(
+                "C compiler exited with status %d" % process.returncode)
+        return result
+
+    def _build_modules(self, result):
+        # the module builder doesn't use the build cache because it
+        # compiles only the modules that changed anyway
+        builder = modules.ModuleBuilder(self.module_dir, self.runtime,
+                                        cc_template=self.cc_template)
+        with self._module_lock:
+            token = (None if self.jobserver is None
+                     else self.jobserver.acquire())
+            start = time.perf_counter()
+            try:
+                builder.build(result.path, result.outfile)
+            except (modules.ModuleCompileError,
+                    modules.ModuleBuildError) as e:
+                result.messages.append(str(e))
+            else:
+                result.success = True
+            finally:
+                result.cc_time = time.perf_counter() - start
+                if self.jobserver is not None:
+                    self.jobserver.release(token)
+        return result
+
+    def build(self, paths_and_outfiles, callback):
+        """Compile programs and call ``callback(result)`` as they finish.
+
+        *paths_and_outfiles* should be an iterable of
+        ``(source_path, executable_path)`` tuples. The callback isn't
+        called for files that other files import.
+        """
+        self.runtime.build()
+
+        programs = []
+        imported = set()
+        for path, outfile in paths_and_outfiles:
+            with open(path, 'r') as file:
+                code = file.read()
+            programs.append((path, outfile, code))
+            imported.update(modules.imported_files(path, code))
+
+        with concurrent.futures.ProcessPoolExecutor(self.jobs) as processes, \
+                concurrent.futures.ThreadPoolExecutor(self.jobs) as threads:
+            frontend_futures = {}
+            module_results = []
+            for path, outfile, code in programs:
+                if os.path.abspath(path) in imported:
+                    # it's compiled when compiling the files that import it
+                    continue
+
+                result = _Result(path, outfile)
+                if modules.has_imports(code):
+                    module_results.append(result)
+                    continue
+
+                # cached programs don't go to the process pool at all
+                if (self.cache is not None
+                        and self.cache.lookup(self._cache_key(code), outfile)):
+                    result.success = result.cached = True
+                    callback(result)
+                    continue
+
+                future = processes.submit(_generate_c, path, code)
+                frontend_futures[future] = (result, code)
+
+            # the process pool forks its workers on the first submit, and
+            # forking while a module builder thread holds a lock can
+            # deadlock the workers, so the threads start after that
+            cc_futures = [threads.submit(self._build_modules, result)
+                          for result in module_results]
+
+            for future in concurrent.futures.as_completed(frontend_futures):
+                result, code = frontend_futures[future]
+                c_code, messages, result.frontend_time = future.result()
+                result.messages.extend(messages)
+                if c_code is None:
+                    callback(result)
+                else:
+                    cc_futures.append(threads.submit(
+                        self._run_cc, result, code, c_code))
+
+            for future in concurrent.futures.as_completed(cc_futures):
+                callback(future.result())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='weirdc build')
+    parser.add_argument(
+        'directory', help="directory that contains .weird files")
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=os.cpu_count() or 1,
+        help="how many files to compile at a time, defaults to %(default)s")
+    parser.add_argument(
+        '--outdir', metavar='DIRECTORY',
+        help=("where to put the executables, by default they go next to "
+              "the .weird files"))
+    parser.add_argument(
+        '--cc', metavar='COMMAND', default='gcc {cfile} -std=c99 -o {outfile}',
+        help=("c compiler command and options with {cfile} and {outfile} "
+              "substituted, defaults to '%(default)s'"))
+    parser.add_argument(
+        '--release', action='store_true',
+        help="optimize with link-time optimization")
+    parser.add_argument(
+        '--cache-dir', metavar='DIRECTORY',
+        default=buildcache.default_directory(),
+        help="where to cache compiled programs, defaults to '%(default)s'")
+    parser.add_argument(
+        '--cache-size', metavar='MEGABYTES', type=int,
+        default=buildcache.DEFAULT_MAX_SIZE // (1024*1024),
+        help="maximum size of the cache, defaults to %(default)s")
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help="always compile, don't look up or store anything in the cache")
+    args = parser.parse_args(argv)
+
+    paths_and_outfiles = []
+    for path in find_sources(args.directory):
+        outfile = path[:-len('.weird')]
+        if args.outdir is not None:
+            outfile = os.path.join(
+                args.outdir, os.path.relpath(outfile, args.directory))
+            os.makedirs(os.path.dirname(outfile), exist_ok=True)
+        paths_and_outfiles.append((path, outfile))
+
+    the_runtime = runtime.Runtime(args.cache_dir, shlex.split(args.cc)[0],
+                                  release=args.release)
+    if args.no_cache:
+        cache = None
+    else:
+        cache = buildcache.BuildCache(args.cache_dir,
+                                      args.cache_size * 1024 * 1024)
+    builder = Builder(the_runtime, args.cc, args.jobs, cache,
+                      JobServer.from_makeflags(),
+                      os.path.join(args.cache_dir, 'modules'))
+
+    results = []
+
+    def print_result(result):
+        for message in result.messages:
+            print(message, file=sys.stderr)
+        if not result.success:
+            status = "FAILED"
+        elif result.cached:
+            status = "cached"
+        else:
+            status = "ok"
+        print("%-6s %s  (front end %.3fs, C compiler %.3fs)" % (
+            status, result.path, result.frontend_time, result.cc_time))
+        results.append(result)
+
+    start = time.perf_counter()
+    try:
+        builder.build(paths_and_outfiles, print_result)
+    except runtime.RuntimeBuildError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+
+    # storing evicts too, but nothing is stored if everything was cached
+    # and --cache-size is now smaller
+    if cache is not None:
+        cache.evict()
+
+    failed = sum(1 for result in results if not result.success)
+    cached = sum(1 for result in results if result.cached)
+    print("%d files, %d failed, %d from cache, %.2fs total "
+          "(front end %.2fs, C compiler %.2fs, %d jobs)" % (
+              len(results), failed, cached, elapsed,
+              sum(result.frontend_time for result in results),
+              sum(result.cc_time for result in results), args.jobs))
+    if failed:
+        sys.exit(1)
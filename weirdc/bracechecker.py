@@ -10,40 +10,58 @@ _opening2closing = {'{': '}', '(': ')'}
 _closing2opening = {close: open_ for open_, close in _opening2closing.items()}
 
 
-def check(tokens):
-    brace_stack = []
-    for token in tokens:
+class BraceChecker:
+    """Check the braces one token at a time.
+
+    The tokenizer uses this for checking the braces while tokenizing,
+    see the *check_braces* argument of :func:`weirdc.tokenizer.tokenize`.
+    """
+
+    def __init__(self):
+        self._brace_stack = []
+
+    def feed(self, token):
+        """Check a token. Tokens that aren't OP tokens are ignored."""
         if token.kind != 'OP':
-            continue
+            return
 
         if token.value in _opening2closing:
-            brace_stack.append(token)
+            self._brace_stack.append(token)
         elif token.value in _closing2opening:
             opening = _closing2opening[token.value]
-            if not brace_stack:
+            if not self._brace_stack:
                 raise CompileError("missing '%s'" % opening, token.location)
 
-            open_token = brace_stack.pop()
+            open_token = self._brace_stack.pop()
             if open_token.value != opening:
                 raise CompileError(
                     "should be '%s'" % _opening2closing[open_token.value],
                     token.location)
 
-    if brace_stack:
-        # i'm not sure if complaining about the outermost brace is the
-        # right thing to do, but pypy does it...
-        #
-        # $ cat > test.py
-        # (        # one
-        #     (    # two
-        #   )      # three
-        # ^D
-        # $ bin/pypy3 test.py
-        # File "test.py", line 1
-        #     (        # one
-        #     ^
-        # SyntaxError: parenthesis is never closed
-        outermost = brace_stack[0]
-        raise CompileError(
-            "missing '%s'" % _opening2closing[brace_stack[0].value],
-            brace_stack[0].location)
+    def finish(self):
+        """Call this after feeding all tokens."""
+        if self._brace_stack:
+            # i'm not sure if complaining about the outermost brace is
+            # the right thing to do, but pypy does it...
+            #
+            # $ cat > test.py
+            # (        # one
+            #     (    # two
+            #   )      # three
+            # ^D
+            # $ bin/pypy3 test.py
+            # File "test.py", line 1
+            #     (        # one
+            #     ^
+            # SyntaxError: parenthesis is never closed
+            outermost = self._brace_stack[0]
+            raise CompileError(
+                "missing '%s'" % _opening2closing[outermost.value],
+                outermost.location)
+
+
+def check(tokens):
+    checker = BraceChecker()
+    for token in tokens:
+        checker.feed(token)
+    checker.finish()
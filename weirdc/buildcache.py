@@ -0,0 +1,202 @@
+"""Cache compiled programs on disk.
+
+Compiling the same program twice with the same C compiler gives the
+same executable, so there's no need to run the whole compiler again.
+The cache is just a directory of executables named by hashes, and the
+least recently used executables are deleted when it gets too big.
+"""
+
+import functools
+import glob
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+
+
+DEFAULT_MAX_SIZE = 100 * 1024 * 1024    # 100 MiB
+
+
+def default_directory():
+    """Return the directory that is used if no other directory is given.
+
+    This respects ``$XDG_CACHE_HOME`` like most other programs do. The
+    XDG spec says that empty and relative values must be ignored.
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME', '')
+    if not os.path.isabs(cache_home):
+        cache_home = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'weirdc')
+
+
+def hash_parts(*parts):
+    """Return a hex digest of strings, bytes and None objects.
+
+    Every part is prefixed with its length, so ``('ab', 'c')`` and
+    ``('a', 'bc')`` hash differently.
+
+    >>> hash_parts('ab', 'c') == hash_parts('a', 'bc')
+    False
+    """
+    sha = hashlib.sha256()
+    for part in parts:
+        if part is None:
+            part = b''
+        elif isinstance(part, str):
+            part = part.encode('utf-8')
+        sha.update(b'%d:' % len(part))
+        sha.update(part)
+    return sha.hexdigest()
+
+
+def hash_files(paths):
+    """Hash the names and contents of files."""
+    parts = []
+    for path in sorted(paths):
+        with open(path, 'rb') as file:
+            parts.extend([os.path.basename(path), file.read()])
+    return hash_parts(*parts)
+
+
+@functools.lru_cache()
+def compiler_fingerprint():
+    """Hash the source code of weirdc itself.
+
+    Changing weirdc may change the generated C code, so this must be
+    a part of every cache key.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    return hash_files(glob.glob(os.path.join(here, '*.py')))
+
+
+@functools.lru_cache()
+def cc_version(program):
+    """Return the output of ``program --version`` as a string.
+
+    This returns an empty string if the program can't be run, and the
+    compiling will fail later with a better error message.
+    """
+    try:
+        return subprocess.run([program, '--version'], stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL).stdout.decode(
+                                  'utf-8', errors='replace')
+    except OSError:
+        return ''
+
+
+def program_key(code, cc_template, the_runtime, *extra):
+    """Return a cache key for compiling *code* with a ``--cc`` template.
+
+    *the_runtime* should be a :class:`weirdc.runtime.Runtime` object.
+    Its key changes when the runtime or the C compiler changes, or when
+    release mode is toggled. Any *extra* strings are hashed too.
+    """
+    return hash_parts(compiler_fingerprint(), code, cc_template,
+                      the_runtime.key, *extra)
+
+
+def _directory_size(path):
+    return sum(os.path.getsize(os.path.join(dirpath, name))
+               for dirpath, dirnames, filenames in os.walk(path)
+               for name in filenames)
+
+
+class BuildCache:
+    """A directory of compiled executables.
+
+    The *max_size* is the maximum total size of the executables in
+    bytes. Entries are evicted in least recently used order when the
+    cache gets bigger than that.
+
+    If *directories* is True, the entries are directories instead of
+    files, and their modification times must be updated with
+    :func:`os.utime` when they're used.
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE, *,
+                 directories=False):
+        self.directory = directory
+        self.max_size = max_size
+        self.directories = directories
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def find(self, key):
+        """Return the path of a cached file, or None if it's not cached.
+
+        The file must not be modified, but it can be used without
+        copying it anywhere.
+        """
+        path = self._path(key)
+        if not os.path.isfile(path):
+            return None
+
+        # the modification time is used for LRU eviction, access times
+        # are often disabled with noatime and friends
+        os.utime(path)
+        return path
+
+    def lookup(self, key, outfile):
+        """Put a cached executable to *outfile*.
+
+        This returns True if the executable was found, and False if it
+        needs to be compiled.
+        """
+        path = self.find(key)
+        if path is None:
+            return False
+
+        # os.link() doesn't overwrite anything, the linker removes the
+        # old outfile before writing it too so this isn't surprising
+        if os.path.lexists(outfile):
+            os.remove(outfile)
+        try:
+            os.link(path, outfile)
+        except OSError:
+            # different file systems or the file system doesn't support
+            # hard links at all
+            shutil.copy2(path, outfile)
+        return True
+
+    def store(self, key, executable):
+        """Copy a freshly compiled executable to the cache."""
+        os.makedirs(self.directory, exist_ok=True)
+
+        # copy to a temporary file first so that other weirdc processes
+        # never see half-written executables
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        os.close(fd)
+        try:
+            shutil.copy2(executable, temp_path)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used executables until the cache is small
+        enough.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith('.'):
+                continue
+            if self.directories and entry.is_dir(follow_symlinks=False):
+                entries.append((entry.stat().st_mtime,
+                                _directory_size(entry.path), entry.path))
+            elif not self.directories and entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            if self.directories:
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+            total -= size
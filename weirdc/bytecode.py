@@ -0,0 +1,286 @@
+"""Compile checked AST nodes to bytecode for the virtual machine in
+objects/vm.c.
+
+Running bytecode doesn't need a C compiler, so this is a lot faster
+than generating C code for short programs. A bytecode file looks like
+this, and all integers are little-endian:
+
+    b'WEIRDBC\\x01'       magic
+    32 bytes            cache key, see load_cached()
+    u32                 number of constants
+      u8 kind           0 for a string, 1 for an integer
+      u32 len, bytes    string constants: UTF-8 without a trailing 0
+      u8 sign, u64      integer constants: 1 for negative, absolute value
+    u32                 number of functions
+      u16 nargs
+      u16 nlocals       arguments are the first locals
+      u32 codelen, bytes
+    u32                 index of the main function
+
+The code of a function is opcodes followed by their arguments. The VM
+is a stack machine, see objects/vm.h for what the opcodes do.
+"""
+
+import codecs
+import collections
+import functools
+import os
+import struct
+
+from weirdc import CompileError, ast, buildcache, runtime
+
+# change this when the file format or the meaning of an opcode changes,
+# and the MAGIC in objects/vm.c too
+FORMAT_VERSION = 1
+MAGIC = b'WEIRDBC' + bytes([FORMAT_VERSION])
+
+LOAD_CONST = 0       # u16 constant index
+LOAD_LOCAL = 1       # u16 local index
+STORE_LOCAL = 2      # u16 local index
+LOAD_TRUE = 3
+LOAD_FALSE = 4
+CALL = 5             # u16 function index
+PRINT = 6
+INPUT = 7
+POP = 8
+JUMP_IF_FALSE = 9    # u32 offset in the function's code
+RETURN = 10
+RETURN_NONE = 11
+
+_CONST_STRING = 0
+_CONST_INT = 1
+
+# the number of locals and the indexes of constants, locals and
+# functions are u16, and integer constants are u64
+_MAX_COUNT = 0xFFFF
+_MAX_INT = 2**64 - 1
+
+# builtins that are compiled to opcodes: {name: (opcode, returns_value)}
+_BUILTIN_FUNCTIONS = {'print': (PRINT, False), 'input': (INPUT, True)}
+_BUILTIN_VALUES = {'TRUE': LOAD_TRUE, 'FALSE': LOAD_FALSE}
+
+
+def _check_count(count, what, location):
+    if count > _MAX_COUNT:
+        raise CompileError("the bytecode backend supports at most %d %s"
+                           % (_MAX_COUNT, what), location)
+
+
+class _FunctionCompiler:
+
+    def __init__(self, program, function):
+        self.program = program
+        self.code = bytearray()
+        self.locals = collections.ChainMap()
+        self.nlocals = 0
+        self.nargs = len(function.args)
+        for argtype, argname in function.args:
+            self._new_local(argname.name, argname.location)
+
+        for statement in function.body:
+            self.statement(statement)
+        self.emit(RETURN_NONE)
+
+    def _new_local(self, name, location):
+        _check_count(self.nlocals + 1, "local variables in a function",
+                     location)
+        self.locals[name] = self.nlocals
+        self.nlocals += 1
+
+    def emit(self, opcode, format_=None, argument=None):
+        self.code.append(opcode)
+        if format_ is not None:
+            self.code += struct.pack('<' + format_, argument)
+
+    def expression(self, node):
+        if isinstance(node, ast.Name):
+            if node.name in self.locals:
+                self.emit(LOAD_LOCAL, 'H', self.locals[node.name])
+            elif node.name in _BUILTIN_VALUES:
+                self.emit(_BUILTIN_VALUES[node.name])
+            else:
+                raise CompileError("functions can't be used as values yet",
+                                   node.location)
+        elif isinstance(node, ast.String):
+            # the C backend puts the string to a C string literal, so
+            # the escapes must work the same way here
+            value = codecs.escape_decode(node.value.encode('utf-8'))[0]
+            self.emit(LOAD_CONST, 'H', self.program.constant(
+                _CONST_STRING, value, node.location))
+        elif isinstance(node, ast.Integer):
+            value = int(node.value)
+            if value > _MAX_INT:
+                raise CompileError(
+                    "the bytecode backend doesn't support integers bigger "
+                    "than %d" % _MAX_INT, node.location)
+            self.emit(LOAD_CONST, 'H', self.program.constant(
+                _CONST_INT, value, node.location))
+        elif isinstance(node, ast.FunctionCall):
+            if not self.call(node):
+                # the checker allows this only for statements
+                raise CompileError("this returns nothing", node.location)
+        else:
+            raise TypeError("don't know how to compile %r" % node)
+
+    def call(self, node):
+        # returns True if something was pushed to the stack
+        if not isinstance(node.function, ast.Name):
+            raise CompileError("only functions can be called like this",
+                               node.location)
+        for arg in node.args:
+            self.expression(arg)
+
+        name = node.function.name
+        if name in _BUILTIN_FUNCTIONS:
+            opcode, returns_value = _BUILTIN_FUNCTIONS[name]
+            self.emit(opcode)
+            return returns_value
+
+        index, returns_value = self.program.functions[name]
+        self.emit(CALL, 'H', index)
+        return returns_value
+
+    def statement(self, node):
+        if isinstance(node, ast.FunctionCall):
+            if self.call(node):
+                self.emit(POP)
+        elif isinstance(node, ast.Declaration):
+            self._new_local(node.name, node.location)
+        elif isinstance(node, ast.Assignment):
+            self.expression(node.value)
+            self.emit(STORE_LOCAL, 'H', self.locals[node.target.name])
+        elif isinstance(node, ast.Return):
+            self.expression(node.value)
+            self.emit(RETURN)
+        elif isinstance(node, ast.If):
+            self.expression(node.condition)
+            self.emit(JUMP_IF_FALSE, 'I', 0)
+            jump_argument = len(self.code) - 4
+
+            self.locals = self.locals.new_child()
+            for statement in node.body:
+                self.statement(statement)
+            self.locals = self.locals.parents
+
+            struct.pack_into('<I', self.code, jump_argument, len(self.code))
+        else:
+            raise TypeError("don't know how to compile %r" % node)
+
+
+class _ProgramCompiler:
+
+    def __init__(self, nodes):
+        for node in nodes:
+            if not isinstance(node, ast.FunctionDef):
+                raise CompileError("the bytecode backend doesn't support "
+                                   "this yet", node.location)
+
+        self._constants = []
+        self._constant_indexes = {}
+
+        if nodes:
+            _check_count(len(nodes), "functions", nodes[-1].location)
+
+        # {name: (index, returns_value)}
+        self.functions = {
+            node.name: (index, node.returntype is not None)
+            for index, node in enumerate(nodes)}
+        self.compiled = [_FunctionCompiler(self, node) for node in nodes]
+        self.main_index = self.functions['main'][0]
+
+    def constant(self, kind, value, location):
+        key = (kind, value)
+        if key not in self._constant_indexes:
+            _check_count(len(self._constants) + 1, "different constants",
+                         location)
+            self._constant_indexes[key] = len(self._constants)
+            self._constants.append(key)
+        return self._constant_indexes[key]
+
+    def to_bytes(self, key):
+        parts = [MAGIC, key, struct.pack('<I', len(self._constants))]
+        for kind, value in self._constants:
+            if kind == _CONST_STRING:
+                parts.append(struct.pack('<BI', kind, len(value)) + value)
+            else:
+                parts.append(struct.pack('<BBQ', kind, int(value < 0),
+                                         abs(value)))
+
+        parts.append(struct.pack('<I', len(self.compiled)))
+        for function in self.compiled:
+            parts.append(struct.pack('<HHI', function.nargs, function.nlocals,
+                                     len(function.code)))
+            parts.append(bytes(function.code))
+        parts.append(struct.pack('<I', self.main_index))
+        return b''.join(parts)
+
+
+def compile_nodes(nodes, key=bytes(32)):
+    """Return bytecode from nodes that :func:`weirdc.checker.check` has
+    checked.
+
+    The *key* should be 32 bytes. It's saved to the bytecode so that
+    cached bytecode files can be checked with :func:`load_cached`.
+    """
+    assert len(key) == 32
+    return _ProgramCompiler(nodes).to_bytes(key)
+
+
+@functools.lru_cache()
+def _vm_fingerprint():
+    # the VM doesn't check types, so it must not run bytecode that was
+    # compiled for an older VM
+    return buildcache.hash_files(
+        [os.path.join(runtime.OBJECTS_DIR, filename)
+         for filename in runtime.SOURCES + runtime.HEADERS]
+        + [runtime.VM_SOURCE])
+
+
+def cache_key(code):
+    """Return the bytes that bytecode made from *code* is saved with.
+
+    The key changes when weirdc, the VM or :data:`FORMAT_VERSION`
+    changes.
+    """
+    return bytes.fromhex(buildcache.hash_parts(
+        buildcache.compiler_fingerprint(), _vm_fingerprint(),
+        str(FORMAT_VERSION), code, 'bytecode'))
+
+
+def cache_path(source_path):
+    """Return where bytecode for a source file is cached.
+
+    Like ``__pycache__``, bytecode goes to ``__weirdcache__`` next to the
+    source file.
+    """
+    directory, filename = os.path.split(os.path.abspath(source_path))
+    return os.path.join(directory, '__weirdcache__',
+                        os.path.splitext(filename)[0] + '.wbc')
+
+
+def load_cached(source_path, code):
+    """Return the path of cached bytecode for code from a file.
+
+    None is returned if the bytecode isn't cached, or the code or
+    weirdc changed after caching it.
+    """
+    path = cache_path(source_path)
+    try:
+        with open(path, 'rb') as file:
+            header = file.read(len(MAGIC) + 32)
+    except OSError:
+        return None
+    if header != MAGIC + cache_key(code):
+        return None
+    return path
+
+
+def save_cached(source_path, bytecode):
+    """Save bytecode from :func:`compile_nodes` and return the path."""
+    path = cache_path(source_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + '.tmp%d' % os.getpid()
+    with open(temp_path, 'wb') as file:
+        file.write(bytecode)
+    os.replace(temp_path, path)
+    return path
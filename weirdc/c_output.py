@@ -4,23 +4,16 @@ This is a very minimal version and will probably change a lot later.
 """
 
 import collections
-import glob
 import itertools
-import os
-import random
 
 from weirdc import ast
 
 
-# TODO: Do not utilize __INCLUDES__, instead use `str.format` or something like
-# that.
+# weird.h includes everything that the runtime needs, and it must be the
+# first thing here so that the C compiler can use the precompiled header
+# built by weirdc.runtime
 # TODO: Investigate the warnings about `do_the_print` in Valgrind.
-_PRELOAD = r"""
-#include <stdio.h>
-#include <string.h>
-#include <stdlib.h>
-
-__INCLUDES__
+_PRELOAD = r"""#include "weird.h"
 
 static void do_the_print(struct WeirdObject *message)
 {
@@ -50,89 +43,182 @@ static struct WeirdObject *do_the_input()
 }
 #undef MAXLEN
 
-""".replace("__INCLUDES__", 
-            "\n".join(f'#include "{os.path.basename(header)}"'
-                      for header in glob.glob("objects/*.h")), 
-            1)
+"""
 
 
 # Maps objects to functions that return the C code for their construction.
 OBJECTS = {
     "Int": lambda n: f"weirdint_new({abs(n)}, {1 if n >= 0 else -1})",
-    "String": lambda s: f'weirdstring_new("{s}", {len(s)})',
+    # escapes like \n are in the literal as 2 characters, so the length
+    # must be calculated by the C compiler
+    "String": lambda s: f'weirdstring_new("{s}", sizeof("{s}") - 1)',
 }
 
 BUILTIN_NAMES = {
     'print': 'do_the_print',
     'input': 'do_the_input',
+    'TRUE': 'weirdbool_TRUE',
+    'FALSE': 'weirdbool_FALSE',
     'main': 'main'
 }
 
-declared_names = collections.ChainMap({}, BUILTIN_NAMES)
-random_name = ('name%d' % i for i in itertools.count(1)).__next__
-
-
-def _unparse(node):
-    # this is used just for parsing function definitions
-    if node is None:
-        return 'void'
-
-    if isinstance(node, ast.Name):
-        if node.name in OBJECTS:
-            return "struct WeirdObject*"
-        return declared_names[node.name]
-    if isinstance(node, ast.Integer):
-        return str(node.value)
-    if isinstance(node, ast.String):
-        # TODO: escaping and other stuff
-        # XXX: String literals that aren't assigned to a variable are never
-        # freed.
-        return OBJECTS["String"](node.value)
-    if isinstance(node, ast.ExpressionStatement):
-        return _unparse(node.expression) + ';'
-    if isinstance(node, ast.Return):
-        return 'return %s;' % _unparse(node.value)
-
-    if isinstance(node, ast.Declaration):
-        declared_names[node.variable] = node.variable
-        if node.value is None:
-            return '%s %s;' % (_unparse(node.type), node.variable)
-        elif node.type in OBJECTS:
-            value = OBJECTS[node.type](node.value)
-            return '%s %s = %s;' % (
-                _unparse(node.type), node.variable, value)
-        return '%s %s = %s;' % (
-            _unparse(node.type), node.variable, _unparse(node.value))
-
-    if isinstance(node, ast.FunctionCall):
-        return '%s(%s)' % (
-            _unparse(node.function),
-            ','.join(map(_unparse, node.arguments)),
-        )
-
-    if isinstance(node, ast.FunctionDef):
-        # TODO: Add support for function arguments.
-        assert not node.arguments   # lol
-        if node.name not in declared_names:
-            declared_names[node.name] = random_name()
+
+class CodeGenerator:
+    """Everything that needs to be remembered while making C code.
+
+    A new generator is created for every make_c_code() call, so C code
+    made from one file doesn't depend on other files.
+    """
+
+    def __init__(self, module_prefix=None, import_prefixes=None):
+        self.declared_names = collections.ChainMap({}, BUILTIN_NAMES)
+        self._name_counter = itertools.count(1)
+        self.module_prefix = module_prefix
+        self.import_prefixes = import_prefixes or {}
+
+    def random_name(self):
+        return 'name%d' % next(self._name_counter)
+
+    def unparse(self, node):
+        # this is used for expressions and type names
+        if node is None:
+            return 'void'
+
+        if isinstance(node, ast.Name):
+            if node.name in OBJECTS or node.name == 'Bool':
+                return "struct WeirdObject*"
+            return self.declared_names[node.name]
+        if isinstance(node, ast.Integer):
+            return OBJECTS["Int"](int(node.value))
+        if isinstance(node, ast.String):
+            # TODO: escaping and other stuff
+            # XXX: String literals that aren't assigned to a variable are
+            # never freed.
+            return OBJECTS["String"](node.value)
+        if isinstance(node, ast.FunctionCall):
+            return '%s(%s)' % (
+                self.unparse(node.function),
+                ','.join(map(self.unparse, node.args)),
+            )
+
+        raise TypeError(f"don't know how to unparse {node!r}")
+
+    def unparse_statement(self, node):
+        if isinstance(node, ast.FunctionCall):
+            return self.unparse(node) + ';'
+        if isinstance(node, ast.Return):
+            return 'return %s;' % self.unparse(node.value)
+
+        if isinstance(node, ast.Declaration):
+            self.declared_names[node.name] = node.name
+            return '%s %s;' % (self.unparse(node.type), node.name)
+        if isinstance(node, ast.Assignment):
+            return '%s = %s;' % (self.unparse(node.target),
+                                 self.unparse(node.value))
+        if isinstance(node, ast.If):
+            return 'if (weirdbool_asint(%s)) { %s }' % (
+                self.unparse(node.condition),
+                ''.join(map(self.unparse_statement, node.body)))
+
+        if isinstance(node, ast.DecRef):
+            return f"weirdobject_decref({node.varname});"
+
+        raise TypeError(f"don't know how to unparse {node!r}")
+
+    def function_header(self, node):
+        if node.name not in self.declared_names:
+            if self.module_prefix is None:
+                self.declared_names[node.name] = self.random_name()
+            else:
+                # other modules need to know this name
+                self.declared_names[node.name] = self.module_prefix + node.name
         if node.name == "main":
             # Since we must return an int primitive from main, we treat it
             # specially.
-            # TODO: Handle returns, so WeirdInt objects are converted to C int
-            # primitives.
-            return "int main(void) { %s }" % (''.join(map(_unparse, node.body)))
-        else:
-            return '%s %s(void) { %s }' % (
-                _unparse(node.returntype),
-                declared_names[node.name],
-                ''.join(map(_unparse, node.body))
-            )
-
-    if isinstance(node, ast.DecRef):
-        return f"weirdobject_decref({node.name});"
-
-    raise TypeError(f"don't know how to unparse {node!r}")
+            return "int main(void)"
+
+        args = ', '.join('%s %s' % (self.unparse(argtype), argname.name)
+                         for argtype, argname in node.args)
+        return '%s %s(%s)' % (self.unparse(node.returntype),
+                              self.declared_names[node.name], args or 'void')
+
+    def import_prototype(self, node):
+        c_name = self.import_prefixes[node.path] + node.name
+        self.declared_names[node.name] = c_name
+        args = ', '.join(["struct WeirdObject*"] * len(node.functype.argtypes))
+        returntype = ('void' if node.functype.returntype is None
+                      else "struct WeirdObject*")
+        return '%s %s(%s);\n' % (returntype, c_name, args or 'void')
+
+    def unparse_function_def(self, node):
+        header = self.function_header(node)
+
+        # local variables and arguments must not leak to other functions
+        self.declared_names = self.declared_names.new_child()
+        try:
+            for argtype, argname in node.args:
+                self.declared_names[argname.name] = argname.name
+            body = ''.join(map(self.unparse_statement, node.body))
+        finally:
+            self.declared_names = self.declared_names.parents
 
-
-def make_c_code(nodes):
-    return _PRELOAD + '\n\n'.join(map(_unparse, nodes)) + '\n'
+        if node.name == "main":
+            return ("%s { weirdbool_init(); %s weirdbool_finalize(); "
+                    "return 0; }" % (header, body))
+        return '%s { %s }' % (header, body)
+
+    def prototypes(self, nodes):
+        # the checker allows calling functions that are defined later in
+        # the file, so everything is forward-declared first
+        imports = [node for node in nodes if isinstance(node, ast.Import)]
+        functions = [node for node in nodes
+                     if isinstance(node, ast.FunctionDef)]
+        return (''.join(map(self.import_prototype, imports))
+                + ''.join(self.function_header(node) + ';\n'
+                          for node in functions if node.name != 'main'))
+
+    def iter_c_code(self, nodes, checked_nodes):
+        yield _PRELOAD + self.prototypes(nodes) + '\n'
+        first = True
+        for node in checked_nodes:
+            if isinstance(node, ast.FunctionDef):
+                c_function = self.unparse_function_def(node)
+                yield c_function if first else '\n\n' + c_function
+                first = False
+        yield '\n'
+
+    def make_c_code(self, nodes):
+        return ''.join(self.iter_c_code(nodes, nodes))
+
+
+def join_c_code(prototypes, functions):
+    """Put together C code from prototypes and a list of C functions."""
+    return _PRELOAD + prototypes + '\n' + '\n\n'.join(functions) + '\n'
+
+
+def iter_c_code(nodes, checked_nodes=None):
+    """Like :func:`make_c_code`, but yield the C code in parts.
+
+    There's a part for each function, so the whole C code never needs
+    to be in memory at once. The prototypes come from *nodes*, and the
+    functions come from *checked_nodes*, which defaults to *nodes*. It
+    can be an iterator from :func:`weirdc.checker.iter_check`, and then
+    each function is checked right before making C code of it.
+    """
+    if checked_nodes is None:
+        checked_nodes = nodes
+    return CodeGenerator().iter_c_code(nodes, checked_nodes)
+
+
+def make_c_code(nodes, module_prefix=None, import_prefixes=None):
+    """Return C code as a string from a list of checked AST nodes.
+
+    This doesn't use any global state, so the same nodes always give
+    the same C code.
+
+    When compiling modules separately, functions are named
+    *module_prefix* followed by their names in the weird code, and
+    *import_prefixes* is a ``{path: module_prefix}`` dictionary of the
+    modules that import statements import from.
+    """
+    return CodeGenerator(module_prefix, import_prefixes).make_c_code(nodes)
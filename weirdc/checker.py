@@ -34,6 +34,9 @@ BOOL_TYPE = Type('Bool')
 TRUE = Instance(BOOL_TYPE)
 FALSE = Instance(BOOL_TYPE)
 
+# types that can be used in interfaces of modules, by name
+TYPES = {type_.name: type_ for type_ in [INT_TYPE, STRING_TYPE, BOOL_TYPE]}
+
 # used_by is a list of statement nodes that do something with this variable
 # the [] is copied when a new Variable object is created, see utils.py
 Variable = _small_class(
@@ -41,6 +44,19 @@ Variable = _small_class(
     default_attrs={'initialized': False, 'used_by': []})
 
 
+def _replace_statements(statements, replacements):
+    # returns a new list, the variable may also be assigned to in the
+    # body of an if
+    result = []
+    for statement in statements:
+        if isinstance(statement, ast.If):
+            statement.body = _replace_statements(statement.body, replacements)
+        statement = replacements.get(id(statement), statement)
+        if statement is not None:
+            result.append(statement)
+    return result
+
+
 # TODO: support some kind of inheritance? currently == is used for
 # comparing types everywhere
 class Scope:
@@ -122,6 +138,10 @@ class Scope:
         # parent scopes
         defined_vars = self._variables.maps[0]
 
+        # {id(statement): replacement statement or None for deleting}
+        # looking up each statement from self.output with index() and
+        # remove() was quadratic and used the slow __eq__ of the nodes
+        replacements = {}
         for name, var in defined_vars.items():
             if not all(isinstance(node, (ast.Declaration, ast.Assignment))
                        for node in var.used_by):
@@ -137,12 +157,15 @@ class Scope:
                 if (isinstance(statement, ast.Assignment)
                         and isinstance(statement.value, ast.FunctionCall)):
                     # unused_var = lel()   // replace with just lel()
-                    self.output[self.output.index(statement)] = statement.value
+                    replacements[id(statement)] = statement.value
                 else:
                     # we don't need statements like this at all
                     #   String s
                     #   String s = "literal"
-                    self.output.remove(statement)
+                    replacements[id(statement)] = None
+
+        if replacements:
+            self.output = _replace_statements(self.output, replacements)
 
     def evaluate(self, expression, source_statement, *, allow_no_value=False):
         """Pseudo-run an expression.
@@ -250,9 +273,17 @@ class Scope:
             self._variables[statement.target.name].initialized = True
 
         elif isinstance(statement, ast.If):
+            condition = self.evaluate(statement.condition, statement)
+            if condition.type != BOOL_TYPE:
+                raise CompileError(
+                    "this should be a Bool, not %s" % utils.add_article(
+                        "function" if isinstance(condition.type, FunctionType)
+                        else condition.type.name),
+                    statement.condition.location)
+
             subscope = Scope(self, self.returntype)
             for substatement in statement.body:
-                substatement.execute(statement)
+                subscope.execute(substatement)
             subscope.check_unused_vars()
             statement.body = subscope.output
 
@@ -318,6 +349,27 @@ class Scope:
         self._variables[function.name] = Variable(
             Instance(functype), function.location, initialized=True)
 
+    def declare_import(self, the_import, interfaces):
+        """Add an imported function to this scope.
+
+        *interfaces* is a ``{path: {name: FunctionType}}`` dictionary.
+        The import node's functype is set to the FunctionType.
+        """
+        self._error_if_defined(the_import.name, the_import)
+        if the_import.path not in interfaces:
+            raise CompileError("cannot find '%s'" % the_import.path,
+                               the_import.location)
+        try:
+            functype = interfaces[the_import.path][the_import.name]
+        except KeyError:
+            raise CompileError(
+                "'%s' has no function named '%s'"
+                % (the_import.path, the_import.name), the_import.location)
+
+        the_import.functype = functype
+        self._variables[the_import.name] = Variable(
+            Instance(functype), the_import.location, initialized=True)
+
     def execute_function_def(self, function):
         returntype = self._variables[function.name].value.type.returntype
         scope = Scope(self, returntype)
@@ -335,35 +387,93 @@ _builtin_vars = {
     'Bool': BOOL_TYPE,
     'TRUE': Instance(BOOL_TYPE),
     'FALSE': Instance(BOOL_TYPE),
+    'print': Instance(FunctionType('print', [STRING_TYPE], None)),
+    'input': Instance(FunctionType('input', [], STRING_TYPE)),
 }
 
-_BUILTIN_SCOPE = Scope(None, None)
-_BUILTIN_SCOPE._variables.update({
-    name: Variable(value, None, initialized=True)
-    for name, value in _builtin_vars.items()})
 
+# Variable objects get mutated when they are used, so every check() call
+# needs its own builtin scope, otherwise compiling a file would affect
+# compiling the next file
+def _make_builtin_scope():
+    scope = Scope(None, None)
+    scope._variables.update({
+        name: Variable(value, None, initialized=True)
+        for name, value in _builtin_vars.items()})
+    return scope
 
-def check(ast_nodes, warn_callback):
-    # must not be an iterator because this loops over it several times
-    assert ast_nodes is not iter(ast_nodes)
+
+def declare_globals(ast_nodes, warn_callback, interfaces=None, *,
+                    require_main=True):
+    """Return a file scope with all functions and imports declared.
+
+    The function bodies aren't checked, so nothing is added to the
+    scope's output yet. This is useful for checking only some functions
+    of a file with :meth:`Scope.execute_function_def`, and the arguments
+    are like for :func:`check`.
+    """
+    if interfaces is None:
+        interfaces = {}
 
     for node in ast_nodes:
-        if not isinstance(node, ast.FunctionDef):
+        if not isinstance(node, (ast.FunctionDef, ast.Import)):
             # TODO: allow global vars and get rid of main functions
             raise CompileError("only function definitions can be here",
                                node.location)
-    if 'main' not in (func.name for func in ast_nodes):
+    functions = [node for node in ast_nodes
+                 if isinstance(node, ast.FunctionDef)]
+    imports = [node for node in ast_nodes if isinstance(node, ast.Import)]
+    if require_main and 'main' not in (func.name for func in functions):
         raise CompileError("there's no main() function", None)
 
-    global_scope = Scope(_BUILTIN_SCOPE, None, warn_callback=warn_callback)
+    global_scope = Scope(_make_builtin_scope(), None,
+                         warn_callback=warn_callback)
 
     # all functions need to be declared before using them, so we'll just
     # forward-declare everything
-    for func in ast_nodes:
+    for the_import in imports:
+        global_scope.declare_import(the_import, interfaces)
+    for func in functions:
         global_scope.declare_function(func)
-    for func in ast_nodes:
-        global_scope.execute_function_def(func)
+    return global_scope
+
+
+def _check_bodies(global_scope, ast_nodes):
+    for node in ast_nodes:
+        if isinstance(node, ast.Import):
+            yield node
+    for node in ast_nodes:
+        if isinstance(node, ast.FunctionDef):
+            global_scope.execute_function_def(node)
+            yield node
+
+
+def iter_check(ast_nodes, warn_callback, interfaces=None, *,
+               require_main=True):
+    """Like :func:`check`, but return an iterator of checked nodes.
+
+    The functions are declared right away, but each function's body is
+    checked only when the iterator gets to it. This way the checked
+    functions can be used before the rest of the file is checked.
+    """
+    global_scope = declare_globals(ast_nodes, warn_callback, interfaces,
+                                   require_main=require_main)
+    return _check_bodies(global_scope, ast_nodes)
+
+
+def check(ast_nodes, warn_callback, interfaces=None, *, require_main=True):
+    """Check AST nodes and mutate them for c_output.
+
+    *interfaces* is a ``{path: {name: FunctionType}}`` dictionary of
+    functions that import statements can import. Modules that are
+    imported from other modules don't need a main function, so set
+    *require_main* to False for them.
+    """
+    # must not be an iterator because this loops over it several times
+    assert ast_nodes is not iter(ast_nodes)
+    checked = list(iter_check(ast_nodes, warn_callback, interfaces,
+                              require_main=require_main))
 
     # ast nodes are mutated too, so i think it makes sense to mutate
     # everything instead of making new objects
-    ast_nodes[:] = global_scope.output
+    ast_nodes[:] = checked
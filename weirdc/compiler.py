@@ -0,0 +1,169 @@
+"""Turn weird code into C code without running the C compiler.
+
+This is the part of weirdc that doesn't care about command-line
+arguments, so it can be used for compiling many files in one process.
+"""
+
+from weirdc import CompileError, LineIndex, tokenizer, ast, checker, c_output
+
+
+def _ignore_warning(warning):
+    pass
+
+
+def show_error(error, filename, code, kind='error'):
+    """Return an error message from :meth:`weirdc.CompileError.show`.
+
+    The line that the error comes from is taken from *code*, which can
+    also be a :class:`weirdc.LineIndex` of the code.
+    """
+    if error.location is None:
+        line = None
+    else:
+        if not isinstance(code, LineIndex):
+            code = LineIndex(code)
+        line = code.line(error.location.lineno)
+    return error.show(filename, line, kind)
+
+
+def _check_and_store(code, warn_callback, node_cache):
+    # like the uncached part of generate_c(), but the results go to
+    # the cache too
+    warnings = []
+
+    def store_warning(warning):
+        warnings.append(warning)
+        warn_callback(warning)
+
+    try:
+        node_list = list(ast.parse(tokenizer.CompactTokens(code)))
+        checker.check(node_list, store_warning)
+    except CompileError as e:
+        node_cache.store(code, [], warnings, e)
+        raise
+    node_cache.store(code, node_list, warnings)
+    return node_list
+
+
+def check_code(code, warn_callback=None, node_cache=None):
+    """Tokenize, parse and check *code*, and return the checked nodes.
+
+    If *node_cache* is a :class:`weirdc.nodecache.NodeCache`, the
+    checked nodes and warnings are loaded from it if they are there,
+    and saved to it otherwise. Errors are raised as CompileErrors.
+    """
+    if warn_callback is None:
+        warn_callback = _ignore_warning
+
+    if node_cache is None:
+        node_list = list(ast.parse(tokenizer.CompactTokens(code)))
+        checker.check(node_list, warn_callback)
+        return node_list
+
+    node_list = node_cache.load(code, warn_callback)
+    if node_list is None:
+        node_list = _check_and_store(code, warn_callback, node_cache)
+    return node_list
+
+
+def generate_c(code, warn_callback=None, the_stats=None, node_cache=None):
+    """Tokenize, parse and check *code*, and return C code as a string.
+
+    *warn_callback* is called with a :class:`weirdc.CompileError`
+    for each warning, and warnings are ignored by default. Errors are
+    raised as CompileErrors.
+
+    If *the_stats* is a :class:`weirdc.stats.Stats` object, each phase
+    is measured separately and counts of things are added to it.
+    Otherwise *node_cache* is used like in :func:`check_code`.
+    """
+    if warn_callback is None:
+        warn_callback = _ignore_warning
+
+    # CompactTokens uses a lot less memory than a list of Tokens
+    if the_stats is None:
+        node_list = check_code(code, warn_callback, node_cache)
+        return c_output.make_c_code(node_list)
+
+    from weirdc import stats
+
+    with the_stats.phase('tokenizing'):
+        tokens = tokenizer.CompactTokens(code)
+    with the_stats.phase('parsing'):
+        node_list = list(ast.parse(tokens))
+    the_stats.counts['tokens'] = len(tokens)
+    the_stats.counts['ast_nodes'] = stats.count_nodes(node_list)
+    the_stats.counts['functions'] = sum(
+        isinstance(node, ast.FunctionDef) for node in node_list)
+
+    with the_stats.phase('checking'):
+        checker.check(node_list, warn_callback)
+    with the_stats.phase('code generation'):
+        c_code = c_output.make_c_code(node_list)
+    the_stats.counts['c_bytes'] = len(c_code.encode('utf-8'))
+    return c_code
+
+
+def write_c(code, file, warn_callback=None, node_cache=None):
+    """Like :func:`generate_c`, but write the C code to a file object.
+
+    Each function is checked and turned into C code right before
+    writing it, so if *file* is a pipe to a C compiler, the C compiler
+    can work while this is still running. If a CompileError is raised,
+    some of the C code may have been written already.
+
+    If the checked nodes are in *node_cache*, they are used instead of
+    checking the code, and otherwise they are saved there at the end.
+    """
+    if warn_callback is None:
+        warn_callback = _ignore_warning
+
+    if node_cache is not None:
+        node_list = node_cache.load(code, warn_callback)
+        if node_list is not None:
+            for part in c_output.iter_c_code(node_list):
+                file.write(part)
+            return
+
+    warnings = []
+
+    def store_warning(warning):
+        warnings.append(warning)
+        warn_callback(warning)
+
+    try:
+        node_list = list(ast.parse(tokenizer.CompactTokens(code)))
+        checked = checker.iter_check(node_list, store_warning)
+        for part in c_output.iter_c_code(node_list, checked):
+            file.write(part)
+    except CompileError as e:
+        if node_cache is not None:
+            node_cache.store(code, [], warnings, e)
+        raise
+
+    # iter_check() checks the nodes in node_list without copying them
+    if node_cache is not None:
+        node_cache.store(code, node_list, warnings)
+
+
+def compile_many(paths, warn_callback=None):
+    """Generate C code for many files.
+
+    This returns a ``{path: c_code}`` dictionary. If *warn_callback* is
+    given, it's called with the path and a CompileError for each
+    warning. A CompileError is raised if any of the files contain
+    errors.
+    """
+    result = {}
+    for path in paths:
+        with open(path, 'r') as file:
+            code = file.read()
+
+        if warn_callback is None:
+            file_warn_callback = None
+        else:
+            def file_warn_callback(warning, path=path):
+                warn_callback(path, warning)
+
+        result[path] = generate_c(code, file_warn_callback)
+    return result
@@ -0,0 +1,228 @@
+"""A compact way to store the AST nodes of big programs.
+
+Every node from :mod:`weirdc.ast` is a separate object with its own
+:class:`weirdc.Location`, and that needs a lot of memory when a
+machine-generated file has hundreds of thousands of statements. A
+:class:`FlatTree` stores the nodes of a whole file in a few arrays, with
+integer indexes instead of references to child nodes and each name or
+string value stored only once.
+
+The checker and :mod:`weirdc.c_output` can use the nodes of a
+FlatTree through node views. They are instances of subclasses of the
+classes in :mod:`weirdc.ast`, so ``isinstance(view, ast.Name)`` works,
+but their attributes are looked up from the arrays when they're needed.
+Views can be changed like AST nodes, e.g. the checker sets the body of
+a FunctionDef, but that changes only the view and not the tree.
+"""
+
+import array
+
+from weirdc import Location, ast
+
+# how the fields of a node are stored in FlatTree.data, in the order of
+# ast.NODE_FIELDS:
+#   'string'    index of FlatTree.strings
+#   'node'      index of a node, or -1 for None
+#   'nodes'     length of a list followed by that many node indexes
+#   'pairs'     length of a list followed by 2*length node indexes
+_FIELDS = ast.NODE_FIELDS
+
+# attributes that the checker sets, they aren't stored in the tree
+_EXTRA_ATTRS = {ast.Import: {'functype': None}}
+
+# the codes in FlatTree.kinds are indexes of this
+_NODE_TYPES = tuple(_FIELDS)
+_TYPE_CODES = {node_type: code for code, node_type in enumerate(_NODE_TYPES)}
+
+# a location's end can be None
+_NO_END = -1
+
+
+def _make_setter(name):
+    def setter(self, value):
+        if self._changed is None:
+            self._changed = {}
+        self._changed[name] = value
+    return setter
+
+
+def _make_property(name, position):
+    def getter(self):
+        if self._changed is not None and name in self._changed:
+            return self._changed[name]
+        return self._tree._get_field(self._index, position)
+    return property(getter, _make_setter(name))
+
+
+def _make_extra_property(name, default):
+    def getter(self):
+        if self._changed is None:
+            return default
+        return self._changed.get(name, default)
+    return property(getter, _make_setter(name))
+
+
+def _make_view_class(node_type):
+    namespace = {
+        '__module__': __name__,
+        '__slots__': ('_tree', '_index', '_changed'),
+        'location': property(lambda self: self._tree.location(self._index)),
+    }
+    for position, (name, how) in enumerate(_FIELDS[node_type]):
+        namespace[name] = _make_property(name, position)
+    for name, default in _EXTRA_ATTRS.get(node_type, {}).items():
+        namespace[name] = _make_extra_property(name, default)
+
+    def dunder_init(self, tree, index):
+        self._tree = tree
+        self._index = index
+        self._changed = None
+
+    namespace['__init__'] = dunder_init
+    return type(node_type.__name__, (node_type,), namespace)
+
+
+_VIEW_CLASSES = tuple(map(_make_view_class, _NODE_TYPES))
+
+
+class FlatTree:
+    """AST nodes stored in arrays.
+
+    *kinds* contains a code of each node's type, and *data_starts* has
+    the index where the node's fields start in *data*. The fields are
+    stored like :data:`_FIELDS` says. The locations are in *linenos*,
+    *starts* and *ends*, and *roots* contains the indexes of the
+    top-level nodes.
+
+    Children are always added before their parents, so a node's
+    index is bigger than the indexes of its children.
+    """
+
+    def __init__(self):
+        self.kinds = array.array('B')
+        self.data_starts = array.array('I')
+        self.data = array.array('i')
+        self.linenos = array.array('I')
+        self.starts = array.array('I')
+        self.ends = array.array('i')
+        self.strings = []
+        self.roots = array.array('I')
+        self._string_indexes = {}
+
+    def __len__(self):
+        """Return the number of nodes, including nested nodes."""
+        return len(self.kinds)
+
+    def _intern(self, string):
+        if self._string_indexes is None:
+            self._string_indexes = {
+                string: index for index, string in enumerate(self.strings)}
+        try:
+            return self._string_indexes[string]
+        except KeyError:
+            index = self._string_indexes[string] = len(self.strings)
+            self.strings.append(string)
+            return index
+
+    def _add_node(self, node):
+        values = []
+        for name, how in _FIELDS[type(node)]:
+            value = getattr(node, name)
+            if how == 'string':
+                values.append(self._intern(value))
+            elif how == 'node':
+                values.append(-1 if value is None else self._add_node(value))
+            elif how == 'nodes':
+                values.append(len(value))
+                values.extend(map(self._add_node, value))
+            else:
+                assert how == 'pairs'
+                values.append(len(value))
+                for first, second in value:
+                    values.append(self._add_node(first))
+                    values.append(self._add_node(second))
+
+        index = len(self.kinds)
+        self.kinds.append(_TYPE_CODES[type(node)])
+        self.data_starts.append(len(self.data))
+        self.data.extend(values)
+
+        location = node.location
+        self.linenos.append(location.lineno)
+        self.starts.append(location.start)
+        self.ends.append(_NO_END if location.end is None else location.end)
+        return index
+
+    def append(self, node):
+        """Add a top-level node from :mod:`weirdc.ast` and its children.
+
+        The node must not be from the checker, e.g. DecRef nodes aren't
+        supported.
+        """
+        self.roots.append(self._add_node(node))
+
+    def _get_field(self, index, position):
+        node_type = _NODE_TYPES[self.kinds[index]]
+        data = self.data
+        offset = self.data_starts[index]
+
+        # lists have different lengths, so previous fields must be
+        # skipped one by one
+        fields = _FIELDS[node_type]
+        for name, how in fields[:position]:
+            if how == 'nodes':
+                offset += 1 + data[offset]
+            elif how == 'pairs':
+                offset += 1 + 2*data[offset]
+            else:
+                offset += 1
+
+        how = fields[position][1]
+        if how == 'string':
+            return self.strings[data[offset]]
+        if how == 'node':
+            return None if data[offset] == -1 else self.view(data[offset])
+        if how == 'nodes':
+            return [self.view(child) for child in
+                    data[offset+1:offset+1+data[offset]]]
+
+        assert how == 'pairs'
+        children = data[offset+1:offset+1+2*data[offset]]
+        return [(self.view(first), self.view(second))
+                for first, second in zip(children[::2], children[1::2])]
+
+    def location(self, index):
+        """Return the location of a node."""
+        end = self.ends[index]
+        return Location(self.starts[index], None if end == _NO_END else end,
+                        self.linenos[index])
+
+    def view(self, index):
+        """Return a node view of the node at an index."""
+        return _VIEW_CLASSES[self.kinds[index]](self, index)
+
+    def nodes(self):
+        """Return a list of views of the top-level nodes.
+
+        This is like the list that :func:`weirdc.ast.parse` would give,
+        so it can be passed to :func:`weirdc.checker.check` and then to
+        :func:`weirdc.c_output.make_c_code`.
+        """
+        return [self.view(index) for index in self.roots]
+
+
+def parse(tokens):
+    """Parse tokens to a :class:`FlatTree`.
+
+    This is like :func:`weirdc.ast.parse`, but the nodes of each
+    top-level statement are put to the tree right after parsing it, so
+    the nodes of the whole file are never in memory as separate objects.
+    """
+    tree = FlatTree()
+    for node in ast.parse(tokens):
+        tree.append(node)
+
+    # the dict needs a lot of memory, and append() creates it again if
+    # it's needed
+    tree._string_indexes = None
+    return tree
@@ -0,0 +1,266 @@
+"""Compile programs that consist of many files, one file at a time.
+
+A file can import functions from other files like this::
+
+    import greet from "greetings.weird"
+
+Every file is a module that is compiled to its own object file, and
+the argument and return types of its functions are saved to a JSON
+interface file next to the object file. When building again, a module
+is compiled only if its code changed or an interface of a module that
+it imports changed, so changing a function's body doesn't recompile
+anything else.
+"""
+
+import json
+import os
+import shlex
+import subprocess
+import sys
+
+from weirdc import (CompileError, ast, buildcache, c_output, checker,
+                    compiler, runtime, tokenizer)
+
+
+class ModuleCompileError(Exception):
+    """A CompileError that also knows which file it comes from."""
+
+    def __init__(self, path, code, error):
+        super().__init__(path, code, error)
+        self.path = path
+        self.code = code
+        self.error = error
+
+    def __str__(self):
+        return compiler.show_error(self.error, self.path, self.code)
+
+
+class ModuleBuildError(Exception):
+    """Raised when the C compiler fails."""
+
+
+def has_imports(code):
+    """Check if code contains import statements.
+
+    This returns False if the code can't be tokenized, so the error is
+    reported when compiling it.
+    """
+    # this is called for every file, and most files don't import
+    # anything, so they aren't tokenized here at all
+    if 'import' not in code:
+        return False
+    try:
+        return any(token.kind == 'NAME' and token.value == 'import'
+                   for token in tokenizer.tokenize(code))
+    except CompileError:
+        return False
+
+
+def _find_imports(path, nodes):
+    # returns {path as written in the import: absolute path}
+    return {node.path: os.path.normpath(os.path.join(
+                os.path.dirname(os.path.abspath(path)), node.path))
+            for node in nodes if isinstance(node, ast.Import)}
+
+
+def imported_files(path, code):
+    """Return a set of absolute paths of files that code imports.
+
+    Like :func:`has_imports`, this returns an empty set if the code
+    can't be parsed.
+    """
+    if not has_imports(code):
+        return set()
+    try:
+        nodes = list(ast.parse(tokenizer.tokenize(code)))
+    except CompileError:
+        return set()
+    return set(_find_imports(path, nodes).values())
+
+
+def module_prefix(path):
+    """Return the prefix of C function names of a module."""
+    return 'weirdmod_%s_' % buildcache.hash_parts(os.path.abspath(path))[:12]
+
+
+def _make_interface(nodes):
+    return {
+        node.name: {
+            'args': [argtype.name for argtype, argname in node.args],
+            'returns': (None if node.returntype is None
+                        else node.returntype.name),
+        }
+        for node in nodes
+        if isinstance(node, ast.FunctionDef) and node.name != 'main'
+    }
+
+
+def _load_interface(functions):
+    result = {}
+    for name, info in functions.items():
+        returntype = (None if info['returns'] is None
+                      else checker.TYPES[info['returns']])
+        result[name] = checker.FunctionType(
+            name, [checker.TYPES[typename] for typename in info['args']],
+            returntype)
+    return result
+
+
+class _Module:
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'r') as file:
+            self.code = file.read()
+
+        try:
+            self.nodes = list(ast.parse(tokenizer.tokenize(self.code)))
+        except CompileError as e:
+            raise ModuleCompileError(path, self.code, e)
+
+        # {path as written in the import: absolute path}
+        self.imports = _find_imports(path, self.nodes)
+
+    def error(self, message, import_path):
+        for node in self.nodes:
+            if isinstance(node, ast.Import) and node.path == import_path:
+                return ModuleCompileError(
+                    self.path, self.code, CompileError(message, node.location))
+        raise ValueError("no import of " + import_path)   # pragma: no cover
+
+
+class ModuleBuilder:
+    """Compile modules to object files in *build_dir* and link them.
+
+    *the_runtime* is a :class:`weirdc.runtime.Runtime` object, and it
+    must be built before calling :meth:`build`. *debug* is called with
+    a message string when something is compiled. The *cc_template* is
+    a ``--cc`` template string, and it's used for compiling and linking.
+    """
+
+    def __init__(self, build_dir, the_runtime, debug=None,
+                 cc_template=None):
+        self.build_dir = build_dir
+        self.runtime = the_runtime
+        self.debug = debug or (lambda message: None)
+        if cc_template is None:
+            cc_template = ' '.join([shlex.quote(the_runtime.cc), '{cfile}']
+                                   + runtime.CFLAGS + ['-o', '{outfile}'])
+        self.cc_template = cc_template
+
+    def _find_modules(self, main_path):
+        # returns modules so that every module comes after the modules
+        # that it imports
+        result = []
+        done = set()
+        in_progress = []
+
+        def visit(path):
+            module = _Module(path)
+            in_progress.append(path)
+            for import_path, real_path in module.imports.items():
+                if real_path in in_progress:
+                    raise module.error(
+                        "importing '%s' creates an import cycle"
+                        % import_path, import_path)
+                if real_path in done:
+                    continue
+                if not os.path.isfile(real_path):
+                    raise module.error("cannot find '%s'" % import_path,
+                                       import_path)
+                visit(real_path)
+            in_progress.pop()
+            done.add(path)
+            result.append(module)
+
+        visit(os.path.abspath(main_path))
+        return result
+
+    def _files(self, module):
+        base = os.path.join(self.build_dir,
+                            module_prefix(module.path).rstrip('_'))
+        return (base + '.c', base + '.o', base + '.json')
+
+    def _compile_module(self, module, is_main, interfaces):
+        cfile, objfile, interface_file = self._files(module)
+
+        # a module's interface is all that other modules need, so
+        # changes to an imported module that don't change the interface
+        # don't cause recompiling
+        imported_interfaces = {
+            import_path: json.dumps(interfaces[real_path], sort_keys=True)
+            for import_path, real_path in module.imports.items()}
+        stamp = buildcache.hash_parts(
+            buildcache.compiler_fingerprint(), module.code, self.runtime.key,
+            self.cc_template, 'main' if is_main else 'module',
+            json.dumps(imported_interfaces, sort_keys=True))
+
+        try:
+            with open(interface_file, 'r') as file:
+                old = json.load(file)
+        except (OSError, ValueError):
+            old = None
+        if (old is not None and old['stamp'] == stamp
+                and os.path.isfile(objfile)):
+            self.debug("'%s' is up to date." % module.path)
+            return old['functions']
+
+        self.debug("Compiling '%s'..." % module.path)
+        nodes = module.nodes
+        checker_interfaces = {
+            import_path: _load_interface(interfaces[real_path])
+            for import_path, real_path in module.imports.items()}
+        try:
+            if not is_main and any(isinstance(node, ast.FunctionDef)
+                                   and node.name == 'main' for node in nodes):
+                raise CompileError(
+                    "only the file that is compiled can have a main() "
+                    "function", None)
+            checker.check(nodes, self._warn_callback(module),
+                          checker_interfaces, require_main=is_main)
+        except CompileError as e:
+            raise ModuleCompileError(module.path, module.code, e)
+
+        c_code = c_output.make_c_code(
+            nodes, module_prefix(module.path),
+            {import_path: module_prefix(real_path)
+             for import_path, real_path in module.imports.items()})
+        with open(cfile, 'w') as file:
+            file.write(c_code)
+        self._run(self.runtime.object_command(self.cc_template, cfile,
+                                              objfile))
+
+        functions = _make_interface(nodes)
+        with open(interface_file, 'w') as file:
+            json.dump({'stamp': stamp, 'functions': functions}, file)
+        return functions
+
+    def _warn_callback(self, module):
+        def callback(warning):
+            print(compiler.show_error(
+                warning, module.path, module.code, 'warning'),
+                file=sys.stderr)
+        return callback
+
+    def _run(self, command):
+        result = subprocess.run(command, stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT)
+        if result.returncode != 0:
+            raise ModuleBuildError("%s failed with status %d:\n%s" % (
+                ' '.join(command), result.returncode,
+                result.stdout.decode('utf-8', errors='replace')))
+
+    def build(self, main_path, outfile):
+        """Compile the modules that need compiling and link *outfile*."""
+        os.makedirs(self.build_dir, exist_ok=True)
+        modules = self._find_modules(main_path)
+
+        interfaces = {}     # {absolute path: interface dict}
+        for module in modules:
+            interfaces[module.path] = self._compile_module(
+                module, module is modules[-1], interfaces)
+
+        self.debug("Linking...")
+        self._run(self.runtime.link_command(
+            self.cc_template, [self._files(module)[1] for module in modules],
+            outfile))
@@ -0,0 +1,210 @@
+"""Cache checked AST nodes on disk.
+
+When only the C compiler options change, or when only the warnings and
+errors are needed, the same code is tokenized, parsed and checked again.
+This module saves the checked nodes and the warnings or the error of a
+file with :mod:`marshal`, so loading them is much faster than checking
+the code again. Unlike :mod:`pickle`, loading marshal data never creates
+objects of arbitrary classes, and only AST nodes and
+:class:`weirdc.checker.FunctionType` objects are created from the data.
+
+The cache keys are hashes of the code and the source code of weirdc, so
+changing weirdc invalidates everything.
+"""
+
+import marshal
+import os
+import sys
+import tempfile
+
+from weirdc import CompileError, Location, ast, buildcache, checker
+
+DEFAULT_MAX_SIZE = 100 * 1024 * 1024    # 100 MiB
+
+# the fields of each node class are saved like ast.NODE_FIELDS says,
+# and 'functype' is a checker.FunctionType or None
+_FIELDS = dict(ast.NODE_FIELDS)
+_FIELDS[ast.Import] = ast.NODE_FIELDS[ast.Import] + [('functype', 'functype')]
+
+# a node is saved as a tuple of an index of this, the location's start,
+# end and lineno, and the fields
+_NODE_CLASSES = tuple(_FIELDS)
+_CLASS_CODES = {node_class: code
+                for code, node_class in enumerate(_NODE_CLASSES)}
+
+
+def _dump_node(node):
+    if node is None:
+        return None
+
+    location = node.location
+    result = [_CLASS_CODES[type(node)], location.start, location.end,
+              location.lineno]
+    for name, how in _FIELDS[type(node)]:
+        value = getattr(node, name)
+        if how == 'string':
+            result.append(value)
+        elif how == 'node':
+            result.append(_dump_node(value))
+        elif how == 'nodes':
+            result.append(list(map(_dump_node, value)))
+        elif how == 'pairs':
+            result.append([(_dump_node(first), _dump_node(second))
+                           for first, second in value])
+        else:
+            assert how == 'functype'
+            result.append(None if value is None else (
+                value.name, [argtype.name for argtype in value.argtypes],
+                None if value.returntype is None else value.returntype.name))
+    return tuple(result)
+
+
+def _load_functype(value):
+    if value is None:
+        return None
+    name, argtype_names, returntype_name = value
+    return checker.FunctionType(
+        name, [checker.TYPES[argtype] for argtype in argtype_names],
+        None if returntype_name is None else checker.TYPES[returntype_name])
+
+
+def _make_loader(node_class):
+    # returns a function that creates a node from what _dump_node()
+    # returned, this is a lot faster than checking what each value is
+    field_loaders = []
+    for name, how in _FIELDS[node_class]:
+        if how == 'string':
+            field_loaders.append(None)
+        elif how == 'node':
+            field_loaders.append(_load_node)
+        elif how == 'nodes':
+            field_loaders.append(
+                lambda nodes: list(map(_load_node, nodes)))
+        elif how == 'pairs':
+            field_loaders.append(lambda pairs: [
+                (_load_node(first), _load_node(second))
+                for first, second in pairs])
+        else:
+            assert how == 'functype'
+            field_loaders.append(_load_functype)
+
+    names = [name for name, how in _FIELDS[node_class]]
+    slots = ('location',) + tuple(names)
+    assert set(slots) == set(node_class.__slots__)
+    new_location = tuple.__new__
+
+    def load(data):
+        # not using __init__ because it doesn't take the functype of
+        # Import nodes
+        node = object.__new__(node_class)
+        node.location = new_location(Location, data[1:4])
+        for name, loader, value in zip(names, field_loaders, data[4:]):
+            setattr(node, name, value if loader is None else loader(value))
+        return node
+
+    return load
+
+
+def _load_node(data):
+    if data is None:
+        return None
+    return _LOADERS[data[0]](data)
+
+
+_LOADERS = tuple(map(_make_loader, _NODE_CLASSES))
+
+
+def _dump_location(location):
+    return None if location is None else tuple(location)
+
+
+def _load_location(location):
+    return None if location is None else Location(*location)
+
+
+def _dump_error(error):
+    return (error.message, _dump_location(error.location))
+
+
+def _load_error(dumped):
+    message, location = dumped
+    return CompileError(message, _load_location(location))
+
+
+def cache_key(code):
+    """Return the key that checked nodes of *code* are cached with.
+
+    The Python version is included because marshal's format can change
+    between Python versions.
+    """
+    return buildcache.hash_parts(buildcache.compiler_fingerprint(),
+                                 sys.version, code, 'nodes')
+
+
+class NodeCache:
+    """A directory of checked AST nodes.
+
+    Least recently used files are deleted when the total size of the
+    files gets bigger than *max_size* bytes.
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self._files = buildcache.BuildCache(directory, max_size)
+
+    def load(self, code, warn_callback):
+        """Return checked nodes of code, or None if they aren't cached.
+
+        *warn_callback* is called with each cached warning. If the code
+        contains an error, the error is raised after the warnings like
+        :func:`weirdc.checker.check` would raise it.
+        """
+        key = cache_key(code)
+        path = self._files.find(key)
+        if path is None:
+            return None
+
+        try:
+            with open(path, 'rb') as file:
+                saved_key, nodes, warnings, error = marshal.load(file)
+            if saved_key != key:
+                return None
+            nodes = list(map(_load_node, nodes))
+            warnings = list(map(_load_error, warnings))
+            error = None if error is None else _load_error(error)
+        except (OSError, EOFError, ValueError, TypeError, KeyError,
+                IndexError):
+            # the file is broken, so it will be overwritten later
+            return None
+
+        for warning in warnings:
+            warn_callback(warning)
+        if error is not None:
+            raise error
+        return nodes
+
+    def store(self, code, nodes, warnings, error=None):
+        """Save checked nodes, warnings and an error of code.
+
+        *error* should be the CompileError that tokenizing, parsing or
+        checking raised, or None if there were no errors.
+        """
+        key = cache_key(code)
+        data = marshal.dumps((
+            key,
+            list(map(_dump_node, nodes)),
+            list(map(_dump_error, warnings)),
+            None if error is None else _dump_error(error),
+        ))
+
+        directory = self._files.directory
+        os.makedirs(directory, exist_ok=True)
+        # other weirdc processes must not see half-written files
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(temp_path, os.path.join(directory, key))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self._files.evict()
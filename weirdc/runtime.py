@@ -0,0 +1,214 @@
+"""Build the C runtime that compiled programs are linked with.
+
+The runtime is the C code in the ``objects`` directory. It's compiled
+into a ``libweird.a`` static library and a precompiled ``weird.h``
+header that includes all runtime headers. Both go to a directory named
+by a hash of the runtime's source code, so editing the runtime gives a
+new directory instead of stale object files.
+"""
+
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import tempfile
+
+from weirdc import buildcache
+
+
+OBJECTS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'objects')
+SOURCES = ['object.c', 'list.c', 'integer.c', 'string.c', 'bool.c', 'vm.c']
+HEADERS = ['object.h', 'list.h', 'integer.h', 'string.h', 'bool.h', 'vm.h']
+
+# the main() of the bytecode VM, see weirdc/bytecode.py
+VM_SOURCE = os.path.join(os.path.dirname(OBJECTS_DIR), 'weirdvm.c')
+
+# the generated C code includes only this, and it's precompiled
+UMBRELLA_HEADER = 'weird.h'
+_UMBRELLA_CONTENT = ''.join(
+    ['#include <stdio.h>\n', '#include <string.h>\n', '#include <stdlib.h>\n']
+    + ['#include "%s"\n' % header for header in HEADERS])
+
+CFLAGS = ['-std=c99']
+
+# -flto makes the runtime functions inlinable into the generated code
+RELEASE_CFLAGS = ['-O2', '-flto=auto']
+
+# shared objects can contain only position-independent code
+SHARED_CFLAGS = ['-fPIC']
+
+
+class RuntimeBuildError(Exception):
+    """Raised when the C compiler fails to compile the runtime."""
+
+
+def _find_ar(cc):
+    # archives of -flto object files need an index of the symbols in
+    # the LTO bytecode, and gcc-ar knows how to make that
+    compiler_ar = shutil.which(cc + '-ar')
+    return 'ar' if compiler_ar is None else compiler_ar
+
+
+def reads_stdin(cc):
+    """Check if a C compiler can read C code from stdin with ``-x c -``.
+
+    This is True for gcc and clang. Other compilers need a file.
+    """
+    return re.fullmatch(r'(gcc|clang|cc)(-[0-9.]+)?',
+                        os.path.basename(cc)) is not None
+
+
+class Runtime:
+    """A compiled runtime in a subdirectory of *cache_dir*.
+
+    The *cc* should be the C compiler program, e.g. ``'gcc'``. If
+    *release* is True, the runtime is optimized and compiled with
+    :data:`RELEASE_CFLAGS`, and programs that are linked with it should
+    be compiled with the same flags. If *shared* is True, the runtime
+    can be linked into shared objects. The runtime isn't compiled until
+    :meth:`build` is called.
+    """
+
+    def __init__(self, cache_dir, cc='gcc', *, release=False, shared=False):
+        self.cc = cc
+        self.release = release
+        self.cflags = (CFLAGS + (RELEASE_CFLAGS if release else [])
+                       + (SHARED_CFLAGS if shared else []))
+        self.key = buildcache.hash_parts(
+            buildcache.hash_files(os.path.join(OBJECTS_DIR, filename)
+                                  for filename in SOURCES + HEADERS),
+            _UMBRELLA_CONTENT, ' '.join(self.cflags),
+            buildcache.cc_version(cc))
+        self.directory = os.path.join(cache_dir, 'runtime-' + self.key[:16])
+        self.library = os.path.join(self.directory, 'libweird.a')
+        self.vm = os.path.join(self.directory, 'weirdvm-' + (
+            buildcache.hash_files([VM_SOURCE])[:8]))
+
+    def is_built(self):
+        return os.path.isfile(self.library)
+
+    def _run(self, command, cwd):
+        result = subprocess.run(command, cwd=cwd, stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT)
+        if result.returncode != 0:
+            raise RuntimeBuildError(
+                "%s failed with status %d:\n%s" % (
+                    ' '.join(command), result.returncode,
+                    result.stdout.decode('utf-8', errors='replace')))
+
+    def build(self):
+        """Compile the runtime if it hasn't been compiled already."""
+        if self.is_built():
+            return
+
+        parent = os.path.dirname(self.directory)
+        os.makedirs(parent, exist_ok=True)
+        build_dir = tempfile.mkdtemp(dir=parent, prefix='.tmp-runtime-')
+        try:
+            for filename in SOURCES + HEADERS:
+                shutil.copy(os.path.join(OBJECTS_DIR, filename), build_dir)
+            with open(os.path.join(build_dir, UMBRELLA_HEADER), 'w') as file:
+                file.write(_UMBRELLA_CONTENT)
+
+            object_files = []
+            for filename in SOURCES:
+                object_file = filename[:-2] + '.o'
+                self._run([self.cc, '-c'] + self.cflags
+                          + [filename, '-o', object_file], build_dir)
+                object_files.append(object_file)
+            self._run([_find_ar(self.cc), 'rcs', 'libweird.a'] + object_files,
+                      build_dir)
+
+            # gcc uses weird.h.gch instead of weird.h when it can, and
+            # other compilers just ignore it
+            self._run([self.cc, '-x', 'c-header'] + self.cflags
+                      + [UMBRELLA_HEADER, '-o', UMBRELLA_HEADER + '.gch'],
+                      build_dir)
+
+            try:
+                os.rename(build_dir, self.directory)
+            except OSError:
+                # another weirdc process built the same runtime at the
+                # same time and it was faster
+                if not self.is_built():
+                    raise
+        finally:
+            if os.path.isdir(build_dir):
+                shutil.rmtree(build_dir)
+
+    def build_vm(self):
+        """Compile the bytecode VM executable if it isn't compiled yet.
+
+        This also builds the runtime. The VM executable goes to the
+        runtime's directory, and its path is :attr:`vm`.
+        """
+        self.build()
+        if os.path.isfile(self.vm):
+            return
+
+        temp_path = '%s.tmp%d' % (self.vm, os.getpid())
+        try:
+            self._run([self.cc] + self.cflags
+                      + ['-I' + os.path.dirname(OBJECTS_DIR), VM_SOURCE,
+                         self.library, '-o', temp_path], self.directory)
+            os.replace(temp_path, self.vm)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def compile_args(self, cfile):
+        """Return the arguments that replace *cfile* in a compile command.
+
+        The library must come after the C file because the linker only
+        takes things it needs from libraries that it has already seen.
+        If *cfile* is ``'-'``, the C code is read from stdin, see
+        :func:`reads_stdin`.
+        """
+        if cfile == '-':
+            # -x c applies to all files after it, so it must be turned
+            # off for the library
+            return ['-I' + self.directory, '-x', 'c', '-', '-x', 'none',
+                    self.library]
+        return ['-I' + self.directory, cfile, self.library]
+
+    def _command(self, cc_template, cfile_args, cfile, outfile, extra_flags):
+        cc_parts = shlex.split(cc_template)
+        command = [cc_parts.pop(0)]
+        if self.release:
+            command.extend(RELEASE_CFLAGS)
+
+        for part in cc_parts:
+            if part == "{cfile}":
+                command.extend(cfile_args)
+            else:
+                command.append(part.format(cfile=cfile, outfile=outfile))
+        command.extend(extra_flags)
+        return command
+
+    def compile_command(self, cc_template, cfile, outfile, extra_flags=()):
+        """Make a compile command from a ``--cc`` template string.
+
+        This returns a list of strings. Release flags go right after
+        the compiler so that flags in the template can override them.
+        """
+        return self._command(cc_template, self.compile_args(cfile), cfile,
+                             outfile, extra_flags)
+
+    def object_command(self, cc_template, cfile, objfile):
+        """Like :meth:`compile_command`, but compile to an object file.
+
+        The runtime library isn't used, see :meth:`link_command`.
+        """
+        return self._command(cc_template, ['-I' + self.directory, cfile],
+                             cfile, objfile, ['-c'])
+
+    def link_command(self, cc_template, objfiles, outfile):
+        """Make a command that links object files with the runtime.
+
+        The template is used like in :meth:`compile_command`, so flags
+        like ``-l`` work. ``{cfile}`` is replaced with the object files.
+        """
+        return self._command(cc_template, list(objfiles) + [self.library],
+                             objfiles[-1], outfile, ())
@@ -0,0 +1,212 @@
+"""A compile server that keeps weirdc imported between compiles.
+
+Run ``python3 -m weirdc serve`` to start the server. After that,
+``python3 -m weirdc`` sends the command-line arguments to the server
+instead of compiling in its own process. If the server isn't running,
+the compiling is done without it.
+
+The requests and responses are JSON, and the client shuts down its
+writing end of the socket after sending a request. The client's
+environment variables are used while compiling, except that
+``$WEIRDC_DEBUG`` is read only when weirdc is imported, so the client
+compiles in its own process if it has a different ``$WEIRDC_DEBUG``.
+Restart the server after updating weirdc because it doesn't notice the
+changes.
+"""
+
+import contextlib
+import io
+import json
+import os
+import socket
+import socketserver
+import struct
+import sys
+import traceback
+
+
+def default_socket_path():
+    """Return the path of the Unix socket that is used by default.
+
+    ``$WEIRDC_SOCKET`` can be used for choosing a different path.
+    """
+    if 'WEIRDC_SOCKET' in os.environ:
+        return os.environ['WEIRDC_SOCKET']
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir is None:
+        # tempfile is slow to import, and this runs every time
+        import tempfile
+        runtime_dir = tempfile.gettempdir()
+    return os.path.join(runtime_dir, 'weirdc-%d.sock' % os.getuid())
+
+
+def _receive_all(sock):
+    chunks = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return b''.join(chunks)
+        chunks.append(chunk)
+
+
+def _is_alive(socket_path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            return False
+        return True
+
+
+def send_request(argv, socket_path=None):
+    """Ask a server to compile with command-line arguments.
+
+    The server's output is written to sys.stdout and sys.stderr, and the
+    exit status is returned. None is returned if there's no server
+    running or the server can't compile with this process's environment.
+    """
+    if socket_path is None:
+        socket_path = default_socket_path()
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            # the socket doesn't exist or a server that crashed left it
+            # behind
+            return None
+
+        request = {'argv': argv, 'cwd': os.getcwd(),
+                   'env': dict(os.environ)}
+        sock.sendall(json.dumps(request).encode('utf-8'))
+        sock.shutdown(socket.SHUT_WR)
+        response = json.loads(_receive_all(sock).decode('utf-8'))
+    finally:
+        sock.close()
+
+    if response['status'] is None:
+        return None
+    sys.stdout.write(response['stdout'])
+    sys.stderr.write(response['stderr'])
+    return response['status']
+
+
+def handle_request(request):
+    """Compile in this process and return a response dictionary."""
+    from weirdc import utils
+    # this is imported here because weirdc.__main__ imports this module
+    from weirdc.__main__ import compile_main
+
+    if (request['env'].get('WEIRDC_DEBUG') == '1') != utils.DEBUG:
+        # the miniclasses were created when weirdc was imported
+        return {'status': None, 'stdout': '', 'stderr': ''}
+
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    old_cwd = os.getcwd()
+    old_environ = dict(os.environ)
+    try:
+        os.chdir(request['cwd'])
+        # e.g. $XDG_CACHE_HOME and the C compiler's variables
+        os.environ.clear()
+        os.environ.update(request['env'])
+        with contextlib.redirect_stdout(stdout), \
+                contextlib.redirect_stderr(stderr):
+            try:
+                compile_main(request['argv'])
+                status = 0
+            except SystemExit as e:
+                if e.code is None:
+                    status = 0
+                elif isinstance(e.code, int):
+                    status = e.code
+                else:
+                    print(e.code, file=sys.stderr)
+                    status = 1
+            except Exception:
+                # the client must get a response, and this is what
+                # python would print without the server
+                traceback.print_exc()
+                status = 1
+    finally:
+        os.chdir(old_cwd)
+        os.environ.clear()
+        os.environ.update(old_environ)
+
+    return {'status': status, 'stdout': stdout.getvalue(),
+            'stderr': stderr.getvalue()}
+
+
+def _peer_uid(sock):
+    # struct ucred from socket(7), this is None on systems that don't
+    # have SO_PEERCRED, and the socket's permissions are enough there
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return None
+    ucred = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                            struct.calcsize('iII'))
+    pid, uid, gid = struct.unpack('iII', ucred)
+    return uid
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        # other users must not be able to run commands as this user
+        uid = _peer_uid(self.request)
+        if uid is not None and uid != os.getuid():
+            return
+
+        data = _receive_all(self.request)
+        if not data:
+            # _is_alive() connected
+            return
+        request = json.loads(data.decode('utf-8'))
+        response = handle_request(request)
+        self.request.sendall(json.dumps(response).encode('utf-8'))
+
+
+# the requests are handled one at a time because compile_main() changes
+# the working directory, the environment, sys.stdout and sys.stderr
+class Server(socketserver.UnixStreamServer):
+    """A server that compiles in the process that it's running in."""
+
+    def __init__(self, socket_path):
+        # a server that crashed may have left the socket file behind
+        if os.path.exists(socket_path):
+            if _is_alive(socket_path):
+                raise OSError("a server is already running in '%s'"
+                              % socket_path)
+            os.remove(socket_path)
+        super().__init__(socket_path, _Handler)
+
+    def server_bind(self):
+        # the socket is created with the umask's permissions, and only
+        # this user may connect to it
+        old_umask = os.umask(0o077)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(old_umask)
+
+    def server_close(self):
+        super().server_close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.server_address)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='weirdc serve')
+    parser.add_argument(
+        '--socket', default=default_socket_path(),
+        help="path of the Unix socket, defaults to '%(default)s'")
+    args = parser.parse_args(argv)
+
+    with Server(args.socket) as server:
+        print("Listening on '%s'..." % args.socket)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
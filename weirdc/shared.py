@@ -0,0 +1,74 @@
+"""Run programs in the compiler's process without making executables.
+
+The generated C code and the runtime are linked into a shared object
+that is loaded with :mod:`ctypes`, and the program's ``main()`` is
+called directly. The shared objects are cached, so running an
+unchanged program again doesn't need a C compiler at all.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import subprocess
+import sys
+import tempfile
+
+from weirdc import buildcache, runtime
+
+# main is renamed so that it doesn't get mixed up with the main of the
+# python executable
+ENTRY_POINT = 'weirdc_entry_point'
+
+
+class SharedBuildError(Exception):
+    """Raised when the C compiler fails."""
+
+
+def shared_cache(cache_dir):
+    """Return the :class:`weirdc.buildcache.BuildCache` for shared objects."""
+    return buildcache.BuildCache(os.path.join(cache_dir, 'shared'))
+
+
+def build(c_code, the_runtime, cc_template, cache, key):
+    """Compile C code into a shared object in the cache and return its path.
+
+    *the_runtime* must be a built :class:`weirdc.runtime.Runtime` that was
+    created with ``shared=True``, and *cc_template* is a ``--cc`` template
+    like in :meth:`weirdc.runtime.Runtime.compile_command`.
+    """
+    with tempfile.TemporaryDirectory() as tempdir:
+        cfile = os.path.join(tempdir, 'program.c')
+        sofile = os.path.join(tempdir, 'program.so')
+        with open(cfile, 'w') as file:
+            file.write(c_code)
+
+        command = the_runtime.compile_command(
+            cc_template, cfile, sofile,
+            runtime.SHARED_CFLAGS + ['-shared', '-Dmain=' + ENTRY_POINT])
+        result = subprocess.run(command, stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT)
+        if result.returncode != 0:
+            raise SharedBuildError("%s failed with status %d:\n%s" % (
+                ' '.join(command), result.returncode,
+                result.stdout.decode('utf-8', errors='replace')))
+        cache.store(key, sofile)
+    return cache.find(key)
+
+
+def run(path):
+    """Load a shared object, run its main and return the exit status."""
+    library = ctypes.CDLL(os.path.abspath(path))
+    entry_point = getattr(library, ENTRY_POINT)
+    entry_point.restype = ctypes.c_int
+    entry_point.argtypes = []
+
+    # the program's output must not end up between things that python
+    # has buffered
+    sys.stdout.flush()
+    sys.stderr.flush()
+    try:
+        return entry_point()
+    finally:
+        # printf() output is buffered in the C library
+        libc = ctypes.CDLL(ctypes.util.find_library('c'))
+        libc.fflush(None)
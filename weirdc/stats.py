@@ -0,0 +1,112 @@
+"""Measure how long each part of compiling takes and how much memory
+it needs.
+
+This is used by the ``--time-passes``, ``--stats`` and ``--stats-json``
+options. Memory usage of Python code is measured with
+:mod:`tracemalloc`, which makes the compiler slower while it's
+measuring, and memory usage of the C compiler is the maximum resident
+set size that the operating system reports for child processes.
+"""
+
+import contextlib
+import json
+import resource
+import time
+import tracemalloc
+
+from weirdc import ast, buildcache
+
+
+def count_nodes(nodes):
+    """Return the number of AST nodes in a list, including nested nodes."""
+    result = 0
+    to_visit = list(nodes)
+    while to_visit:
+        value = to_visit.pop()
+        if isinstance(value, (list, tuple)):
+            to_visit.extend(value)
+        elif type(value).__module__ == ast.__name__:
+            result += 1
+            to_visit.extend(getattr(value, name)
+                            for name in type(value).__slots__)
+    return result
+
+
+class Stats:
+    """Phase times, peak memory usages and counts of a compile.
+
+    :attr:`phases` is a list of ``(name, seconds, peak_memory)`` tuples
+    where *peak_memory* is in bytes, and :attr:`counts` is a dictionary
+    of things like ``'tokens'`` and ``'functions'``. The peak memory of
+    a Python phase includes only memory allocated during that phase.
+    """
+
+    def __init__(self):
+        self.phases = []
+        self.counts = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Measure the Python code in a ``with`` block."""
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        else:
+            tracemalloc.reset_peak()
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            current, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+            self.phases.append((name, elapsed, peak))
+
+    @contextlib.contextmanager
+    def subprocess_phase(self, name):
+        """Measure a child process that runs in a ``with`` block.
+
+        The operating system only knows the peak memory usage of the
+        biggest child process so far, so this is accurate only if the
+        process is bigger than the previous ones.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            # ru_maxrss is in kilobytes on Linux
+            peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+            self.phases.append((name, elapsed, peak * 1024))
+
+    def format_phases(self):
+        """Return a human-readable table of the phases as a string."""
+        lines = ['%-20s %10s %14s' % ('phase', 'time', 'peak memory')]
+        for name, seconds, peak in self.phases:
+            lines.append('%-20s %9.4fs %11.1f KiB' % (
+                name, seconds, peak / 1024))
+        lines.append('%-20s %9.4fs' % (
+            'total', sum(seconds for name, seconds, peak in self.phases)))
+        return '\n'.join(lines)
+
+    def format_counts(self):
+        """Return a human-readable list of the counts as a string."""
+        return '\n'.join('%-20s %10d' % (name.replace('_', ' '), value)
+                         for name, value in sorted(self.counts.items()))
+
+    def to_json(self):
+        """Return everything as a JSON string.
+
+        The weirdc source code hash is included, so results from
+        different versions of weirdc can be told apart.
+        """
+        return json.dumps({
+            'weirdc': buildcache.compiler_fingerprint(),
+            'phases': [{'name': name, 'seconds': seconds,
+                        'peak_memory': peak}
+                       for name, seconds, peak in self.phases],
+            'counts': self.counts,
+        }, indent=2, sort_keys=True)
+
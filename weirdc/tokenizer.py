@@ -1,7 +1,13 @@
+import array
+import bisect
+import codecs
 import collections
+import itertools
+import mmap
 import re
 
 import weirdc
+from weirdc import bracechecker
 
 
 # TODO:
@@ -15,7 +21,7 @@ TOKEN_SPEC = [
     ('NAME', r'[^\W\d]\w*'),               # message123
     ('STRING', r'"[^"\n]*"'),              # "hello world"
     ('NEWLINE', r'\n'),                    # a \n character
-    ('IGNORE', r'\s+|//[^\n]*|/\*.*\*/'),  # whitespace and comments
+    ('IGNORE', r'\s+|//[^\n]*|/\*.*?\*/'), # whitespace and comments
     ('ERROR', r'.'),                       # anything else
 ]
 TOKEN_REGEX = re.compile(
@@ -43,54 +49,442 @@ class Token(collections.namedtuple('Token', 'kind value location')):
         return all(a == b for a, b in zip(self, other))
 
 
-def tokenize(code, trailing_newline=True):
+def tokenize(code, trailing_newline=True, check_braces=False):
     r"""Turn a string into an iterator of Token objects.
 
     If trailing_newline is True, a NEWLINE token will be added at the
     end if the code doesn't end with a \n.
+
+    If check_braces is True, the tokens are also checked like with
+    :func:`weirdc.bracechecker.check`, so the tokens don't need to be
+    put to a list for checking them before parsing. Brace errors are
+    raised when the tokenizer gets to them.
     """
-    lineno = 1
-    line_start = 0
+    braces = bracechecker.BraceChecker() if check_braces else None
+    # tokens are found by offsets, and the index turns them into line
+    # numbers and columns with tabs expanded, see CompileError
+    lines = weirdc.LineIndex(code)
 
-    # expanding tabs here means that they will also be expanded in
-    # string literals, but it makes some things easier, see
-    # implementation of CompileError
-    for match in TOKEN_REGEX.finditer(code.expandtabs(4)):
+    kind = None
+    for match in TOKEN_REGEX.finditer(code):
         kind = match.lastgroup
-        value = match.group(kind)
-
-        # change this if you add multiline strings or something
-        if kind == 'NEWLINE':
-            # this needs to be handled specially because -1 is not a
-            # valid line start, but the location's end can extend past
-            # the real end of the line and will extend by 3 characters
-            start = match.start() - line_start
-            yield Token('NEWLINE', '\n',
-                        weirdc.Location(start, start+3, lineno))
-
-            lineno += 1
-            line_start = match.end()
-            continue
-
         if kind == 'IGNORE':
-            if '\n' in value:
-                lineno += value.count('\n')
-                # match.start() is where the start of the ignored value
-                # is in the code, and value.rindex('\n')+1 is where the
-                # last newline is in the value so line_start will be end
-                # of that last newline, or beginning of the next line
-                line_start = match.start() + value.rindex('\n') + 1
             continue
 
-        start = match.start() - line_start
-        end = match.end() - line_start
-        location = weirdc.Location(start, end, lineno)
+        start = match.start()
+        if kind == 'NEWLINE':
+            # the location's end can extend past the real end of the
+            # line and will extend by 3 characters
+            yield Token('NEWLINE', '\n', lines.location(start, start+3))
+            continue
 
+        location = lines.location(start, match.end())
         if kind == 'ERROR':
             raise weirdc.CompileError("I don't know what this is", location)
-        yield Token(kind, value, location)
+        token = Token(kind, match.group(kind), location)
+        if kind == 'OP' and braces is not None:
+            braces.feed(token)
+        yield token
+
+    if braces is not None:
+        braces.finish()
+    if kind != 'NEWLINE' and trailing_newline:
+        yield Token('NEWLINE', '\n', weirdc.Location(0, 3, len(lines)+1))
+
+
+# tokenize_chunks() and friends read this many characters or bytes at a
+# time by default
+CHUNK_SIZE = 64 * 1024
+
+
+def _advance(lineno, column, text):
+    # returns line number and column after text, with tabs expanded
+    newline = text.rfind('\n')
+    if newline != -1:
+        lineno += text.count('\n')
+        column = 0
+        text = text[newline+1:]
+    if '\t' not in text:
+        return (lineno, column + len(text))
+
+    *before_tabs, after_last_tab = text.split('\t')
+    for part in before_tabs:
+        column = (column + len(part)) // 4 * 4 + 4
+    return (lineno, column + len(after_last_tab))
+
+
+def tokenize_chunks(chunks, trailing_newline=True, check_braces=False):
+    r"""Like :func:`tokenize`, but the code comes in pieces.
+
+    *chunks* should be an iterable of strings, and the code is the
+    strings joined together. Tokens and comments can be split between
+    the chunks in any way. Only the part of the code that hasn't been
+    tokenized yet is kept in memory, so this works with files that are
+    too big to read at once; see :func:`tokenize_path`.
+
+    >>> [token.value for token in tokenize_chunks(['a /* b \n', 'c */ d'])]
+    ['a', 'd', '\n']
+
+    *check_braces* works like in :func:`tokenize`.
+    """
+    braces = bracechecker.BraceChecker() if check_braces else None
+    lineno = 1
+    column = 0
+    buffer = ''
+    comment_location = None     # location of a /* that isn't closed yet
+    kind = None
 
-    # i like how i get to (ab)use loop variables that aren't local to
-    # the loop... feels good
+    # None means end of the code
+    for chunk in itertools.chain(chunks, [None]):
+        at_end = (chunk is None)
+        if not at_end:
+            buffer += chunk
+        pos = 0
+
+        while pos < len(buffer):
+            if comment_location is not None:
+                end = buffer.find('*/', pos)
+                if end == -1:
+                    # the comment can be huge, so it's not kept in
+                    # memory, except a '*' that may be a part of '*/'
+                    keep = 1 if buffer.endswith('*') else 0
+                    lineno, column = _advance(
+                        lineno, column, buffer[pos:len(buffer)-keep])
+                    pos = len(buffer) - keep
+                    break
+
+                lineno, column = _advance(lineno, column, buffer[pos:end+2])
+                pos = end + 2
+                comment_location = None
+                kind = 'IGNORE'
+                continue
+
+            match = TOKEN_REGEX.match(buffer, pos)
+            if match.end() == len(buffer) and not at_end:
+                # this token may continue in the next chunk
+                break
+
+            kind = match.lastgroup
+            value = match.group(kind)
+            if kind == 'ERROR':
+                location = weirdc.Location(column, column+1, lineno)
+                if buffer.startswith('/*', pos) and not at_end:
+                    comment_location = location
+                    column += 2
+                    pos += 2
+                    continue
+                if (value == '"' and not at_end and
+                        buffer.find('\n', pos) == -1):
+                    # the rest of the string is in the next chunk
+                    break
+                raise weirdc.CompileError("I don't know what this is",
+                                          location)
+
+            if kind == 'NEWLINE':
+                yield Token('NEWLINE', '\n',
+                            weirdc.Location(column, column+3, lineno))
+                lineno += 1
+                column = 0
+            elif kind == 'IGNORE':
+                lineno, column = _advance(lineno, column, value)
+            else:
+                # tokens are never split between lines
+                start = column
+                lineno, column = _advance(lineno, column, value)
+                token = Token(kind, value,
+                              weirdc.Location(start, column, lineno))
+                if kind == 'OP' and braces is not None:
+                    braces.feed(token)
+                yield token
+            pos = match.end()
+
+        buffer = buffer[pos:]
+
+    if comment_location is not None:
+        # just like the '/' in tokenize()
+        raise weirdc.CompileError("I don't know what this is",
+                                  comment_location)
+    if braces is not None:
+        braces.finish()
     if kind != 'NEWLINE' and trailing_newline:
         yield Token('NEWLINE', '\n', weirdc.Location(0, 3, lineno+1))
+
+
+def read_chunks(file, chunk_size=CHUNK_SIZE):
+    """Read a file object in chunks for :func:`tokenize_chunks`.
+
+    The file can be opened in text mode or binary mode. Binary files
+    and other bytes-like data are decoded as UTF-8.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, str):
+            yield chunk
+        else:
+            yield decoder.decode(chunk)
+    # raises an error if the file ends in the middle of a character
+    decoder.decode(b'', final=True)
+
+
+def tokenize_path(path, trailing_newline=True, chunk_size=CHUNK_SIZE):
+    """Tokenize a file without reading all of it into memory at once.
+
+    The file is memory-mapped and tokenized with :func:`tokenize_chunks`.
+    """
+    with open(path, 'rb') as file:
+        if file.seek(0, 2) == 0:
+            # empty files can't be mapped
+            yield from tokenize_chunks([], trailing_newline)
+            return
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield from tokenize_chunks(read_chunks(data, chunk_size),
+                                       trailing_newline)
+
+
+# kinds of tokens in CompactTokens, the codes are indexes of this
+KINDS = ('INTEGER', 'OP', 'NAME', 'STRING', 'NEWLINE')
+_KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+
+class TokenView:
+    """A token in :class:`CompactTokens`.
+
+    This has the same attributes as :class:`Token`, but the location is
+    created only when it's needed.
+    """
+
+    __slots__ = ('kind', 'value', '_tokens', '_index')
+
+    def __init__(self, tokens, index):
+        # the parser looks at kinds and values all the time, so
+        # properties would be slow
+        self.kind = KINDS[tokens.kinds[index]]
+        self.value = tokens.strings[tokens.values[index]]
+        self._tokens = tokens
+        self._index = index
+
+    @property
+    def location(self):
+        return self._tokens.location(self._index)
+
+    def startswith(self, other):
+        """Like :meth:`Token.startswith`."""
+        # this is called a lot by the parser, so this avoids creating
+        # the location and other things that aren't needed
+        if len(other) > 3:
+            return False
+        if len(other) >= 1 and self.kind != other[0]:
+            return False
+        if len(other) >= 2 and self.value != other[1]:
+            return False
+        return len(other) < 3 or self.location == other[2]
+
+    def to_token(self):
+        """Create a :class:`Token` of this token."""
+        return Token(self.kind, self.value, self.location)
+
+
+class CompactTokens:
+    r"""Tokens of code in a few arrays instead of a Token per token.
+
+    The tokens are like from :func:`tokenize`, but they use much less
+    memory. *kinds* contains indexes of :data:`KINDS`, *starts* and
+    *ends* are offsets in the code, *values* contains indexes of
+    *strings* so that each value is stored only once, and *lines* is a
+    :class:`weirdc.LineIndex` of the code. Locations are calculated
+    only when they are needed.
+
+    Iterating over this gives :class:`TokenView` objects, and
+    :func:`weirdc.ast.parse` accepts this instead of Token objects. If
+    the code contains something that isn't a valid token, the error is
+    raised when the iteration gets there, just like with
+    :func:`tokenize`.
+    """
+
+    def __init__(self, code, trailing_newline=True):
+        self.kinds = array.array('B')
+        self.starts = array.array('I')
+        self.ends = array.array('I')
+        self.values = array.array('I')
+        self.strings = []
+        self.lines = weirdc.LineIndex(code)
+        self.trailing_newline = trailing_newline
+        self.error = None
+
+        # edit() uses these
+        self._string_indexes = {}
+        self._error_span = None
+
+        #: How many tokens were tokenized when this was created. This is
+        #: less than ``len(self)`` if this was created with :meth:`edit`.
+        self.relexed = 0
+
+        self._lex(0)
+        self._add_trailing_newline()
+        self._compact_at = 2*len(self.strings) + 64
+
+    def _lex(self, pos, old=None, delta=0, resync_start=None):
+        # tokenizes the code starting at pos, and returns None or index
+        # of a token in old where the code is the same as before editing
+        code = self.lines.code
+        for match in TOKEN_REGEX.finditer(code, pos):
+            kind = match.lastgroup
+            if kind == 'IGNORE':
+                continue
+
+            if kind == 'ERROR':
+                self._set_error(match.start(), match.end())
+                return None
+
+            start = match.start()
+            if old is not None and start >= resync_start:
+                # the tokenizer doesn't remember anything between tokens,
+                # so if a token starts where a token started before the
+                # edit, everything after that is also like before
+                index = bisect.bisect_left(old.starts, start - delta, 0,
+                                           old._real_length())
+                if (index < old._real_length() and
+                        old.starts[index] == start - delta):
+                    return index
+
+            # NEWLINE locations extend past the end of the line, see
+            # tokenize()
+            self._append(kind, match.group(kind), start,
+                         start + 3 if kind == 'NEWLINE' else match.end())
+            self.relexed += 1
+        return None
+
+    def _set_error(self, start, end):
+        self._error_span = (start, end)
+        self.error = weirdc.CompileError(
+            "I don't know what this is", self.lines.location(start, end))
+
+    def _real_length(self):
+        # number of tokens without the trailing newline from __init__
+        if self.kinds and self.starts[-1] > len(self.lines.code):
+            return len(self.kinds) - 1
+        return len(self.kinds)
+
+    def _add_trailing_newline(self):
+        if self.error is not None or not self.trailing_newline:
+            return
+
+        code = self.lines.code
+        if (self.kinds and self.kinds[-1] == _KIND_CODES['NEWLINE'] and
+                self.starts[-1] == len(code) - 1):
+            # the code ends with a NEWLINE token
+            return
+
+        # this is on a line after the last line, see location()
+        self._append('NEWLINE', '\n', len(code) + 1, len(code) + 4)
+
+    def _token_end(self, index):
+        # NEWLINE tokens are really 1 character long
+        if self.kinds[index] == _KIND_CODES['NEWLINE']:
+            return self.starts[index] + 1
+        return self.ends[index]
+
+    def edit(self, offset, removed_length, inserted_text):
+        """Return new CompactTokens for the code after an edit.
+
+        The edit replaces *removed_length* characters starting at
+        *offset* with *inserted_text*. Only the tokens near the edit are
+        tokenized again, and the others are taken from *self* with their
+        offsets shifted. This object isn't changed.
+        """
+        old_code = self.lines.code
+        assert 0 <= offset <= offset + removed_length <= len(old_code)
+        code = (old_code[:offset] + inserted_text +
+                old_code[offset+removed_length:])
+        delta = len(inserted_text) - removed_length
+
+        # a token that ends before the offset can't change, but it can
+        # continue if it ends right at the offset, e.g. 'ab' + 'c'
+        keep = bisect.bisect_left(self.starts, offset, 0, self._real_length())
+        while keep > 0 and self._token_end(keep - 1) >= offset:
+            keep -= 1
+
+        result = CompactTokens.__new__(CompactTokens)
+        result.kinds = self.kinds[:keep]
+        result.starts = self.starts[:keep]
+        result.ends = self.ends[:keep]
+        result.values = self.values[:keep]
+        # new strings are appended, so the old indexes stay valid
+        result.strings = self.strings.copy()
+        result._string_indexes = self._string_indexes.copy()
+        result._compact_at = self._compact_at
+        result.lines = weirdc.LineIndex(code)
+        result.trailing_newline = self.trailing_newline
+        result.error = None
+        result._error_span = None
+        result.relexed = 0
+
+        pos = 0 if keep == 0 else self._token_end(keep - 1)
+        resync = result._lex(pos, self, delta, offset + len(inserted_text))
+        if resync is not None:
+            end = self._real_length()
+            result.kinds.extend(self.kinds[resync:end])
+            result.values.extend(self.values[resync:end])
+            result.starts.extend(offset + delta
+                                 for offset in self.starts[resync:end])
+            result.ends.extend(offset + delta
+                               for offset in self.ends[resync:end])
+            if self._error_span is not None:
+                error_start, error_end = self._error_span
+                result._set_error(error_start + delta, error_end + delta)
+
+        result._add_trailing_newline()
+
+        # strings of tokens that were removed would stay forever, e.g.
+        # every prefix of a name that is typed in an editor
+        if len(result.strings) > result._compact_at:
+            result._compact_strings()
+        return result
+
+    def _compact_strings(self):
+        used = sorted(set(self.values))
+        new_indexes = {old: new for new, old in enumerate(used)}
+        self.values = array.array('I', map(new_indexes.__getitem__,
+                                           self.values))
+        self.strings = [self.strings[index] for index in used]
+        self._string_indexes = {
+            string: index for index, string in enumerate(self.strings)}
+        self._compact_at = 2*len(self.strings) + 64
+
+    def _append(self, kind, value, start, end):
+        try:
+            value_index = self._string_indexes[value]
+        except KeyError:
+            value_index = self._string_indexes[value] = len(self.strings)
+            self.strings.append(value)
+
+        self.kinds.append(_KIND_CODES[kind])
+        self.starts.append(start)
+        self.ends.append(end)
+        self.values.append(value_index)
+
+    def location(self, index):
+        """Create a Location of the token at an index."""
+        start = self.starts[index]
+        if start > len(self.lines.code):
+            # the trailing newline added by __init__
+            return weirdc.Location(0, 3, len(self.lines) + 1)
+        return self.lines.location(start, self.ends[index])
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        if not 0 <= index < len(self.kinds):
+            raise IndexError(index)
+        return TokenView(self, index)
+
+    def __iter__(self):
+        for index in range(len(self.kinds)):
+            yield TokenView(self, index)
+        if self.error is not None:
+            raise self.error
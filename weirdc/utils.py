@@ -1,4 +1,5 @@
 import collections
+import os
 import string as string_module
 
 
@@ -9,11 +10,93 @@ def add_article(string):
     return article + ' ' + string
 
 
-def miniclass(modulename, name, fields, *, inherit=object, default_attrs=None):
+# WEIRDC_DEBUG=1 makes miniclasses check their arguments with asserts,
+# which is slow but gives better error messages
+DEBUG = (os.environ.get('WEIRDC_DEBUG') == '1')
+
+
+def _debug_methods(all_fields, default_attrs):
+    # these are easy to read and they check everything, but they are
+    # too slow for the millions of nodes of a big program
+    def dunder_init(self, *args, **kwargs):
+        assert len(args) == len(all_fields)
+        assert set(kwargs.keys()).issubset(default_attrs.keys())
+
+        for name, value in zip(all_fields, args):
+            setattr(self, name, value)
+        for name, value in collections.ChainMap(kwargs, default_attrs).items():
+            # [] as a default value sucks as we all know
+            # TODO: handle e.g. dicts later if needed
+            if isinstance(value, list):
+                value = value.copy()
+            setattr(self, name, value)
+
+    def dunder_eq(self, other):
+        if not isinstance(other, type(self)):
+            return NotImplemented
+
+        for name in all_fields:
+            if getattr(self, name) != getattr(other, name):
+                return False
+        return True
+
+    return (dunder_init, dunder_eq)
+
+
+def _generated_methods(all_fields, default_attrs):
+    # like namedtuple and dataclasses, this creates source code of
+    # methods for the fields and exec()s it, e.g. for a class with
+    # fields 'value' and 'name' and default_attrs={'used_by': []}:
+    #
+    #   def __init__(self, value, name, *, used_by=_default_used_by):
+    #       self.value = value
+    #       self.name = name
+    #       self.used_by = used_by.copy() if isinstance(used_by, list) \
+    #                      else used_by
+    #
+    #   def __eq__(self, other):
+    #       if not isinstance(other, type(self)):
+    #           return NotImplemented
+    #       return self.value == other.value and self.name == other.name
+    for name in all_fields + tuple(default_attrs):
+        assert name.isidentifier() and not name.startswith('_'), name
+
+    args = ['self'] + list(all_fields)
+    if default_attrs:
+        args.append('*')
+        args.extend('%s=_default_%s' % (name, name) for name in default_attrs)
+    init_lines = ['def __init__(%s):' % ', '.join(args)]
+    init_lines.extend('    self.%s = %s' % (name, name) for name in all_fields)
+    # [] as a default value sucks as we all know
+    # TODO: handle e.g. dicts later if needed
+    init_lines.extend(
+        '    self.{0} = {0}.copy() if isinstance({0}, list) else {0}'
+        .format(name) for name in default_attrs)
+    if len(init_lines) == 1:
+        init_lines.append('    pass')
+
+    comparisons = ['self.%s == other.%s' % (name, name)
+                   for name in all_fields]
+    eq_lines = [
+        'def __eq__(self, other):',
+        '    if not isinstance(other, type(self)):',
+        '        return NotImplemented',
+        '    return %s' % (' and '.join(comparisons) or 'True'),
+    ]
+
+    namespace = {'_default_' + name: value
+                 for name, value in default_attrs.items()}
+    exec('\n'.join(init_lines + [''] + eq_lines), namespace)
+    return (namespace['__init__'], namespace['__eq__'])
+
+
+def miniclass(modulename, name, fields, *, inherit=object, default_attrs=None,
+              debug=None):
     """Create a small class, a lot like :func:`collections.namedtuple`.
 
     Unlike namedtuples, instances of the returned classes are mutable
-    and not iterable.
+    and not iterable. They aren't hashable either, just like
+    :mod:`dataclasses` that aren't frozen.
 
     The ``modulename`` should be the name of the module that called
     this. Its last part will be used in ``__repr__`` and the
@@ -26,30 +109,29 @@ def miniclass(modulename, name, fields, *, inherit=object, default_attrs=None):
     You can also set *inherit* to another class from this function.
     The inherited fields need to be given as initialization arguments
     before the fields specific to the new class.
+
+    ``__init__`` and ``__eq__`` are generated for the fields, so they
+    are fast. If *debug* is True, or it's None and :data:`DEBUG` is
+    True, slower methods that check the arguments with asserts are used
+    instead.
     """
     # __slots__ can be a list, but mutating it afterwards doesn't change
     # anything so it just confuses stuff
     fields = tuple(fields)
     if default_attrs is None:
         default_attrs = {}
+    if debug is None:
+        debug = DEBUG
 
     if inherit is object:
         all_fields = fields
     else:
         all_fields = tuple(inherit.__slots__) + fields
 
-    def dunder_init(self, *args, **kwargs):
-        assert len(args) == len(all_fields)
-        assert set(kwargs.keys()).issubset(default_attrs.keys())
-
-        for name, value in zip(all_fields, args):
-            setattr(self, name, value)
-        for name, value in collections.ChainMap(kwargs, default_attrs).items():
-            # [] as a default value sucks as we all know
-            # TODO: handle e.g. dicts later if needed
-            if isinstance(value, list):
-                value = value.copy()
-            setattr(self, name, value)
+    if debug:
+        dunder_init, dunder_eq = _debug_methods(all_fields, default_attrs)
+    else:
+        dunder_init, dunder_eq = _generated_methods(all_fields, default_attrs)
 
     # not really necessary, but makes debugging a lot easier
     def dunder_repr(self):
@@ -57,15 +139,6 @@ def miniclass(modulename, name, fields, *, inherit=object, default_attrs=None):
         return '%s.%s(%s)' % (type(self).__module__.split('.')[-1],
                               type(self).__name__, ', '.join(values))
 
-    def dunder_eq(self, other):
-        if not isinstance(other, type(self)):
-            return NotImplemented
-
-        for name in all_fields:
-            if getattr(self, name) != getattr(other, name):
-                return False
-        return True
-
     return type(name, (inherit,), {
         '__module__': modulename,
         '__slots__': fields + tuple(default_attrs),
@@ -73,4 +146,5 @@ def miniclass(modulename, name, fields, *, inherit=object, default_attrs=None):
         '__repr__': dunder_repr,
         '__eq__': dunder_eq,
         # __ne__ works automagically
+        '__hash__': None,
     })
@@ -0,0 +1,200 @@
+"""Compile a file again whenever it changes.
+
+Run ``python3 -m weirdc --watch file.weird``. The file is split into
+top-level function definitions, and the tokens, AST nodes, checked nodes
+and C code of each function are kept in memory between compiles. When
+the file changes, only the functions that changed are tokenized, parsed,
+checked and turned into C code again. Other functions are checked again
+only if the argument or return types of some function changed.
+
+If something goes wrong, the whole file is compiled without the
+remembered things, so error messages are always the same as when not
+watching.
+"""
+
+import copy
+import os
+import re
+import time
+
+from weirdc import (CompileError, ast, c_output, checker, compiler,
+                    tokenizer)
+
+
+# a top-level function definition starts at the beginning of a line,
+# and everything before the first one goes with the first one
+_UNIT_START = re.compile(r'^(?=function\b|import\b)', re.MULTILINE)
+
+
+def _split(code):
+    # yields (text, number of lines before text) pairs
+    starts = [match.start() for match in _UNIT_START.finditer(code)]
+    if not starts:
+        starts = [0]
+    starts[0] = 0
+
+    lines_before = 0
+    for start, end in zip(starts, starts[1:] + [len(code)]):
+        text = code[start:end]
+        yield (text, lines_before)
+        lines_before += text.count('\n')
+
+
+def _signature(node):
+    # checking a function depends on the types of all functions
+    if isinstance(node, ast.FunctionDef):
+        return ('function', node.name,
+                tuple(argtype.name for argtype, argname in node.args),
+                None if node.returntype is None else node.returntype.name)
+    return (type(node).__name__,)
+
+
+def _shift_warning(warning, lines):
+    if warning.location is None:
+        return warning
+    return CompileError(warning.message, warning.location._replace(
+        lineno=warning.location.lineno + lines))
+
+
+class _Unit:
+
+    # the locations of the nodes and warnings are relative to the
+    # beginning of the text, so adding lines before the text doesn't
+    # make anything here invalid
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenizer.CompactTokens(text)
+        self.nodes = list(ast.parse(self.tokens))
+
+        self.checked_signatures = None
+        self.checked_nodes = None
+        self.warnings = None
+
+        self.c_names = None
+        self.c_functions = None
+
+
+class IncrementalCompiler:
+    """Generate C code for different versions of the same file.
+
+    After calling :meth:`generate_c`, :attr:`reparsed`,
+    :attr:`rechecked` and :attr:`regenerated` are the numbers of
+    top-level functions that were tokenized and parsed, checked and
+    turned into C code again. The whole file counts as one function if
+    it couldn't be split.
+    """
+
+    def __init__(self):
+        self._units = {}     # {text: _Unit}
+        self.reparsed = self.rechecked = self.regenerated = 0
+
+    def generate_c(self, code, warn_callback=None):
+        """Like :func:`weirdc.compiler.generate_c`."""
+        if warn_callback is None:
+            warn_callback = lambda warning: None
+        self.reparsed = self.rechecked = self.regenerated = 0
+
+        # the tokenizer's /* */ comments can contain anything, even
+        # function definitions
+        if '/*' not in code:
+            try:
+                return self._generate_c(code, warn_callback)
+            except CompileError:
+                pass
+
+        # this reports errors nicely, even if something went wrong
+        # because the file was split to parts
+        self._units.clear()
+        self.reparsed = self.rechecked = self.regenerated = 1
+        return compiler.generate_c(code, warn_callback)
+
+    def _generate_c(self, code, warn_callback):
+        units = []
+        old_units = self._units
+        self._units = {}
+        for text, lines_before in _split(code):
+            try:
+                unit = old_units[text]
+            except KeyError:
+                unit = _Unit(text)
+                self.reparsed += 1
+            self._units[text] = unit
+            units.append((unit, lines_before))
+
+        nodes = [node for unit, junk in units for node in unit.nodes]
+        if any(isinstance(node, ast.Import) for node in nodes):
+            # imports are for compiling modules separately
+            raise CompileError("imports aren't supported here", None)
+
+        self._check(units, nodes)
+        c_code = self._make_c_code(units)
+
+        for unit, lines_before in units:
+            for warning in unit.warnings:
+                warn_callback(_shift_warning(warning, lines_before))
+        return c_code
+
+    def _check(self, units, nodes):
+        warnings = []
+        global_scope = checker.declare_globals(
+            nodes, lambda warning: warnings.append(warning))
+        signatures = tuple(map(_signature, nodes))
+
+        for unit, junk in units:
+            if unit.checked_signatures == signatures:
+                continue
+
+            # the checker mutates the nodes, and they may need to be
+            # checked again later
+            unit.checked_nodes = copy.deepcopy(unit.nodes)
+            warnings.clear()
+            for node in unit.checked_nodes:
+                global_scope.execute_function_def(node)
+            unit.warnings = warnings.copy()
+            unit.checked_signatures = signatures
+            unit.c_names = None
+            self.rechecked += 1
+
+    def _make_c_code(self, units):
+        generator = c_output.CodeGenerator()
+        prototypes = generator.prototypes(
+            [node for unit, junk in units for node in unit.checked_nodes])
+
+        # a function's C code depends on the C names of all functions
+        names = dict(generator.declared_names.maps[0])
+        functions = []
+        for unit, junk in units:
+            if unit.c_names != names:
+                unit.c_functions = list(map(generator.unparse_function_def,
+                                            unit.checked_nodes))
+                unit.c_names = names
+                self.regenerated += 1
+            functions.extend(unit.c_functions)
+        return c_output.join_c_code(prototypes, functions)
+
+
+def watch(path, callback, interval=0.5):
+    """Call ``callback(code)`` now and whenever a file changes.
+
+    The file is polled every *interval* seconds. This runs until
+    KeyboardInterrupt is raised.
+    """
+    old_stat = None
+    while True:
+        try:
+            stat = os.stat(path)
+            new_stat = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        except OSError:
+            # editors often replace the file by deleting and renaming
+            new_stat = None
+
+        if new_stat is not None and new_stat != old_stat:
+            old_stat = new_stat
+            try:
+                with open(path, 'r') as file:
+                    code = file.read()
+            except OSError:
+                pass
+            else:
+                callback(code)
+        time.sleep(interval)
@@ -0,0 +1,41 @@
+#include <stdio.h>
+#include <stdlib.h>
+
+#include "objects/vm.h"
+
+// usage: weirdvm file.wbc
+int main(int argc, char **argv)
+{
+	if (argc != 2) {
+		fprintf(stderr, "Usage: %s BYTECODE_FILE\n", argv[0]);
+		return 2;
+	}
+
+	FILE *file = fopen(argv[1], "rb");
+	if (!file) {
+		perror(argv[1]);
+		return 1;
+	}
+
+	size_t len = 0, maxlen = 4096;
+	unsigned char *bytecode = malloc(maxlen);
+	size_t n;
+	while (bytecode && (n = fread(bytecode + len, 1, maxlen - len, file)) > 0) {
+		len += n;
+		if (len == maxlen) {
+			maxlen *= 2;
+			bytecode = realloc(bytecode, maxlen);
+		}
+	}
+	fclose(file);
+	if (!bytecode) {
+		fprintf(stderr, "not enough memory\n");
+		return 1;
+	}
+
+	int status = weirdvm_run(bytecode, len);
+	free(bytecode);
+	if (status != 0)
+		fprintf(stderr, "%s: invalid bytecode\n", argv[1]);
+	return status;
+}